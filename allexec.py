@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+
+import argparse
+import inproc
+import json
+import os
+import sweep
+import sys
+import taskrun
+
+from analysis import column_cache
+from analysis import dataset
+from analysis import predicate
+from analysis import summary
+
+
+def all_executions_argv(args, sys_file, output):
+  return [
+    'llm-all-executions', args.app, str(args.num_procs),
+    str(args.max_batch_size), args.datatype, sys_file, output,
+    '-c', str(args.cores), '-n', '-f', args.fused_act]
+
+
+def unfiltered_output(output):
+  """Returns the file Calculon writes to before 'output' gets filtered or
+  converted. It has the same extensions so Calculon writes the same format,
+  except for Parquet which is converted from a gzipped CSV."""
+  dirname, base = os.path.split(output)
+  stem, dot, ext = base.partition('.')
+  if dataset.is_parquet(output):
+    dot, ext = '.', 'csv.gz'
+  return os.path.join(dirname, f'{stem}.unfiltered{dot}{ext}')
+
+
+def filter_file(output):
+  """Returns the file that records how 'output' was filtered."""
+  return f'{output}.filter.json'
+
+
+def filter_spec(where, columns):
+  """Returns the record of a filter, see filter_file().
+
+  Args:
+    where (list): Clauses of the rows kept, None for all rows
+    columns (list): Columns kept, None for all columns
+  """
+  return {'where': [predicate.format_clause(clause) for clause in where or []],
+          'columns': columns}
+
+
+def filter_changed(output, spec):
+  """Returns True if 'output' wasn't written with the filter 'spec'."""
+  try:
+    with open(filter_file(output)) as fd:
+      return json.load(fd) != spec
+  except (OSError, ValueError):
+    return True
+
+
+class FilterCondition(taskrun.Condition):
+  """This makes a task run if its output is missing or was written with
+  another filter than 'spec' (see filter_spec()), which the modification
+  times alone don't tell.
+  """
+
+  def __init__(self, output, spec):
+    super().__init__()
+    self.output = output
+    self.spec = spec
+
+  def check(self):
+    return (not os.path.exists(self.output) or
+            filter_changed(self.output, self.spec))
+
+
+def summarize(output):
+  """Writes the summary of the sample rates of 'output' unless it is up to
+  date, such that plots of their distribution don't need to read the output.
+  """
+  filename = summary.summary_file(output)
+  if not sweep.up_to_date(filename, [output]):
+    summary.write_summary(summary.summarize(output), filename)
+
+
+def main(args):
+  wheres = {}
+  for output, clause in args.where or []:
+    wheres.setdefault(output, []).append(predicate.parse_clause(clause))
+  columns = {output: cols.split(',') for output, cols in args.columns or []}
+  summaries = set(args.summary or [])
+
+  # All systems run in this process so Calculon and its dependencies are only
+  # loaded once for all of them.
+  failed = []
+  for sys_file, output, log in args.system:
+    spec = filter_spec(wheres.get(output), columns.get(output))
+    if (sweep.up_to_date(output, [args.app, sys_file]) and
+        not filter_changed(output, spec)):
+      if output in summaries:
+        summarize(output)
+      continue
+    filtered = (output in wheres or output in columns or
+                dataset.is_parquet(output))
+    calc_output = unfiltered_output(output) if filtered else output
+    code = inproc.run_calculon(
+      args.calc_bin, all_executions_argv(args, sys_file, calc_output), log)
+    print(f'{sys_file}: {"ok" if code == 0 else f"failed ({code})"}')
+    if code != 0:
+      failed.append(sys_file)
+      continue
+
+    # Keeps only the rows and columns that are used later on, in the format
+    # of the output
+    if filtered:
+      pred = None
+      if output in wheres:
+        pred = predicate.Predicate(wheres[output])
+      if dataset.is_parquet(output):
+        read, written = dataset.write_parquet(calc_output, output, pred,
+                                              columns.get(output))
+      else:
+        read, written = predicate.filter_csv(calc_output, output, pred,
+                                             columns.get(output))
+      os.remove(calc_output)
+      print(f'{sys_file}: kept {written} of {read} rows')
+    column_cache.write_json(spec, filter_file(output))
+
+    if output in summaries:
+      summarize(output)
+  if failed:
+    print(f'Failed systems: {failed}', file=sys.stderr)
+    return -1
+  return 0
+
+
+if __name__ == '__main__':
+  ap = argparse.ArgumentParser(
+    description='Runs Calculon\'s llm-all-executions for many systems in a '
+    'single process')
+  ap.add_argument('calc_bin', type=str,
+                  help='Calculon command line script')
+  ap.add_argument('app', type=str,
+                  help='Application JSON file')
+  ap.add_argument('num_procs', type=int,
+                  help='Number of processors')
+  ap.add_argument('max_batch_size', type=int,
+                  help='Maximum batch size')
+  ap.add_argument('datatype', type=str,
+                  help='Datatype')
+  ap.add_argument('-s', '--system', nargs=3, action='append', required=True,
+                  metavar=('SYS', 'OUTPUT', 'LOG'),
+                  help='System JSON file with its output and log file')
+  ap.add_argument('-w', '--where', nargs=2, action='append',
+                  metavar=('OUTPUT', 'CLAUSE'),
+                  help='Only keep rows of OUTPUT where CLAUSE holds, e.g., '
+                  '\'pipeline_par_net=1|pipeline_par=1\', see '
+                  'analysis/predicate.py')
+  ap.add_argument('--columns', nargs=2, action='append',
+                  metavar=('OUTPUT', 'COLUMNS'),
+                  help='Only keep the comma separated COLUMNS of OUTPUT')
+  ap.add_argument('--summary', type=str, action='append', metavar='OUTPUT',
+                  help='Also write the summary of the sample rates of OUTPUT, '
+                  'see analysis/summary.py')
+  ap.add_argument('-c', '--cores', type=int, required=True,
+                  help='Cores per run')
+  ap.add_argument('-f', '--fused_act', type=str, default='both',
+                  help='Fused activation setting')
+  sys.exit(main(ap.parse_args()))
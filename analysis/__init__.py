@@ -0,0 +1 @@
+# need this
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+
+import argparse
+import multiprocessing
+import numpy as np
+import os
+import pandas
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+from analysis import bitmap
+from analysis import column_cache
+from analysis import dataset
+from analysis import groupby
+from analysis import predicate
+
+
+# Categorical columns of all executions results and their values
+Categories = {
+  'tensor_par': [1, 2, 4, 8, 16, 32],
+  'pipeline_par': [1, 2, 4, 8, 16, 32, 64, 128],
+  'data_par': [1, 2, 4, 8, 16, 32, 64],
+  'tensor_par_net': [0, 1],
+  'pipeline_par_net': [0, 1],
+  'data_par_net': [0, 1],
+  'microbatch_size': [1, 2, 4, 8],
+  'pipeline_interleaving': [1, 2, 4, 8],
+  'fused_activation': [True, False],
+  'attention_type': ['multihead', 'multiquery'],
+  'activation_recompute': ['full', 'attn_only', 'none'],
+  'optimizer_sharding': [True, False],
+  'tensor_par_comm_type': ['ar', 'p2p_rs_ag', 'rs_ag'],
+  'tensor_par_overlap': ['none', 'ring', 'pipe'],
+  'seq_par_ag_redo': [True, False],
+  'data_par_overlap': [True, False],
+  'weight_offload': [True, False],
+  'activations_offload': [True, False],
+  'optimizer_offload': [True, False],
+}
+
+# Metric columns of all executions results
+Metrics = [
+  'sample_rate', 'total_time', 'total_efficiency', 'fw_time', 'bw_time',
+  'optim_step_time', 'recompute_time', 'bubble_time', 'tp_comm_exposed_time',
+  'pp_comm_exposed_time', 'dp_comm_exposed_time', 'weight_space', 'act_space',
+  'act_grad_space', 'weight_grad_space', 'optimizer_space',
+  'proc_mem_tier1_cap_req', 'proc_mem_tier2_cap_req', 'offload_mem_bw_req']
+
+
+def synthetic_frame(rows, seed=0):
+  """Returns a random data frame with the columns of all executions results."""
+  rng = np.random.default_rng(seed)
+  data = {}
+  for column, values in Categories.items():
+    data[column] = np.array(values)[rng.integers(0, len(values), rows)]
+  for column in Metrics:
+    data[column] = np.round(rng.random(rows) * 1000, 3)
+  # Memory is coarse so there are ties to break
+  data['proc_mem_tier1_cap_req'] = rng.integers(1, 200, rows) * 1024**3
+  return pandas.DataFrame(data)
+
+
+def write_synthetic(filename, rows, seed=0, chunk=1 << 20):
+  """Writes a random all executions CSV file of 'rows' rows in chunks."""
+  header = True
+  with predicate.open_csv(filename, 'w') as fd:
+    for start in range(0, rows, chunk):
+      df = synthetic_frame(min(chunk, rows - start), seed + start)
+      df.to_csv(fd, header=header, index=False)
+      header = False
+
+
+def peak_rss_mb():
+  # Unlike ru_maxrss, this isn't inherited from the parent across exec
+  with open('/proc/self/status') as fd:
+    for line in fd:
+      if line.startswith('VmHWM:'):
+        return int(line.split()[1]) / 1024
+  return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _measure(queue, func, args):
+  start = time.perf_counter()
+  result = func(*args)
+  seconds = time.perf_counter() - start
+  queue.put((seconds, peak_rss_mb(), len(result)))
+
+
+def measure(func, *args):
+  """Runs 'func' in a fresh process.
+
+  Returns:
+    seconds, rss_mb, rows (float, float, int): Runtime, peak RSS of the
+      process, and length of the result
+  """
+  ctx = multiprocessing.get_context('spawn')
+  queue = ctx.Queue()
+  proc = ctx.Process(target=_measure, args=(queue, func, args))
+  proc.start()
+  result = queue.get()
+  proc.join()
+  return result
+
+
+def load(args):
+  # Reads the way fig4.py does
+  columns = ['tensor_par', 'pipeline_par', 'data_par', 'tensor_par_net',
+             'pipeline_par_net', 'data_par_net', 'attention_type',
+             'sample_rate', 'total_time', 'proc_mem_tier1_cap_req']
+  where = [[('tensor_par_net', 0)],
+           [('pipeline_par_net', 1), ('pipeline_par', 1)],
+           [('data_par_net', 1), ('data_par', 1)],
+           [('attention_type', 'multihead')]]
+  with tempfile.TemporaryDirectory() as tmp:
+    csv_file = args.input
+    if csv_file is None:
+      csv_file = os.path.join(tmp, 'bench.csv.gz')
+      write_synthetic(csv_file, args.rows)
+    else:
+      # The column cache is written next to the input, use a copy
+      shutil.copy(csv_file, os.path.join(tmp, os.path.basename(csv_file)))
+      csv_file = os.path.join(tmp, os.path.basename(csv_file))
+    parquet_file = os.path.join(tmp, 'bench.parquet')
+    dataset.write_parquet(csv_file, parquet_file)
+    print(f'csv.gz  : {os.path.getsize(csv_file) / 1024**2:.1f} MiB')
+    print(f'parquet : {os.path.getsize(parquet_file) / 1024**2:.1f} MiB')
+    for name, func, func_args in [
+        ('csv.gz full read', pandas.read_csv, (csv_file,)),
+        ('csv.gz projected', dataset.read_frame,
+         (csv_file, columns, where, False)),
+        ('column cache build', dataset.read_frame, (csv_file, columns, where)),
+        ('column cache hit', dataset.read_frame, (csv_file, columns, where)),
+        ('parquet projected', dataset.read_frame,
+         (parquet_file, columns, where))]:
+      seconds, rss_mb, rows = measure(func, *func_args)
+      print(f'{name:18}: {seconds:7.2f} s {rss_mb:8.0f} MiB peak RSS '
+            f'{rows} rows')
+  return 0
+
+
+def per_cell_best(df, tps, pps):
+  # What the plot scripts did before analysis.groupby
+  best = {}
+  for tp in tps:
+    for pp in pps:
+      tp_pp = df[(df['tensor_par'] == tp) & (df['pipeline_par'] == pp)]
+      cell = tp_pp[tp_pp['sample_rate'] == tp_pp['sample_rate'].max()]
+      cell = cell[cell['proc_mem_tier1_cap_req'] ==
+                  cell['proc_mem_tier1_cap_req'].min()]
+      if cell.shape[0] > 0:
+        best[(tp, pp)] = df.index.get_loc(cell.index[0])
+  return best
+
+
+def argmax(args):
+  tps = Categories['tensor_par']
+  pps = Categories['pipeline_par']
+  rng = np.random.default_rng(0)
+  df = pandas.DataFrame({
+    'tensor_par': np.array(tps)[rng.integers(0, len(tps), args.rows)],
+    'pipeline_par': np.array(pps)[rng.integers(0, len(pps), args.rows)],
+    # Coarse values such that there are ties to break
+    'sample_rate': np.round(rng.random(args.rows) * 100, 1),
+    'proc_mem_tier1_cap_req': rng.integers(1, 200, args.rows) * 1024**3})
+  order = [('sample_rate', 'max'), ('proc_mem_tier1_cap_req', 'min')]
+  by = ['tensor_par', 'pipeline_par']
+
+  start = time.perf_counter()
+  masked = per_cell_best(df, tps, pps)
+  masked_seconds = time.perf_counter() - start
+
+  start = time.perf_counter()
+  positions = groupby.group_argmax(df, order, by)
+  argmax_seconds = time.perf_counter() - start
+
+  found = {(df['tensor_par'].iat[pos], df['pipeline_par'].iat[pos]): pos
+           for pos in positions}
+  assert found == masked, 'Results differ'
+  print(f'{args.rows} rows, {len(masked)} cells')
+  print(f'per cell masking: {masked_seconds:7.2f} s')
+  print(f'group argmax    : {argmax_seconds:7.2f} s '
+        f'({masked_seconds / argmax_seconds:.1f}x)')
+  return 0
+
+
+# The scenarios of fig10tab4.py
+Offload = [[('weight_offload', False)], [('activations_offload', False)],
+           [('optimizer_offload', False)]]
+Megatron = [
+  [('tensor_par_net', 0)], [('pipeline_par_net', 1), ('pipeline_par', 1)],
+  [('data_par_net', 1), ('data_par', 1)], [('fused_activation', False)],
+  [('attention_type', 'multihead')], [('tensor_par_overlap', 'none')],
+  [('data_par_overlap', False)], [('optimizer_sharding', False)],
+  [('tensor_par', 8)], [('pipeline_par', 64)], [('data_par', 8)],
+  [('microbatch_size', 1)]] + Offload
+Scenarios = {
+  'Baseline': Megatron + [
+    [('seq_par_ag_redo', False)], [('activation_recompute', 'full')],
+    [('tensor_par_comm_type', 'ar'), ('tensor_par_comm_type', 'p2p_rs_ag')],
+    [('pipeline_interleaving', 2)]],
+  'SeqPar': Megatron + [
+    [('seq_par_ag_redo', True)], [('activation_recompute', 'attn_only')]],
+  'SwOpts': Offload,
+  'HwOff': []}
+
+
+def masked_best(df, clauses):
+  # What fig10tab4.py did before analysis.bitmap
+  mask = pandas.Series(True, index=df.index)
+  for clause in clauses:
+    any_mask = pandas.Series(False, index=df.index)
+    for column, value in clause:
+      any_mask |= df[column] == value
+    mask &= any_mask
+  selected = df[mask]
+  best = selected[selected['sample_rate'] == selected['sample_rate'].max()]
+  return selected.shape[0], None if best.shape[0] == 0 else best.index[0]
+
+
+def bitmaps(args):
+  df = synthetic_frame(args.rows)
+  # Random rows hardly ever match the first scenarios, 1% of the rows are
+  # made to match each
+  rng = np.random.default_rng(1)
+  for clauses in [Scenarios['Baseline'], Scenarios['SeqPar']]:
+    rows = rng.choice(args.rows, args.rows // 100, replace=False)
+    for clause in clauses:
+      column, value = clause[0]
+      df.loc[rows, column] = value
+  with tempfile.TemporaryDirectory() as tmp:
+    # Parquet is the quickest to write, the index reads its column cache
+    source = os.path.join(tmp, 'bench.parquet')
+    df.to_parquet(source)
+
+    start = time.perf_counter()
+    masked = {name: masked_best(df, clauses)
+              for name, clauses in Scenarios.items()}
+    masked_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cache = column_cache.open_cache(source)
+    cache_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index = bitmap.BitmapIndex(cache)
+    for clauses in Scenarios.values():
+      index.select(clauses)
+    build_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    found = {}
+    for name, clauses in Scenarios.items():
+      selected = index.select(clauses)
+      found[name] = (index.count(selected),
+                     index.argmax(selected, [('sample_rate', 'max')]))
+    bitmap_seconds = time.perf_counter() - start
+
+  assert found == masked, 'Results differ'
+  print(f'{args.rows} rows, selected ' +
+        ', '.join(f'{name} {count}' for name, (count, _) in found.items()))
+  print(f'pandas masking      : {masked_seconds:7.3f} s')
+  print(f'column cache build  : {cache_seconds:7.3f} s (once per output)')
+  print(f'bitmap index build  : {build_seconds:7.3f} s (once per output)')
+  print(f'bitmap index queries: {bitmap_seconds:7.3f} s '
+        f'({masked_seconds / bitmap_seconds:.1f}x)')
+  return 0
+
+
+def main(args):
+  return args.func(args)
+
+
+if __name__ == '__main__':
+  ap = argparse.ArgumentParser(
+    description='Benchmarks of the analysis of all executions results, run '
+    'as \'python3 -m analysis.bench\' from the top directory')
+  sub = ap.add_subparsers(required=True)
+  sp = sub.add_parser(
+    'load', help='Reading csv.gz vs. its column cache vs. Parquet')
+  sp.add_argument('--input', type=str, default=None,
+                  help='All executions CSV file, random if not given')
+  sp.add_argument('--rows', type=int, default=1000000,
+                  help='Rows of the random input')
+  sp.set_defaults(func=load)
+  sp = sub.add_parser('argmax', help='Per cell masking vs. group argmax')
+  sp.add_argument('--rows', type=int, default=10000000,
+                  help='Rows of the random table')
+  sp.set_defaults(func=argmax)
+  sp = sub.add_parser('bitmap', help='Pandas masking vs. bitmap indexes for '
+                      'the fig10tab4 scenarios')
+  sp.add_argument('--rows', type=int, default=2000000,
+                  help='Rows of the random table')
+  sp.set_defaults(func=bitmaps)
+  sys.exit(main(ap.parse_args()))
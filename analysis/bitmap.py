@@ -0,0 +1,257 @@
+import json
+import numpy as np
+import os
+import uuid
+
+from analysis import column_cache
+from analysis import predicate
+from analysis import stream
+
+
+# Columns with more distinct values than this aren't indexed
+MaxValues = 256
+
+# Rows that are unpacked at once
+BlockRows = 1 << 20
+
+
+def _text(values, categories):
+  # The values as written in the CSV, see predicate.Predicate
+  if categories is not None:
+    return [categories[code] for code in values]
+  if values.dtype == bool:
+    return [str(bool(value)) for value in values]
+  return [str(value) for value in values.tolist()]
+
+
+class BitmapIndex():
+  """This answers conjunctions of equality predicates over an all executions
+  output with bitmap indexes. Every value of an indexed column has a bitmap
+  with one bit per row, packed eight rows to a byte. The bitmaps of a column
+  are built on first use in one pass over its column cache and stored next to
+  it, keyed like the cache. A predicate (see predicate.Predicate) is answered
+  by ORing the bitmaps within each clause and ANDing the clauses. Columns that
+  can't be indexed, e.g., metrics, are compared directly, and so are columns
+  whose bitmaps can't be written.
+
+  Args:
+    cache (ColumnCache): The valid column cache of the all executions output,
+      see open_index()
+  """
+
+  def __init__(self, cache):
+    self._cache = cache
+    self._bytes = (self._cache.rows + 7) // 8
+    self._meta_file = os.path.join(
+      self._cache.directory, f'{self._cache.sha256[:16]}.bitmaps.json')
+    try:
+      with open(self._meta_file) as fd:
+        self._meta = json.load(fd)
+    except (OSError, ValueError):
+      self._meta = {}
+
+  @property
+  def rows(self):
+    return self._cache.rows
+
+  def indexable(self, name):
+    """Tells whether a column gets bitmaps: string, boolean, and integer
+    columns with at most MaxValues distinct values."""
+    if name in self._meta:
+      return self._meta[name] is not None
+    return self._build(name) is not None
+
+  def _build(self, name):
+    values = self._cache.column(name)
+    categories = self._cache.categories(name)
+    if categories is None and values.dtype.kind not in 'biu':
+      entry = None
+    else:
+      if categories is not None:
+        distinct = np.arange(len(categories))
+      else:
+        distinct = np.unique(values[:BlockRows])
+        for start in range(BlockRows, len(values), BlockRows):
+          if len(distinct) > MaxValues:
+            break
+          distinct = np.union1d(distinct,
+                                np.unique(values[start:start + BlockRows]))
+      if len(distinct) > MaxValues:
+        entry = None
+      else:
+        filename = f'{self._cache.sha256[:16]}.bitmaps.{name}.npy'
+        path = os.path.join(self._cache.directory, filename)
+        tmp = f'{path}.{uuid.uuid4().hex}.npy'
+        try:
+          bits = np.lib.format.open_memmap(
+            tmp, mode='w+', dtype=np.uint8,
+            shape=(len(distinct), self._bytes))
+          for start in range(0, len(values), BlockRows):
+            block = values[start:start + BlockRows]
+            for idx, value in enumerate(distinct):
+              bits[idx, start // 8:(start + len(block) + 7) // 8] = \
+                np.packbits(block == value)
+          bits.flush()
+          del bits
+          os.replace(tmp, path)
+        except OSError as ex:
+          # Compared directly for now, indexed again next time
+          print(f'Bitmaps of {name} not written: {ex}')
+          if os.path.exists(tmp):
+            os.remove(tmp)
+          self._meta[name] = None
+          return None
+        entry = {'file': filename, 'values': _text(distinct, categories)}
+
+    # Other processes may have indexed other columns meanwhile
+    try:
+      with open(self._meta_file) as fd:
+        self._meta = json.load(fd)
+    except (OSError, ValueError):
+      pass
+    self._meta[name] = entry
+    try:
+      column_cache.write_json(self._meta, self._meta_file)
+    except OSError:
+      pass
+    return entry
+
+  def bitmap(self, name, value):
+    """Returns the packed bitmap of the rows where a column equals a value
+    given as text."""
+    if self.indexable(name):
+      entry = self._meta[name]
+      if value not in entry['values']:
+        return np.zeros(self._bytes, dtype=np.uint8)
+      bits = np.load(os.path.join(self._cache.directory, entry['file']),
+                     mmap_mode='r')
+      return np.asarray(bits[entry['values'].index(value)])
+    bits = np.empty(self._bytes, dtype=np.uint8)
+    for start in range(0, self.rows, BlockRows):
+      matches = self._cache.matches(name, value, start, start + BlockRows)
+      bits[start // 8:(start + len(matches) + 7) // 8] = np.packbits(matches)
+    return bits
+
+  def select(self, clauses):
+    """Returns the packed bitmap of the rows that clauses select, see
+    predicate.Predicate. No clauses select all rows."""
+    pred = predicate.Predicate(clauses)
+    selected = np.full(self._bytes, 0xff, dtype=np.uint8)
+    if self.rows % 8:
+      # The padding bits of the last byte are never selected
+      selected[-1] = np.packbits(np.arange(8) < self.rows % 8)[0]
+    for clause in pred.clauses:
+      any_bits = np.zeros(self._bytes, dtype=np.uint8)
+      for column, value in clause:
+        any_bits |= self.bitmap(column, value)
+      selected &= any_bits
+    return selected
+
+  def count(self, bits):
+    """Returns the number of rows in a packed bitmap."""
+    return sum(int(np.unpackbits(bits[start:start + BlockRows // 8]).sum())
+               for start in range(0, len(bits), BlockRows // 8))
+
+  def argmax(self, bits, order):
+    """Returns the position of the best row in a packed bitmap, ordered by
+    'order' (see stream.Best) with ties going to the first row. Rows with a
+    missing value in 'order' never win. Returns None if no row is selected.
+    """
+    columns = [self._cache.column(column) for column, _ in order]
+    best_key = None
+    best_pos = None
+    for start in range(0, self.rows, BlockRows):
+      stop = min(start + BlockRows, self.rows)
+      selected = np.unpackbits(bits[start // 8:(stop + 7) // 8],
+                               count=stop - start).astype(bool)
+      positions = np.flatnonzero(selected)
+      key = []
+      for values, (_, direction) in zip(columns, order):
+        if len(positions) == 0:
+          break
+        block = values[start:stop][positions]
+        if block.dtype.kind == 'f':
+          valid = ~np.isnan(block)
+          positions = positions[valid]
+          block = block[valid]
+          if len(positions) == 0:
+            break
+        extreme = block.max() if direction == 'max' else block.min()
+        positions = positions[block == extreme]
+        key.append(extreme)
+      if len(positions) == 0:
+        continue
+      if best_key is None or self._better(key, best_key, order):
+        best_key = key
+        best_pos = start + int(positions[0])
+    return best_pos
+
+  @staticmethod
+  def _better(key, other, order):
+    for value, other_value, (_, direction) in zip(key, other, order):
+      if value != other_value:
+        return value > other_value if direction == 'max' else \
+          value < other_value
+    return False
+
+  def row(self, position, columns=None):
+    """Returns a row of the output as a Series."""
+    return self._cache.frame(columns, start=position,
+                             stop=position + 1).iloc[0]
+
+
+def open_index(source):
+  """Returns the BitmapIndex of a source, None if its column cache can't be
+  built (see column_cache.open_cache())."""
+  cache = column_cache.open_cache(source)
+  return BitmapIndex(cache) if cache is not None else None
+
+
+def best_rows(source, scenarios, order, columns=None):
+  """Finds the best row of each scenario of an all executions output.
+
+  The rows of the scenarios are selected with bitmap indexes. When the
+  column cache of the source can't be built, the source is streamed once
+  instead, selecting the rows of each scenario per chunk (see stream.chunks()).
+  Both give the same rows.
+
+  Args:
+    source (str): The all executions output, CSV or Parquet
+    scenarios (list): Lists of clauses (see predicate.Predicate), no clauses
+      selecting all rows
+    order (list): The order of the rows, see stream.Best
+    columns (list): The columns of the rows returned, all if None
+
+  Returns:
+    rows (int): Number of rows of the source
+    counts (list): Number of rows each scenario selects
+    bests (list): The best row of each scenario as a Series, None if it
+      selects no row
+  """
+  index = open_index(source)
+  if index is not None:
+    counts = []
+    bests = []
+    for clauses in scenarios:
+      selected = index.select(clauses)
+      counts.append(index.count(selected))
+      position = index.argmax(selected, order)
+      bests.append(None if position is None else index.row(position, columns))
+    return index.rows, counts, bests
+
+  needed = None
+  if columns is not None:
+    needed = list(columns)
+    for clauses in scenarios:
+      for column in predicate.Predicate(clauses).columns:
+        if column not in needed:
+          needed.append(column)
+    needed.extend(column for column, _ in order if column not in needed)
+  reducers = [stream.Best(order, predicate.Predicate(clauses).mask
+                          if clauses else None)
+              for clauses in scenarios]
+  rows = stream.reduce(source, reducers, needed, cache=False)
+  bests = [reducer.result() for reducer in reducers]
+  if columns is not None:
+    bests = [None if best is None else best[columns] for best in bests]
+  return rows, [reducer.rows for reducer in reducers], bests
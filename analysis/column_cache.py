@@ -0,0 +1,332 @@
+import hashlib
+import json
+import numpy as np
+import os
+import pandas
+import uuid
+
+
+# Rows that are parsed at once when building the cache
+ChunkRows = 1 << 18
+
+
+def cache_dir(source):
+  """Returns the directory that holds the column cache of 'source'."""
+  return f'{source}.columns'
+
+
+def source_hash(source):
+  sha = hashlib.sha256()
+  with open(source, 'rb') as fd:
+    for block in iter(lambda: fd.read(1 << 20), b''):
+      sha.update(block)
+  return sha.hexdigest()
+
+
+def source_stat(source):
+  st = os.stat(source)
+  return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+def check_source(meta, source):
+  """Tells whether metadata with the 'sha256' and 'source_stat()' of a source
+  still matches it. The source is only hashed if its size or modification
+  time changed, in which case meta['source'] is refreshed.
+
+  Returns:
+    matches, refreshed (bool, bool): Whether the content is the same and
+      whether 'meta' was changed
+  """
+  stat = source_stat(source)
+  if meta['source'] == stat:
+    return True, False
+  if meta['sha256'] != source_hash(source):
+    return False, False
+  meta['source'] = stat
+  return True, True
+
+
+def write_json(data, filename):
+  tmp = f'{filename}.{uuid.uuid4().hex}'
+  with open(tmp, 'w') as fd:
+    json.dump(data, fd, indent=2)
+  os.replace(tmp, filename)
+
+
+def _source_chunks(source, chunk_rows):
+  if source.endswith('.parquet'):
+    # Imported here, the dataset module reads through this one
+    from analysis import dataset
+    pa = dataset._pyarrow()
+    for batch in pa.parquet.ParquetFile(source).iter_batches(
+        batch_size=chunk_rows):
+      yield batch.to_pandas()
+  else:
+    yield from pandas.read_csv(source, chunksize=chunk_rows)
+
+
+class ColumnCache():
+  """This is a typed binary copy of an all executions output (CSV or Parquet)
+  stored next to it, one .npy file per column. String columns are stored as
+  category codes with their categories in the metadata. Readers memory map the
+  columns they need instead of parsing the CSV again, such that all plot
+  scripts reading the same output share a single parse and the page cache.
+
+  The cache is keyed by the SHA-256 of the source. The size and modification
+  time of the source are remembered to skip hashing when nothing changed; a
+  source that is rewritten with the same content (e.g., restored from the
+  result cache) is hashed once more and keeps its cache.
+
+  Args:
+    source (str): The CSV or Parquet file
+  """
+
+  def __init__(self, source):
+    self._source = source
+    self._dir = cache_dir(source)
+    self._meta_file = os.path.join(self._dir, 'meta.json')
+    self._meta = None
+
+  @property
+  def directory(self):
+    return self._dir
+
+  @property
+  def sha256(self):
+    return self._meta['sha256']
+
+  @property
+  def rows(self):
+    return self._meta['rows']
+
+  @property
+  def names(self):
+    """The column names."""
+    return [c['name'] for c in self._meta['columns']]
+
+  def column(self, name):
+    """Returns the memory mapped values of a column, category codes for
+    string columns."""
+    return self._array(self._column(name))
+
+  def categories(self, name):
+    """Returns the categories of a string column, None for other columns."""
+    return self._column(name).get('categories')
+
+  def _column(self, name):
+    for column in self._meta['columns']:
+      if column['name'] == name:
+        return column
+    raise KeyError(f'Unknown column: {name}')
+
+  def _load_meta(self):
+    try:
+      with open(self._meta_file) as fd:
+        return json.load(fd)
+    except (OSError, ValueError):
+      return None
+
+  def valid(self):
+    """Tells whether the cache matches the current source."""
+    meta = self._load_meta()
+    if meta is None:
+      return False
+    matches, refreshed = check_source(meta, self._source)
+    if not matches:
+      return False
+    if refreshed:
+      try:
+        write_json(meta, self._meta_file)
+      except OSError:
+        pass
+    self._meta = meta
+    return True
+
+  def _column_file(self, sha, idx):
+    return os.path.join(self._dir, f'{sha[:16]}.{idx}.npy')
+
+  def build(self, chunk_rows=ChunkRows):
+    """Parses the source in chunks of 'chunk_rows' rows and writes the cache,
+    such that memory doesn't grow with the source. Concurrent builders write
+    the same files and the metadata is replaced last, so readers only ever see
+    a complete cache.
+
+    Raises:
+      ValueError: A column holds numbers in one chunk and strings in another
+    """
+    stat = source_stat(self._source)
+    sha = source_hash(self._source)
+    os.makedirs(self._dir, exist_ok=True)
+    tag = uuid.uuid4().hex
+    names = None
+    categories = {}
+    dtypes = {}
+    raws = {}
+    rows = 0
+    try:
+      for chunk in _source_chunks(self._source, chunk_rows):
+        if names is None:
+          names = list(chunk.columns)
+          for idx, name in enumerate(names):
+            series = chunk[name]
+            if not (pandas.api.types.is_numeric_dtype(series.dtype) or
+                    pandas.api.types.is_bool_dtype(series.dtype)):
+              categories[name] = {}
+            dtypes[name] = []
+            raws[name] = open(os.path.join(self._dir, f'.{tag}.{idx}.raw'),
+                              'wb')
+        for name in names:
+          series = chunk[name]
+          if name in categories:
+            cat = pandas.Categorical(series.astype(str))
+            lookup = np.array(
+              [categories[name].setdefault(str(c), len(categories[name]))
+               for c in cat.categories], dtype=np.int32)
+            values = lookup[cat.codes]
+          elif pandas.api.types.is_numeric_dtype(series.dtype) or \
+               pandas.api.types.is_bool_dtype(series.dtype):
+            values = series.to_numpy()
+          else:
+            raise ValueError(f'Column {name} of {self._source} has mixed '
+                             'types')
+          dtypes[name].append((values.dtype.str, len(values)))
+          values.tofile(raws[name])
+        rows += len(chunk)
+    finally:
+      for raw in raws.values():
+        raw.close()
+
+    # Converts the raw chunks into one .npy file per column
+    columns = []
+    for idx, name in enumerate(names or []):
+      raw_file = os.path.join(self._dir, f'.{tag}.{idx}.raw')
+      column = {'name': name,
+                'file': os.path.basename(self._column_file(sha, idx))}
+      if name in categories:
+        column['categories'] = list(categories[name])
+        dtype = np.min_scalar_type(max(len(categories[name]) - 1, 0))
+        dtype = np.result_type(dtype, np.int8)
+      else:
+        dtype = np.result_type(*[np.dtype(d) for d, _ in dtypes[name]])
+      tmp = f'{self._column_file(sha, idx)}.{tag}.npy'
+      out = np.lib.format.open_memmap(tmp, mode='w+', dtype=dtype,
+                                      shape=(rows,))
+      offset = 0
+      with open(raw_file, 'rb') as raw:
+        for chunk_dtype, count in dtypes[name]:
+          out[offset:offset + count] = np.fromfile(raw, chunk_dtype, count)
+          offset += count
+      out.flush()
+      del out
+      os.remove(raw_file)
+      os.replace(tmp, self._column_file(sha, idx))
+      columns.append(column)
+    meta = {'sha256': sha, 'source': stat, 'rows': rows, 'columns': columns}
+    write_json(meta, self._meta_file)
+    self._meta = meta
+
+    # Files of older sources aren't referenced anymore, open memory maps of
+    # them stay valid after removal. Files of this source (e.g., its bitmaps)
+    # and the temporary files of concurrent builders are kept.
+    for filename in os.listdir(self._dir):
+      if (filename.startswith(sha[:16]) or filename.startswith('.') or
+          filename.startswith('meta.json') or '.npy.' in filename):
+        continue
+      try:
+        os.remove(os.path.join(self._dir, filename))
+      except OSError:
+        pass
+
+  def _array(self, column):
+    return np.load(os.path.join(self._dir, column['file']), mmap_mode='r')
+
+  def matches(self, name, value, start=0, stop=None):
+    """Returns whether the rows of a column from 'start' to 'stop' equal a
+    value given as text, see predicate.Predicate."""
+    column = self._column(name)
+    values = self._array(column)[start:stop]
+    if 'categories' in column:
+      if value not in column['categories']:
+        return np.zeros(len(values), dtype=bool)
+      return values == column['categories'].index(value)
+    if values.dtype == bool:
+      return values == (value in ['True', '1'])
+    try:
+      return values == float(value)
+    except ValueError:
+      return np.zeros(len(values), dtype=bool)
+
+  def _frame(self, columns, pred, start, stop):
+    by_name = {c['name']: c for c in self._meta['columns']}
+    names = [c['name'] for c in self._meta['columns']
+             if columns is None or c['name'] in columns]
+    rows = None
+    if pred is not None:
+      missing = [column for column in pred.columns if column not in by_name]
+      assert not missing, f'Unknown columns: {missing}'
+      rows = np.ones(stop - start, dtype=bool)
+      for clause in pred.clauses:
+        any_rows = np.zeros(stop - start, dtype=bool)
+        for column, value in clause:
+          any_rows |= self.matches(column, value, start, stop)
+        rows &= any_rows
+      rows = np.flatnonzero(rows)
+
+    data = {}
+    for name in names:
+      values = self._array(by_name[name])[start:stop]
+      if rows is not None:
+        values = values[rows]
+      if 'categories' in by_name[name]:
+        values = pandas.Categorical.from_codes(
+          values, by_name[name]['categories'])
+      data[name] = values
+    index = pandas.RangeIndex(start, stop) if rows is None else rows + start
+    return pandas.DataFrame(data, index=index, copy=False)
+
+  def frame(self, columns=None, pred=None, start=0, stop=None):
+    """Returns the cached data as a data frame. Without a predicate the
+    columns are memory mapped, otherwise only the selected rows are copied.
+
+    Args:
+      columns (list): If given, only these columns are returned
+      pred (Predicate): If given, only the rows it selects are returned
+      start, stop (int): If given, only these rows are returned
+    """
+    assert self._meta is not None, 'Cache is not valid'
+    stop = self._meta['rows'] if stop is None else min(stop, self.rows)
+    return self._frame(columns, pred, start, stop)
+
+  def chunks(self, columns=None, pred=None, chunk_rows=ChunkRows):
+    """Like frame() but yields the data in data frames of up to 'chunk_rows'
+    source rows. The index holds the row numbers of the source."""
+    assert self._meta is not None, 'Cache is not valid'
+    for start in range(0, self._meta['rows'], chunk_rows):
+      yield self._frame(columns, pred, start,
+                        min(start + chunk_rows, self._meta['rows']))
+
+
+def open_cache(source, chunk_rows=ChunkRows):
+  """Returns the valid column cache of a source, building it if it is missing
+  or stale, None if it can't be built."""
+  cache = ColumnCache(source)
+  if not cache.valid():
+    try:
+      cache.build(chunk_rows)
+    except (OSError, ValueError) as ex:
+      print(f'Column cache of {source} not written: {ex}')
+      return None
+  return cache
+
+
+def read_frame(source, columns=None, pred=None):
+  """Reads a CSV file through its column cache, building the cache if it is
+  missing or stale. Falls back to parsing when the cache can't be written.
+
+  Returns:
+    df (DataFrame): The data, None when the cache isn't usable
+  """
+  cache = open_cache(source)
+  if cache is None:
+    return None
+  return cache.frame(columns, pred)
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import numpy as np
+import os
+import pandas
+import sys
+import uuid
+
+from analysis import column_cache
+from analysis import dataset
+from analysis import groupby
+from analysis import predicate
+from analysis import stream
+
+
+# The low-cardinality columns that define the cells, those missing from an
+# output are left out
+Dimensions = [
+  'tensor_par', 'pipeline_par', 'data_par', 'tensor_par_net',
+  'pipeline_par_net', 'data_par_net', 'microbatch_size',
+  'pipeline_interleaving', 'activation_recompute', 'optimizer_sharding',
+  'weight_offload', 'activations_offload', 'optimizer_offload']
+
+# The metrics kept for the best row of each cell, those missing from an
+# output are left out
+Measures = [
+  'sample_rate', 'total_time', 'total_efficiency', 'proc_mem_tier1_cap_req',
+  'proc_mem_tier2_cap_req', 'offload_mem_bw_req']
+
+
+def cube_files(source):
+  """Returns the files that hold the cube of 'source': its cells and their
+  metadata."""
+  return f'{source}.cube.csv', f'{source}.cube.json'
+
+
+class Cells():
+  """This keeps the best row and the number of rows of every cell, the
+  combinations of the values of 'dimensions' that occur. Rows are ordered as
+  in stream.Best. It can be used with stream.reduce().
+
+  Args:
+    dimensions (list): The columns that define the cells
+    order (list): (column, 'max' or 'min') tuples, most significant first
+  """
+
+  def __init__(self, dimensions, order=stream.MaxRate):
+    self._dimensions = dimensions
+    self._order = order
+    self._cells = None
+
+  def _reduce(self, df, counts):
+    ids, groups = groupby.group_ids(df, self._dimensions)
+    counts = np.bincount(ids, weights=counts, minlength=groups)
+    positions = groupby.group_argmax(df, self._order, self._dimensions)
+    cells = df.iloc[positions].copy()
+    cells['rows'] = counts[ids[positions]].astype(np.int64)
+    return cells
+
+  def update(self, df):
+    cells = self._reduce(df, None)
+    if self._cells is not None:
+      # The kept cells come first such that they win ties
+      both = pandas.concat([self._cells, cells])
+      cells = self._reduce(both.drop(columns=['rows']), both['rows'])
+    self._cells = cells
+
+  def result(self):
+    """Returns the cells as a data frame indexed by the row number of their
+    best row, None if no row was fed."""
+    return self._cells
+
+
+class Cube():
+  """This is the best row of every cell of an all executions output, see
+  Cells, with the number of rows of the cell. The best row of any union of
+  cells is the best of their best rows, so slices and roll-ups are answered
+  from the cells alone with the same result as from all rows. Cells without
+  a candidate row (e.g., no sample rate) aren't kept.
+
+  Args:
+    cells (DataFrame): The cells, indexed by the row number of their best row
+    dimensions (list): The columns that define the cells
+    order (list): The order of the best rows, see stream.Best
+  """
+
+  def __init__(self, cells, dimensions, order=stream.MaxRate):
+    self.cells = cells
+    self.dimensions = dimensions
+    self.order = order
+
+  def slice(self, where):
+    """Returns the cube of the cells that clauses of the dimensions select,
+    see predicate.Predicate."""
+    pred = predicate.Predicate(where)
+    missing = [column for column in pred.columns
+               if column not in self.dimensions]
+    assert not missing, f'Not dimensions of the cube: {missing}'
+    return Cube(self.cells[pred.mask(self.cells)], self.dimensions,
+                self.order)
+
+  def rollup(self, by=None):
+    """Returns the best row and the number of rows of each combination of the
+    values of 'by', a subset of the dimensions, as a data frame indexed by
+    the row number of the best row. Without 'by', all cells are rolled up
+    into one."""
+    missing = [column for column in by or [] if column not in self.dimensions]
+    assert not missing, f'Not dimensions of the cube: {missing}'
+    # Cells ordered by row such that ties go to the first row
+    cells = self.cells.sort_index()
+    ids, groups = groupby.group_ids(cells, by)
+    counts = np.bincount(ids, weights=cells['rows'], minlength=groups)
+    positions = groupby.group_argmax(cells, self.order, by)
+    rolled = cells.iloc[positions].copy()
+    rolled['rows'] = counts[ids[positions]].astype(np.int64)
+    return rolled[list(by or []) + [column for column in rolled.columns
+                                    if column not in self.dimensions]]
+
+  def best(self):
+    """Returns the best row of the cube as a Series, None if it is empty."""
+    rolled = self.rollup()
+    return rolled.iloc[0] if rolled.shape[0] > 0 else None
+
+
+class CubeFile():
+  """This is the cube of an all executions output, persisted next to it as
+  OUTPUT.cube.csv with OUTPUT.cube.json. Like the column cache, it is keyed by
+  the SHA-256 of the output.
+
+  Args:
+    source (str): The all executions output, CSV or Parquet
+  """
+
+  def __init__(self, source):
+    self._source = source
+    self._cells_file, self._meta_file = cube_files(source)
+
+  def load(self):
+    """Returns the persisted cube, None if it is missing or stale."""
+    try:
+      with open(self._meta_file) as fd:
+        meta = json.load(fd)
+    except (OSError, ValueError):
+      return None
+    matches, refreshed = column_cache.check_source(meta, self._source)
+    if not matches:
+      return None
+    if refreshed:
+      try:
+        column_cache.write_json(meta, self._meta_file)
+      except OSError:
+        pass
+    cells = pandas.read_csv(self._cells_file, index_col='row',
+                            float_precision='round_trip')
+    return Cube(cells, meta['dimensions'],
+                [tuple(term) for term in meta['order']])
+
+  def store(self, cube, rows):
+    """Persists a cube of an output of 'rows' rows. A failure only prints a
+    message."""
+    try:
+      meta = {'sha256': column_cache.source_hash(self._source),
+              'source': column_cache.source_stat(self._source),
+              'rows': rows, 'cells': cube.cells.shape[0],
+              'dimensions': cube.dimensions, 'order': cube.order}
+      tmp = f'{self._cells_file}.{uuid.uuid4().hex}'
+      cube.cells.to_csv(tmp, index_label='row')
+      os.replace(tmp, self._cells_file)
+      column_cache.write_json(meta, self._meta_file)
+    except OSError as ex:
+      print(f'Cube of {self._source} not written: {ex}')
+
+  def compute(self):
+    """Returns the cube, streaming the output once if it isn't persisted
+    yet. CSV files are parsed without writing their column cache."""
+    cube = self.load()
+    if cube is None:
+      names = dataset.column_names(self._source)
+      dimensions = [column for column in Dimensions if column in names]
+      measures = [column for column in Measures if column in names]
+      assert 'sample_rate' in measures, f'No sample rate in {self._source}'
+      cells = Cells(dimensions)
+      rows = stream.reduce(self._source, [cells], dimensions + measures,
+                            cache=False)
+      df = cells.result()
+      if df is None:
+        df = pandas.DataFrame(columns=dimensions + measures + ['rows'])
+      cube = Cube(df, dimensions)
+      self.store(cube, rows)
+    return cube
+
+
+def main(args):
+  cube = CubeFile(args.input).compute()
+  print(f'{args.input}: {cube.cells.shape[0]} cells over '
+        f'{int(cube.cells["rows"].sum())} rows')
+  if args.where:
+    cube = cube.slice([predicate.parse_clause(clause)
+                       for clause in args.where])
+  if args.by is not None:
+    with pandas.option_context('display.max_rows', None,
+                               'display.max_columns', None,
+                               'display.width', None):
+      print(cube.rollup(args.by))
+  return 0
+
+
+if __name__ == '__main__':
+  ap = argparse.ArgumentParser(
+    description='Materializes the best row of every cell of an all executions '
+    'output and answers roll-ups from it')
+  ap.add_argument('input', type=str,
+                  help='All executions output, CSV or Parquet')
+  ap.add_argument('-w', '--where', type=str, action='append',
+                  help='Only look at the cells where CLAUSE holds, e.g., '
+                  '\'pipeline_par=1|pipeline_par_net=1\', see '
+                  'analysis/predicate.py')
+  ap.add_argument('--by', type=str, nargs='*', default=None,
+                  help='Prints the best rows rolled up to these dimensions '
+                  '(none for the single best row)')
+  sys.exit(main(ap.parse_args()))
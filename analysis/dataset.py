@@ -0,0 +1,152 @@
+import pandas
+
+from analysis import column_cache
+from analysis import predicate
+
+
+# Rows per Parquet row group, the unit that filters can skip
+RowGroupSize = 1 << 20
+
+
+def _pyarrow():
+  # pyarrow is only needed for Parquet files
+  try:
+    import pyarrow
+    import pyarrow.compute
+    import pyarrow.csv
+    import pyarrow.parquet
+  except ImportError as ex:
+    raise ImportError('Parquet files need pyarrow (pip3 install pyarrow)') \
+      from ex
+  return pyarrow
+
+
+def is_parquet(filename):
+  return filename.endswith('.parquet')
+
+
+def _typed(value, arrow_type):
+  pa = _pyarrow()
+  if pa.types.is_boolean(arrow_type):
+    return value in ['True', '1']
+  if pa.types.is_integer(arrow_type):
+    return int(value)
+  if pa.types.is_floating(arrow_type):
+    return float(value)
+  return value
+
+
+def _expression(pred, schema):
+  """Returns 'pred' as an Arrow expression over a table of 'schema'."""
+  pc = _pyarrow().compute
+  expr = None
+  for clause in pred.clauses:
+    any_expr = None
+    for column, value in clause:
+      term = pc.field(column) == _typed(value, schema.field(column).type)
+      any_expr = term if any_expr is None else any_expr | term
+    expr = any_expr if expr is None else expr & any_expr
+  return expr
+
+
+def _convert(source, dest, pred, columns, float_ints):
+  pa = _pyarrow()
+  read_options = pa.csv.ReadOptions(block_size=64 << 20)
+  column_types = None
+  if float_ints:
+    with pa.csv.open_csv(source, read_options=read_options) as reader:
+      column_types = {field.name: pa.float64() for field in reader.schema
+                      if pa.types.is_integer(field.type)}
+  convert_options = pa.csv.ConvertOptions(include_columns=columns,
+                                          column_types=column_types)
+  read = 0
+  written = 0
+  writer = None
+  with pa.csv.open_csv(source, read_options=read_options,
+                       convert_options=convert_options) as reader:
+    expr = _expression(pred, reader.schema) if pred is not None else None
+    writer = pa.parquet.ParquetWriter(dest, reader.schema,
+                                      compression='zstd')
+    try:
+      for batch in reader:
+        table = pa.Table.from_batches([batch])
+        read += table.num_rows
+        if expr is not None:
+          table = table.filter(expr)
+        written += table.num_rows
+        writer.write_table(table, row_group_size=RowGroupSize)
+    finally:
+      writer.close()
+  return read, written
+
+
+def write_parquet(source, dest, pred=None, columns=None):
+  """Converts an all executions CSV file to Parquet, keeping only the rows
+  that 'pred' selects and 'columns' (see predicate.filter_csv()). The CSV is
+  streamed in blocks. Strings are dictionary encoded and the file is written
+  in row groups with statistics such that readers can skip most of it.
+
+  Returns:
+    (int, int): Number of rows read and written
+  """
+  pa = _pyarrow()
+  try:
+    return _convert(source, dest, pred, columns, False)
+  except pa.ArrowInvalid:
+    # A column looked like integers in the first block but isn't
+    return _convert(source, dest, pred, columns, True)
+
+
+def column_names(filename):
+  """Returns the column names of an all executions output, CSV or Parquet,
+  without reading its rows."""
+  if is_parquet(filename):
+    return list(_pyarrow().parquet.read_schema(filename).names)
+  return list(pandas.read_csv(filename, nrows=0).columns)
+
+
+def read_frame(filename, columns=None, where=None, cache=True):
+  """Reads an all executions output, CSV or Parquet, into a data frame.
+
+  Args:
+    filename (str): The output file
+    columns (list): If given, only these columns are read
+    where (list): If given, only the rows these clauses select are read, see
+      predicate.Predicate. For Parquet, row groups that can't match aren't
+      even read.
+    cache (bool): For CSV, read through the column cache next to the file
+      (see column_cache.ColumnCache) instead of parsing it
+
+  Returns:
+    df (DataFrame): The data
+  """
+  pred = predicate.Predicate(where) if where is not None else None
+  if is_parquet(filename):
+    pa = _pyarrow()
+    schema = pa.parquet.read_schema(filename)
+    strings = [field.name for field in schema
+               if pa.types.is_string(field.type) and
+               (columns is None or field.name in columns)]
+    table = pa.parquet.read_table(
+      filename, columns=columns,
+      filters=_expression(pred, schema) if pred is not None else None,
+      read_dictionary=strings)
+    return table.to_pandas()
+
+  if cache:
+    df = column_cache.read_frame(filename, columns, pred)
+    if df is not None:
+      return df
+
+  usecols = None
+  if columns is not None:
+    usecols = list(columns)
+    if pred is not None:
+      usecols.extend(column for column in pred.columns
+                     if column not in usecols)
+  df = pandas.read_csv(filename, usecols=usecols)
+  if pred is not None:
+    df = df[pred.mask(df)]
+  if columns is not None:
+    df = df[[column for column in df.columns if column in columns]]
+  return df
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas
+
+
+# Groups that are numbered by their values without renumbering
+GroupsLimit = 1 << 20
+
+
+def group_ids(df, by):
+  """Numbers the groups of the rows of a data frame without sorting. Some
+  numbers may have no rows.
+
+  Args:
+    df (DataFrame): The rows
+    by (list): The columns to group by, None for a single group
+
+  Returns:
+    ids, groups (ndarray, int): The group of each row and the number of
+      group numbers
+  """
+  rows = df.shape[0]
+  if not by:
+    return np.zeros(rows, dtype=np.int64), min(rows, 1)
+  ids = None
+  groups = 1
+  for column in by:
+    codes, uniques = pandas.factorize(df[column], use_na_sentinel=False)
+    codes = codes.astype(np.int64)
+    if ids is None:
+      ids = codes
+    elif groups * len(uniques) <= max(rows, GroupsLimit):
+      ids = ids * len(uniques) + codes
+    else:
+      # Renumbers the groups that exist such that it can't overflow
+      ids, uniques = pandas.factorize(ids * len(uniques) + codes)
+      ids = ids.astype(np.int64)
+      groups = 1
+    groups *= len(uniques)
+  return ids, groups
+
+
+def _extreme(values, direction):
+  if values.dtype.kind == 'f':
+    return -np.inf if direction == 'max' else np.inf
+  if values.dtype.kind == 'b':
+    return False if direction == 'max' else True
+  info = np.iinfo(values.dtype)
+  return info.min if direction == 'max' else info.max
+
+
+def group_argmax(df, order, by=None):
+  """Finds the best row of each group in one pass per column of 'order',
+  without sorting. The best row has the highest (or lowest) value of the
+  first column, ties are broken by the next column, and remaining ties by
+  the first row. Rows with a missing value in 'order' never win.
+
+  Args:
+    df (DataFrame): The rows
+    order (list): (column, 'max' or 'min') tuples, most significant first
+    by (list): The columns to group by, None for a single group
+
+  Returns:
+    positions (ndarray): Positions of the best rows in ascending order, one
+      per group that has a candidate
+  """
+  ids, groups = group_ids(df, by)
+  candidates = np.ones(df.shape[0], dtype=bool)
+  for column, direction in order:
+    values = df[column].to_numpy()
+    if values.dtype.kind == 'f':
+      candidates &= ~np.isnan(values)
+    elif values.dtype.kind not in 'biu':
+      values = values.astype(np.float64)
+      candidates &= ~np.isnan(values)
+    ufunc = np.maximum if direction == 'max' else np.minimum
+    best = np.full(groups, _extreme(values, direction), dtype=values.dtype)
+    ufunc.at(best, ids[candidates], values[candidates])
+    candidates &= values == best[ids]
+
+  positions = np.full(groups, df.shape[0], dtype=np.int64)
+  np.minimum.at(positions, ids[candidates],
+                np.flatnonzero(candidates))
+  return np.sort(positions[positions < df.shape[0]])
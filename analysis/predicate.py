@@ -0,0 +1,130 @@
+import csv
+import gzip
+import pandas
+
+
+def parse_clause(text):
+  """Parses a clause written as 'column=value|column=value'.
+
+  Returns:
+    clause (list): (column, value) tuples, values are strings
+  """
+  clause = []
+  for term in text.split('|'):
+    column, sep, value = term.partition('=')
+    assert sep == '=', f'Bad clause term: {term}'
+    clause.append((column.strip(), value.strip()))
+  return clause
+
+
+def format_clause(clause):
+  """The inverse of parse_clause()."""
+  return '|'.join(f'{column}={value}' for column, value in clause)
+
+
+def equals(series, value):
+  """Returns the boolean series of the values of a typed column that equal a
+  value given as text, like column_cache.ColumnCache.matches(): booleans match
+  'True' or '1' and 'False' or '0', numbers match by value (e.g., an integer
+  column read as floats because of a missing value), anything else by its
+  text."""
+  if pandas.api.types.is_bool_dtype(series.dtype):
+    return series == (value in ['True', '1'])
+  if pandas.api.types.is_numeric_dtype(series.dtype):
+    try:
+      return series == float(value)
+    except ValueError:
+      return pandas.Series(False, index=series.index)
+  return series.astype(str) == value
+
+
+class Predicate():
+  """This selects rows of all executions results. It is a conjunction of
+  clauses, each clause being a disjunction of 'column == value' terms.
+  Values are given as text. Rows of CSV text are compared by their text as
+  written, e.g., False and 0 match 'False' and '0', data frames by the type
+  of the column, see equals().
+
+  Args:
+    clauses (list): Lists of (column, value) tuples
+  """
+
+  def __init__(self, clauses):
+    self._clauses = [[(column, str(value)) for column, value in clause]
+                     for clause in clauses]
+
+  @property
+  def clauses(self):
+    return self._clauses
+
+  @property
+  def columns(self):
+    """The columns the predicate looks at."""
+    columns = []
+    for clause in self._clauses:
+      for column, _ in clause:
+        if column not in columns:
+          columns.append(column)
+    return columns
+
+  def compile(self, header):
+    """Returns a function that tells whether a CSV row (a list of strings with
+    the columns of 'header') is selected."""
+    index = {column: idx for idx, column in enumerate(header)}
+    missing = [column for column in self.columns if column not in index]
+    assert not missing, f'Unknown columns: {missing}'
+    clauses = [[(index[column], value) for column, value in clause]
+               for clause in self._clauses]
+    def matches(row):
+      return all(any(row[idx] == value for idx, value in clause)
+                 for clause in clauses)
+    return matches
+
+  def mask(self, df):
+    """Returns the boolean series of the rows of a data frame that are
+    selected."""
+    mask = pandas.Series(True, index=df.index)
+    for clause in self._clauses:
+      any_mask = pandas.Series(False, index=df.index)
+      for column, value in clause:
+        any_mask |= equals(df[column], value)
+      mask &= any_mask
+    return mask
+
+
+def open_csv(filename, mode):
+  """Opens a CSV file for text reading ('r') or writing ('w'), gzipped if it
+  ends in '.gz'."""
+  if filename.endswith('.gz'):
+    return gzip.open(filename, mode + 't', newline='')
+  return open(filename, mode, newline='')
+
+
+def filter_csv(source, dest, predicate=None, columns=None):
+  """Copies the rows of 'source' that 'predicate' selects to 'dest', keeping
+  only 'columns' (in the order of 'source'). The file is streamed row by row
+  so it doesn't have to fit in memory.
+
+  Returns:
+    (int, int): Number of rows read and written
+  """
+  read = 0
+  written = 0
+  with open_csv(source, 'r') as src, open_csv(dest, 'w') as dst:
+    reader = csv.reader(src)
+    writer = csv.writer(dst)
+    header = next(reader)
+    matches = predicate.compile(header) if predicate is not None else None
+    keep = list(range(len(header)))
+    if columns is not None:
+      missing = [column for column in columns if column not in header]
+      assert not missing, f'Unknown columns: {missing}'
+      keep = [idx for idx, column in enumerate(header) if column in columns]
+    writer.writerow([header[idx] for idx in keep])
+    for row in reader:
+      read += 1
+      if matches is not None and not matches(row):
+        continue
+      writer.writerow([row[idx] for idx in keep])
+      written += 1
+  return read, written
@@ -0,0 +1,241 @@
+import bisect
+import hashlib
+import json
+import numpy as np
+import os
+import pandas
+import uuid
+
+from analysis import column_cache
+from analysis import groupby
+from analysis import stream
+
+
+# The objectives of the frontiers, most significant first: the highest sample
+# rate for the least HBM, and optionally the least offload bandwidth
+RateMem = [('sample_rate', 'max'), ('proc_mem_tier1_cap_req', 'min')]
+RateMemBw = RateMem + [('offload_mem_bw_req', 'min')]
+
+
+def _better(df, objectives):
+  # The objectives as arrays where higher is better
+  values = []
+  for column, direction in objectives:
+    assert direction in ['max', 'min'], f'Bad direction: {direction}'
+    value = df[column].to_numpy().astype(np.float64)
+    values.append(value if direction == 'max' else -value)
+  return values
+
+
+def frontier(df, objectives, by=None):
+  """Finds the Pareto frontier of the rows of a data frame, per group if 'by'
+  is given: the rows that no other row of the group is at least as good as in
+  all objectives. Of rows that are equal in all objectives, only the first is
+  kept. Rows with a missing objective are ignored.
+
+  Two objectives are swept after one O(n log n) sort with NumPy. Three are
+  swept with a staircase of the rows seen so far, O(n log n) as well but in
+  Python.
+
+  Args:
+    df (DataFrame): The rows
+    objectives (list): 2 or 3 (column, 'max' or 'min') tuples
+    by (list): The columns to group by, None for a single group
+
+  Returns:
+    positions (ndarray): Positions of the frontier rows in ascending order
+  """
+  assert len(objectives) in [2, 3], 'Frontiers have 2 or 3 objectives'
+  ids, _ = groupby.group_ids(df, by)
+  values = _better(df, objectives)
+  valid = np.ones(df.shape[0], dtype=bool)
+  for value in values:
+    valid &= ~np.isnan(value)
+  positions = np.flatnonzero(valid)
+  ids = ids[valid]
+  values = [value[valid] for value in values]
+
+  # Group by group, the best rows in the last objective come first, then in
+  # the others, then the first row
+  order = np.lexsort([positions] + [-value for value in values[:-1]] +
+                     [-values[-1], ids])
+  ids = ids[order]
+  values = [value[order] for value in values]
+  starts = np.ones(len(ids), dtype=bool)
+  starts[1:] = ids[1:] != ids[:-1]
+
+  if len(objectives) == 2:
+    # A row is on the frontier if it beats all rows before it in the first
+    # objective, they are at least as good in the second
+    best = pandas.Series(values[0]).groupby(ids).cummax().to_numpy()
+    before = np.empty(len(ids))
+    before[1:] = best[:-1]
+    before[starts] = -np.inf
+    keep = values[0] > before
+  else:
+    # A row is on the frontier if no row before it is at least as good in
+    # the first two objectives. The staircase holds the rows of the frontier
+    # seen so far by increasing first and decreasing second objective.
+    keep = np.zeros(len(ids), dtype=bool)
+    for idx, (start, first, second) in enumerate(zip(
+        starts.tolist(), values[0].tolist(), values[1].tolist())):
+      if start:
+        firsts = []
+        seconds = []
+      at = bisect.bisect_left(firsts, first)
+      if at < len(firsts) and seconds[at] >= second:
+        continue
+      keep[idx] = True
+      low = at
+      while low > 0 and seconds[low - 1] <= second:
+        low -= 1
+      if at < len(firsts) and firsts[at] == first:
+        at += 1
+      firsts[low:at] = [first]
+      seconds[low:at] = [second]
+  return np.sort(positions[order][keep])
+
+
+def best_under(rows, objectives, caps=None, by=None):
+  """Returns the best row under caps, per group if 'by' is given, from the
+  rows of a frontier. This is the same row that the highest value of the
+  first objective, ties broken by the others in turn and then by the first
+  row, gives on all rows, e.g., stream.Best with stream.MaxRateMinMem and a
+  'proc_mem_tier1_cap_req <= cap' selection.
+
+  Args:
+    rows (DataFrame): The rows of a frontier with the same objectives
+    objectives (list): (column, 'max' or 'min') tuples
+    caps (dict): Upper limits by column, e.g., {'proc_mem_tier1_cap_req':
+      80 * 1024**3}
+    by (list): The columns to group by, None for a single group
+
+  Returns:
+    best (Series or dict): As stream.Best.result()
+  """
+  for column, cap in (caps or {}).items():
+    rows = rows[rows[column] <= cap]
+  best = stream.Best(objectives, by=by)
+  best.update(rows)
+  return best.result()
+
+
+class Frontier():
+  """This keeps the Pareto frontier of the rows it is fed, see frontier(). It
+  can be used with stream.reduce(). The frontier of the rows fed so far is
+  merged with the frontier of each new chunk, earlier rows win ties.
+
+  Args:
+    objectives (list): 2 or 3 (column, 'max' or 'min') tuples
+    select (function): If given, maps a data frame to the boolean series of
+      the rows to consider
+    by (list): If given, the columns to group by
+  """
+
+  def __init__(self, objectives, select=None, by=None):
+    self._objectives = objectives
+    self._select = select
+    self._by = by
+    self._rows = None
+    self._count = 0
+
+  @property
+  def rows(self):
+    """The number of rows that were considered so far."""
+    return self._count
+
+  def _reduce(self, df):
+    return df.iloc[frontier(df, self._objectives, self._by)]
+
+  def update(self, df):
+    if self._select is not None:
+      df = df[self._select(df)]
+    self._count += df.shape[0]
+    rows = self._reduce(df)
+    if self._rows is not None:
+      rows = self._reduce(pandas.concat([self._rows, rows]))
+    self._rows = rows
+
+  def result(self):
+    """Returns the frontier rows as a data frame indexed by row number."""
+    return self._rows
+
+
+class SkylineFile():
+  """This is the frontier of an all executions output, persisted next to it
+  in OUTPUT.skyline/ as a CSV file of its rows with the row numbers of the
+  output. Like the column cache, it is keyed by the SHA-256 of the output,
+  and also by everything that defines it.
+
+  Args:
+    source (str): The all executions output
+    objectives (list): 2 or 3 (column, 'max' or 'min') tuples
+    by (list): If given, the columns to group by
+    where (list): If given, only the rows these clauses select are
+      considered, see predicate.Predicate
+    columns (list): If given, the columns that are kept, it must include
+      the objectives and 'by'
+  """
+
+  def __init__(self, source, objectives, by=None, where=None, columns=None):
+    self._source = source
+    self.objectives = objectives
+    self.by = by
+    self.where = where
+    self.columns = columns
+    spec = json.dumps({'objectives': objectives, 'by': by, 'where': where,
+                       'columns': columns}, sort_keys=True)
+    key = hashlib.sha256(spec.encode()).hexdigest()[:16]
+    self._dir = f'{source}.skyline'
+    self._meta_file = os.path.join(self._dir, f'{key}.json')
+    self._rows_file = os.path.join(self._dir, f'{key}.csv')
+
+  def load(self):
+    """Returns the persisted frontier rows, None if they are missing or
+    stale."""
+    try:
+      with open(self._meta_file) as fd:
+        meta = json.load(fd)
+    except (OSError, ValueError):
+      return None
+    matches, refreshed = column_cache.check_source(meta, self._source)
+    if not matches:
+      return None
+    if refreshed:
+      try:
+        column_cache.write_json(meta, self._meta_file)
+      except OSError:
+        pass
+    return pandas.read_csv(self._rows_file, index_col='row',
+                           float_precision='round_trip')
+
+  def reducer(self):
+    """Returns a Frontier that computes what store() takes."""
+    return Frontier(self.objectives, by=self.by)
+
+  def store(self, rows):
+    """Persists the frontier rows. A failure only prints a message."""
+    try:
+      os.makedirs(self._dir, exist_ok=True)
+      meta = {'sha256': column_cache.source_hash(self._source),
+              'source': column_cache.source_stat(self._source),
+              'rows': rows.shape[0]}
+      tmp = f'{self._rows_file}.{uuid.uuid4().hex}'
+      rows.to_csv(tmp, index_label='row')
+      os.replace(tmp, self._rows_file)
+      column_cache.write_json(meta, self._meta_file)
+    except OSError as ex:
+      print(f'Frontier of {self._source} not written: {ex}')
+
+  def compute(self):
+    """Returns the frontier rows, streaming the output if they aren't
+    persisted yet."""
+    rows = self.load()
+    if rows is None:
+      reducer = self.reducer()
+      stream.reduce(self._source, [reducer], self.columns, self.where)
+      rows = reducer.result()
+      if rows is None:
+        rows = pandas.DataFrame(columns=self.columns)
+      self.store(rows)
+    return rows
@@ -0,0 +1,156 @@
+import pandas
+
+from analysis import column_cache
+from analysis import dataset
+from analysis import groupby
+from analysis import predicate
+
+
+# Source rows per chunk
+ChunkRows = 1 << 18
+
+# The order of the best row in the plot scripts: the highest sample rate, ties
+# broken by the least HBM, remaining ties by the first row
+MaxRate = [('sample_rate', 'max')]
+MaxRateMinMem = [('sample_rate', 'max'), ('proc_mem_tier1_cap_req', 'min')]
+
+
+def chunks(filename, columns=None, where=None, chunk_rows=ChunkRows,
+           cache=True):
+  """Yields an all executions output, CSV or Parquet, as data frames of up to
+  'chunk_rows' source rows, such that memory doesn't depend on the file size.
+  The index holds the row numbers of the source. CSV files are read through
+  their column cache (see column_cache.ColumnCache), which is built in
+  chunks if needed.
+
+  Args:
+    filename (str): The output file
+    columns (list): If given, only these columns are read
+    where (list): If given, only the rows these clauses select are yielded,
+      see predicate.Predicate
+    chunk_rows (int): Source rows per chunk
+    cache (bool): For CSV, read through the column cache instead of parsing
+      the file
+  """
+  pred = predicate.Predicate(where) if where is not None else None
+  if dataset.is_parquet(filename):
+    pa = dataset._pyarrow()
+    pfile = pa.parquet.ParquetFile(filename)
+    expr = None
+    if pred is not None:
+      expr = dataset._expression(pred, pfile.schema_arrow)
+    needed = columns
+    if columns is not None and pred is not None:
+      needed = list(columns) + [column for column in pred.columns
+                                if column not in columns]
+    start = 0
+    for batch in pfile.iter_batches(batch_size=chunk_rows, columns=needed):
+      table = pa.Table.from_batches([batch])
+      index = pa.array(range(start, start + table.num_rows))
+      start += table.num_rows
+      if expr is not None:
+        table = table.append_column('__row', index).filter(expr)
+        index = table.column('__row')
+        table = table.drop_columns(['__row'])
+      if columns is not None:
+        table = table.select([name for name in table.column_names
+                              if name in columns])
+      df = table.to_pandas()
+      df.index = index.to_numpy()
+      yield df
+    return
+
+  if cache:
+    cached = column_cache.open_cache(filename, chunk_rows)
+    if cached is not None:
+      yield from cached.chunks(columns, pred, chunk_rows)
+      return
+
+  usecols = None
+  if columns is not None:
+    usecols = list(columns)
+    if pred is not None:
+      usecols.extend(column for column in pred.columns
+                     if column not in usecols)
+  for df in pandas.read_csv(filename, usecols=usecols, chunksize=chunk_rows):
+    if pred is not None:
+      df = df[pred.mask(df)]
+    if columns is not None:
+      df = df[[column for column in df.columns if column in columns]]
+    yield df
+
+
+class Best():
+  """This keeps the best row of the rows it is fed, per group if 'by' is
+  given. Rows are ordered by 'order', a list of (column, 'max' or 'min'),
+  and remaining ties go to the row fed first. Rows with a missing value in
+  'order' never win. This is what filtering a whole data frame to the rows
+  equal to the max (or min) of each column in turn and taking the first row
+  gives, but only the best rows are kept in memory.
+
+  Args:
+    order (list): (column, 'max' or 'min') tuples, most significant first
+    select (function): If given, maps a data frame to the boolean series of
+      the rows to consider
+    by (list): If given, the columns to group by
+  """
+
+  def __init__(self, order, select=None, by=None):
+    for _, direction in order:
+      assert direction in ['max', 'min'], f'Bad direction: {direction}'
+    self._order = order
+    self._select = select
+    self._by = by
+    self._best = None
+    self._rows = 0
+
+  @property
+  def rows(self):
+    """The number of rows that were considered so far."""
+    return self._rows
+
+  def _reduce(self, df):
+    return df.iloc[groupby.group_argmax(df, self._order, self._by)]
+
+  def update(self, df):
+    """Feeds a chunk of rows, later chunks must come after earlier ones."""
+    if self._select is not None:
+      df = df[self._select(df)]
+    self._rows += df.shape[0]
+    best = self._reduce(df)
+    if self._best is not None:
+      # The kept rows come first such that they win ties
+      best = self._reduce(pandas.concat([self._best, best]))
+    self._best = best
+
+  def result(self):
+    """Returns the best row as a Series, None if there is none. With 'by',
+    returns a dict of the best rows by group key instead (a tuple for several
+    columns)."""
+    if self._by is None:
+      if self._best is None or self._best.shape[0] == 0:
+        return None
+      return self._best.iloc[0]
+    if self._best is None:
+      return {}
+    best = {}
+    for _, row in self._best.iterrows():
+      key = tuple(row[column] for column in self._by)
+      best[key if len(key) > 1 else key[0]] = row
+    return best
+
+
+def reduce(filename, reducers, columns=None, where=None,
+           chunk_rows=ChunkRows, cache=True):
+  """Streams an all executions output through reducers such as Best, see
+  chunks().
+
+  Returns:
+    rows (int): The number of rows that were read
+  """
+  rows = 0
+  for df in chunks(filename, columns, where, chunk_rows, cache):
+    rows += df.shape[0]
+    for reducer in reducers:
+      reducer.update(df)
+  return rows
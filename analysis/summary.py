@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import math
+import numpy as np
+import sys
+
+from analysis import column_cache
+from analysis import stream
+
+
+# Relative error of the values that the histogram gives back
+RelativeError = 0.001
+
+# Number of the highest values that are kept exactly
+TopCount = 100
+
+
+def summary_file(source):
+  """Returns the file that holds the summary of 'source'."""
+  return f'{source}.summary.json'
+
+
+class LogHistogram():
+  """This is a mergeable histogram of values in logarithmic buckets, such that
+  the value of a bucket is within 'alpha' (relative) of every value in it,
+  whatever the range of the values. Bucket i holds the values in
+  (gamma^(i-1), gamma^i] with gamma = (1 + alpha) / (1 - alpha). Values that
+  aren't positive share a bucket of their own and missing values are ignored.
+  The count, minimum, and maximum are exact. Memory depends on the range of
+  the values but not on their number.
+
+  Args:
+    alpha (float): The relative error of the values
+  """
+
+  def __init__(self, alpha=RelativeError):
+    assert 0 < alpha < 1, f'Bad relative error: {alpha}'
+    self.alpha = alpha
+    self._gamma = (1 + alpha) / (1 - alpha)
+    self._log_gamma = math.log(self._gamma)
+    self._buckets = {}
+    self._nonpositive = 0
+    self.count = 0
+    self.min = None
+    self.max = None
+
+  def update(self, values):
+    """Adds an array of values."""
+    values = np.asarray(values, dtype=np.float64)
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+      return
+    self.count += len(values)
+    low, high = float(values.min()), float(values.max())
+    self.min = low if self.min is None else min(self.min, low)
+    self.max = high if self.max is None else max(self.max, high)
+    positive = values[values > 0]
+    self._nonpositive += len(values) - len(positive)
+    if len(positive) > 0:
+      indices = np.ceil(np.log(positive) / self._log_gamma).astype(np.int64)
+      indices, counts = np.unique(indices, return_counts=True)
+      for index, count in zip(indices.tolist(), counts.tolist()):
+        self._buckets[index] = self._buckets.get(index, 0) + count
+
+  def merge(self, other):
+    """Adds the values of another histogram with the same relative error."""
+    assert other.alpha == self.alpha, 'Histograms have different errors'
+    if other.count == 0:
+      return
+    for index, count in other._buckets.items():
+      self._buckets[index] = self._buckets.get(index, 0) + count
+    self._nonpositive += other._nonpositive
+    self.count += other.count
+    self.min = other.min if self.min is None else min(self.min, other.min)
+    self.max = other.max if self.max is None else max(self.max, other.max)
+
+  def values(self):
+    """Returns the values of the buckets in ascending order with their counts,
+    as arrays. Values are clipped to the exact minimum and maximum."""
+    indices = np.array(sorted(self._buckets), dtype=np.int64)
+    counts = np.array([self._buckets[index] for index in indices.tolist()],
+                      dtype=np.int64)
+    values = 2 * self._gamma ** indices.astype(np.float64) / (self._gamma + 1)
+    if self._nonpositive > 0:
+      values = np.concatenate([[min(self.min, 0.0)], values])
+      counts = np.concatenate([[self._nonpositive], counts])
+    if self.count > 0:
+      values = np.clip(values, self.min, self.max)
+    return values, counts
+
+  def histogram(self, bins=10):
+    """Returns the counts of 'bins' equal bins between the minimum and the
+    maximum and their edges, like numpy.histogram() of the values."""
+    values, counts = self.values()
+    value_range = None if self.count == 0 else (self.min, self.max)
+    return np.histogram(values, bins=bins, range=value_range, weights=counts)
+
+  def quantile(self, q):
+    """Returns the value at quantile 'q' (0 to 1), None without values."""
+    if self.count == 0:
+      return None
+    values, counts = self.values()
+    rank = q * (self.count - 1)
+    return float(values[np.searchsorted(np.cumsum(counts), rank,
+                                        side='right')])
+
+  def to_dict(self):
+    return {'alpha': self.alpha, 'count': self.count, 'min': self.min,
+            'max': self.max, 'nonpositive': self._nonpositive,
+            'buckets': [[index, self._buckets[index]]
+                        for index in sorted(self._buckets)]}
+
+  @staticmethod
+  def from_dict(data):
+    hist = LogHistogram(data['alpha'])
+    hist.count = data['count']
+    hist.min = data['min']
+    hist.max = data['max']
+    hist._nonpositive = data['nonpositive']
+    hist._buckets = {index: count for index, count in data['buckets']}
+    return hist
+
+
+class TopK():
+  """This keeps the 'k' highest values it is fed, exactly. It is mergeable
+  and never holds more than 2k values.
+
+  Args:
+    k (int): The number of values to keep
+  """
+
+  def __init__(self, k=TopCount):
+    self.k = k
+    self._values = np.empty(0, dtype=np.float64)
+
+  def update(self, values):
+    """Adds an array of values, missing values are ignored."""
+    values = np.asarray(values, dtype=np.float64)
+    values = values[~np.isnan(values)]
+    if len(values) > self.k:
+      values = np.partition(values, len(values) - self.k)[-self.k:]
+    values = np.concatenate([self._values, values])
+    if len(values) > self.k:
+      values = np.partition(values, len(values) - self.k)[-self.k:]
+    self._values = values
+
+  def merge(self, other):
+    self.update(other._values)
+
+  def values(self):
+    """Returns the kept values in ascending order."""
+    return np.sort(self._values)
+
+
+class Summary():
+  """This is a constant memory summary of a column of an all executions
+  output: the number of rows, a LogHistogram, and the TopK highest values.
+  Summaries of parts of an output can be merged. It can be used with
+  stream.reduce().
+
+  Args:
+    column (str): The column to summarize
+    alpha (float): The relative error of the histogram
+    k (int): The number of highest values to keep
+  """
+
+  def __init__(self, column='sample_rate', alpha=RelativeError, k=TopCount):
+    self.column = column
+    self.rows = 0
+    self.histogram = LogHistogram(alpha)
+    self.top = TopK(k)
+
+  def update(self, df):
+    values = df[self.column].to_numpy()
+    self.rows += len(values)
+    self.histogram.update(values)
+    self.top.update(values)
+
+  def merge(self, other):
+    assert other.column == self.column, 'Summaries of different columns'
+    self.rows += other.rows
+    self.histogram.merge(other.histogram)
+    self.top.merge(other.top)
+
+  def to_dict(self):
+    return {'column': self.column, 'rows': self.rows,
+            'histogram': self.histogram.to_dict(),
+            'top': self.top.values().tolist(), 'k': self.top.k}
+
+  @staticmethod
+  def from_dict(data):
+    summary = Summary(data['column'], data['histogram']['alpha'], data['k'])
+    summary.rows = data['rows']
+    summary.histogram = LogHistogram.from_dict(data['histogram'])
+    summary.top.update(data['top'])
+    return summary
+
+
+def summarize(source, column='sample_rate'):
+  """Returns the Summary of a column of an all executions output, CSV or
+  Parquet, in one streaming pass. CSV files are parsed without writing their
+  column cache."""
+  summary = Summary(column)
+  stream.reduce(source, [summary], [column], cache=False)
+  return summary
+
+
+def write_summary(summary, filename):
+  column_cache.write_json(summary.to_dict(), filename)
+
+
+def read_summary(filename):
+  with open(filename) as fd:
+    return Summary.from_dict(json.load(fd))
+
+
+def main(args):
+  summary = summarize(args.input, args.column)
+  write_summary(summary, args.output or summary_file(args.input))
+  print(f'{args.input}: {summary.rows} rows, {args.column} from '
+        f'{summary.histogram.min} to {summary.histogram.max}')
+  return 0
+
+
+if __name__ == '__main__':
+  ap = argparse.ArgumentParser(
+    description='Summarizes a column of an all executions output in constant '
+    'memory')
+  ap.add_argument('input', type=str,
+                  help='All executions output, CSV or Parquet')
+  ap.add_argument('output', type=str, nargs='?', default=None,
+                  help='Summary file, INPUT.summary.json if not given')
+  ap.add_argument('-c', '--column', type=str, default='sample_rate',
+                  help='Column to summarize')
+  sys.exit(main(ap.parse_args()))
@@ -0,0 +1,423 @@
+import history
+import math
+import os
+import re
+import shlex
+import signal
+import subprocess
+import taskrun
+import threading
+import time
+
+
+def qsub_command(name, command, log, gb, hr, slots, wait):
+  """Returns the command line that submits 'command' as an LSF job.
+
+  Args:
+    name (str): Name of the job
+    command (str): Command string of the job
+    log (str): The job's stdout file, stderr goes to f'{log}.err'
+    gb (int): Memory of the queue
+    hr (int): Hours of the queue
+    slots (int): Number of cores on a single host
+    wait (bool): Whether the command blocks until the job is done
+
+  Returns:
+    cmd (str): The submission command
+  """
+  cmd = (
+    '/home/nv/bin/qsub '
+    '-P research_networking_misc '
+    '-m rel75 '
+    '-env all '
+    '-app affinity '
+    f'-q o_cpu_{gb}G_{hr}H ')
+  if wait:
+    cmd += '-K '
+  cmd += f'-J {name} '
+  if slots > 1:
+    cmd += f'-n {slots} -R \'span[hosts=1]\' '
+  cmd += (
+    f'-oo {log} '
+    f'-eo {log}.err '
+    f'{command} ')
+  return cmd
+
+
+class LsfScheduler():
+  """This submits jobs to LSF without waiting for them and gets the state of
+  all jobs with a single 'bjobs' query.
+  """
+
+  PollInterval = 10
+
+  Running = ['PEND', 'PROV', 'WAIT', 'RUN', 'PSUSP', 'USUSP', 'SSUSP', 'UNKWN']
+
+  def submit(self, name, command, log, gb, hr, slots):
+    """Submits a job.
+
+    Returns:
+      job_id (str): The ID of the job
+    """
+    proc = subprocess.run(
+      qsub_command(name, command, log, gb, hr, slots, wait=False), shell=True,
+      check=True, capture_output=True, text=True)
+    match = re.search(r'Job <(\d+)>', proc.stdout)
+    assert match is not None, f'Unexpected qsub output: {proc.stdout}'
+    return match.group(1)
+
+  def poll(self, job_ids):
+    """Gets the state of jobs.
+
+    Returns:
+      (dict): Job ID to exit code for finished jobs, None for jobs that were
+        killed or that LSF doesn't know
+    """
+    proc = subprocess.run(
+      ['bjobs', '-a', '-noheader', '-o', 'jobid stat exit_code'] +
+      list(job_ids), capture_output=True, text=True)
+    finished = {}
+    for line in proc.stdout.splitlines():
+      fields = line.split()
+      if len(fields) < 2 or fields[0] not in job_ids:
+        continue
+      job_id, stat = fields[0], fields[1]
+      if stat == 'DONE':
+        finished[job_id] = 0
+      elif stat not in self.Running:
+        code = fields[2] if len(fields) > 2 else '-'
+        finished[job_id] = int(code) if code.isdigit() and code != '0' else None
+    for job_id in re.findall(r'Job <(\d+)> is not found', proc.stderr):
+      finished[job_id] = None
+    return finished
+
+  def kill(self, job_id):
+    subprocess.run(['bkill', job_id], capture_output=True)
+
+
+class LocalScheduler():
+  """This is a stand-in for LsfScheduler that runs jobs as local processes.
+  It allows testing the batch backend on a single machine.
+  """
+
+  PollInterval = 0.5
+
+  def __init__(self):
+    self._procs = {}
+    self._count = 0
+
+  def submit(self, name, command, log, gb, hr, slots):
+    self._count += 1
+    job_id = str(self._count)
+    with open(log, 'w') as out_fd, open(f'{log}.err', 'w') as err_fd:
+      self._procs[job_id] = subprocess.Popen(
+        command, shell=True, stdout=out_fd, stderr=err_fd,
+        start_new_session=True)
+    return job_id
+
+  def poll(self, job_ids):
+    finished = {}
+    for job_id in job_ids:
+      code = self._procs[job_id].poll()
+      if code is not None:
+        del self._procs[job_id]
+        finished[job_id] = code if code >= 0 else None
+    return finished
+
+  def kill(self, job_id):
+    proc = self._procs.get(job_id)
+    if proc is not None:
+      try:
+        os.killpg(proc.pid, signal.SIGTERM)
+      except ProcessLookupError:
+        pass
+
+
+def write_bundle(tasks, gb, hr):
+  """Writes a shell script that runs the jobs of several tasks one after the
+  other, each with its own logs. The exit code and the run time in seconds of
+  each command are appended to a status file as '{index} {code} {seconds}'.
+
+  Args:
+    tasks (list): The BatchTasks, all with the same resources
+    gb (int): Memory of the bundle's queue
+    hr (int): Hours of the bundle's queue, enough for all tasks
+
+  Returns:
+    job (tuple): The bundle's job like BatchTask.job
+    status (str): The status file
+  """
+  name, _, log, _, _, slots = tasks[0].job
+  base = f'{log}.bundle'
+  script = f'{base}.sh'
+  status = f'{base}.status'
+  if os.path.exists(status):
+    os.remove(status)
+  with open(script, 'w') as fd:
+    print('#!/bin/sh', file=fd)
+    for index, task in enumerate(tasks):
+      _, command, log, _, _, _ = task.job
+      print('start=$(date +%s)', file=fd)
+      print(f'({command}) 1> {shlex.quote(log)} 2> {shlex.quote(log + ".err")}',
+            file=fd)
+      print('code=$?', file=fd)
+      print(f'echo "{index} $code $(($(date +%s) - start))" >> '
+            f'{shlex.quote(status)}', file=fd)
+  return (f'{name}-bundle{len(tasks)}', f'/bin/sh {script}', base, gb, hr,
+          slots), status
+
+
+def read_bundle(status, count):
+  """Reads the exit codes and run times in seconds of a bundle's commands,
+  (None, None) for commands that didn't finish."""
+  results = [(None, None)] * count
+  if os.path.exists(status):
+    with open(status) as fd:
+      for line in fd:
+        fields = line.split()
+        if len(fields) == 3:
+          results[int(fields[0])] = (int(fields[1]), float(fields[2]))
+  return results
+
+
+class BatchBackend():
+  """This submits the jobs of BatchTasks and tracks them until they finish,
+  all from a single thread. Nothing is blocked per job, so the number of jobs
+  in flight is only limited by the scheduler.
+
+  With a bundle size above one, tasks with the same resources are coalesced
+  into bundle jobs that run their commands one after the other. A bundle's
+  wall time limit is the sum of its tasks' predicted run times
+  (BatchTask.hours, from the runtime history) and, for tasks without one, of
+  their queues' limits. A bundle only holds as many tasks as the longest
+  queue allows, so without predictions, long task classes barely bundle, e.g.,
+  two 8 hour searches per 16 hour queue. Each task still gets its own logs,
+  exit code, and run time (BatchTask.usage). Tasks wait for up to
+  'BundleWait' seconds for a bundle to fill up.
+
+  Args:
+    scheduler: LsfScheduler or LocalScheduler
+    bundle_size (int): Maximum number of tasks per job
+    queues (list): The queues as (GB, hours) that bundles can go to, None if
+      any number of hours is fine
+  """
+
+  BundleWait = 2.0
+
+  def __init__(self, scheduler, bundle_size=1, queues=None):
+    self._scheduler = scheduler
+    self._bundle_size = bundle_size
+    self._queues = queues
+    self._lock = threading.Lock()
+    self._wake = threading.Event()
+    self._submits = []
+    self._pending = {}
+    self._jobs = {}
+    self._thread = None
+
+  def submit(self, task):
+    with self._lock:
+      self._submits.append(task)
+      if self._thread is None:
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+    self._wake.set()
+
+  def kill(self, task):
+    with self._lock:
+      job_id = task.job_id
+    if job_id is None:
+      # Finished on the next round without being submitted
+      self._wake.set()
+    else:
+      self._scheduler.kill(job_id)
+
+  @staticmethod
+  def _hours(task):
+    """Returns the hours a task takes in a bundle: its predicted run time if
+    known, its queue's limit otherwise."""
+    _, _, _, _, hr, _ = task.job
+    return hr if task.hours is None else min(task.hours, hr)
+
+  def _bundleQueue(self, gb, hours):
+    """Returns the smallest queue as (GB, hours) for a bundle that takes
+    'hours' in total, None if no queue is long enough."""
+    if self._queues is None:
+      return gb, math.ceil(hours)
+    queues = [(qgb, qhr) for qgb, qhr in self._queues
+              if qgb >= gb and qhr >= hours]
+    if not queues:
+      return None
+    return min(queues, key=lambda queue: (queue[1], queue[0]))
+
+  def _bundleLength(self, gb, tasks):
+    """Returns how many of the first 'tasks', of queue memory 'gb', fit into a
+    single job."""
+    length = 1
+    hours = self._hours(tasks[0])
+    while length < min(self._bundle_size, len(tasks)):
+      hours += self._hours(tasks[length])
+      if self._bundleQueue(gb, hours) is None:
+        break
+      length += 1
+    return length
+
+  def _submitJob(self, tasks):
+    status = None
+    try:
+      if len(tasks) == 1:
+        job = tasks[0].job
+      else:
+        _, _, _, gb, hr, _ = tasks[0].job
+        job, status = write_bundle(tasks, *self._bundleQueue(
+          gb, sum(self._hours(task) for task in tasks)))
+      job_id = self._scheduler.submit(*job)
+    except Exception as ex:  # pylint: disable=broad-except
+      for task in tasks:
+        task.finish(ex)
+      return
+    with self._lock:
+      for task in tasks:
+        task.job_id = job_id
+      self._jobs[job_id] = (tasks, job, status)
+
+  def _finishJob(self, tasks, job, status, code):
+    if status is None:
+      tasks[0].finish(self._errors(tasks[0], code))
+      return
+    results = read_bundle(status, len(tasks))
+    # LSF reports the peak memory of the whole bundle, a bound for each task
+    log = job[2]
+    _, rss_gb = history.parse_lsf_report(log)
+    # Cleans up before the last task finishes and the run may end
+    if all(task_code == 0 for task_code, _ in results):
+      for filename in [status, f'{log}.sh', log, f'{log}.err']:
+        if os.path.exists(filename):
+          os.remove(filename)
+    for task, (task_code, seconds) in zip(tasks, results):
+      if seconds is not None:
+        task.usage = (seconds, rss_gb)
+      task.finish(self._errors(task, task_code))
+
+  def _run(self):
+    last_poll = 0
+    while True:
+      with self._lock:
+        submits = self._submits
+        self._submits = []
+        if not submits and not self._pending and not self._jobs:
+          self._thread = None
+          return
+
+      # gathers new tasks into bundles by their resources
+      now = time.time()
+      for task in submits:
+        _, _, _, gb, hr, slots = task.job
+        self._pending.setdefault((gb, hr, slots), (now, []))[1].append(task)
+
+      # submits full bundles and the ones that waited long enough
+      for key in list(self._pending):
+        since, tasks = self._pending[key]
+        for task in [task for task in tasks if task.killed]:
+          tasks.remove(task)
+          task.finish(None)
+        while tasks:
+          length = self._bundleLength(key[0], tasks)
+          if (length == len(tasks) and length < self._bundle_size and
+              now - since < self.BundleWait):
+            # More tasks would still fit
+            break
+          self._submitJob(tasks[:length])
+          del tasks[:length]
+        if not tasks:
+          del self._pending[key]
+
+      # polls all jobs at once
+      if now - last_poll >= self._scheduler.PollInterval:
+        last_poll = now
+        with self._lock:
+          job_ids = list(self._jobs)
+        try:
+          finished = self._scheduler.poll(job_ids) if job_ids else {}
+        except OSError:
+          # tries again next time
+          finished = {}
+        for job_id, code in finished.items():
+          with self._lock:
+            job = self._jobs.pop(job_id, None)
+          if job is not None:
+            self._finishJob(*job, code)
+
+      # sleeps until the next poll or bundle submission, or new tasks
+      deadlines = [last_poll + self._scheduler.PollInterval]
+      deadlines.extend(since + self.BundleWait
+                       for since, _ in self._pending.values())
+      self._wake.wait(max(0, min(deadlines) - time.time()))
+      self._wake.clear()
+
+  @staticmethod
+  def _errors(task, code):
+    if code == 0:
+      return None
+    if code is None:
+      if task.killed:
+        return None
+      return f'Job {task.job_id} was killed or lost'
+    return code
+
+
+class BatchTask(taskrun.Task):
+  """This is a task that runs as a batch job. It doesn't have a thread of its
+  own while the job runs, the BatchBackend reports the job's completion.
+  """
+
+  def __init__(self, manager, name, backend, command, log, gb, hr, slots):
+    super().__init__(manager, name)
+    self._backend = backend
+    self._command = command
+    self._log = log
+    self.job = (name, command, log, gb, hr, slots)
+    self.job_id = None
+    self.returncode = None
+    # (seconds, rss_gb) measured by a bundle, None if the job ran alone
+    self.usage = None
+    # Predicted run time in hours that bundles are sized by, None for 'hr'
+    self.hours = None
+
+  @property
+  def log(self):
+    return self._log
+
+  def describe(self):
+    return f'{self._command} 1> {self._log} 2> {self._log}.err'
+
+  def start(self):
+    # Replaces the start of the thread that taskrun.Task is
+    if self.bypass:
+      self.run()
+    else:
+      self._backend.submit(self)
+
+  def execute(self):
+    assert False, 'BatchTasks are executed by their BatchBackend'
+
+  def finish(self, errors):
+    """Reports the end of the job like taskrun.Task.run() does."""
+    self._errors = errors
+    if isinstance(errors, int):
+      self.returncode = errors
+    elif errors is None and not self.killed:
+      self.returncode = 0
+    if self.killed:
+      self._manager.task_killed(self)
+    elif errors is None:
+      self._manager.task_completed(self)
+    else:
+      self._manager.task_failed(self, errors)
+    for dependent in self.get_dependents():
+      dependent.task_done(self)
+
+  def kill(self):
+    if not self.killed and self.returncode is None:
+      self.killed = True
+      self._backend.kill(self)
@@ -1,7 +1,22 @@
+import allexec
+import batch
+import history
+import inproc
+import math
 import os
 import psutil
+import result_cache
+import result_store
+import scheduler
+import shlex
 import taskrun
 import tempfile
+import zygote
+
+from analysis import cube
+from analysis import dataset
+from analysis import predicate
+from analysis import summary
 
 
 class Executor():
@@ -10,13 +25,36 @@ class Executor():
   same file system.
   """
 
-  SupportedModes = ['local', 'local_8', 'nvlsf']
+  SupportedModes = ['local', 'local_8', 'local_inproc', 'local_zygote',
+                    'nvlsf', 'nvlsf_async', 'fakelsf']
+
+  # Modes that run tasks as batch jobs
+  LsfModes = ['nvlsf', 'nvlsf_async', 'fakelsf']
+
+  # LSF queues as (GB, hours), the queue is 'o_cpu_{GB}G_{hours}H'
+  LsfQueues = [(4, 1), (8, 8), (32, 1), (32, 16)]
+
+  # Headroom given to predicted runtime and memory when picking a queue
+  HistoryMargin = 1.5
 
-  def __init__(self, calc_dir, execution_mode, failure_mode = 'passive_fail'):
+  # Size of the optimal execution search that gets all cores in throughput mode
+  ThroughputFullSize = 8192
+
+  def __init__(self, calc_dir, execution_mode, failure_mode = 'passive_fail',
+               cache_dir = None, history_file = None, throughput = False,
+               bundle_size = 1, cubes = False):
     self._calc_dir = calc_dir
     self._mode = execution_mode
+    self._throughput = throughput
+    self._cubes = cubes
+    self._pool = None
+    self._zygote = None
+    self._calcTaskCount = 0
+    self._warmStartTaskCount = 0
+    self._maxMemory = None
+    self._backend = None
     if self._mode.startswith('local'):
-      if self._mode == 'local':
+      if self._mode in ['local', 'local_inproc', 'local_zygote']:
         self._parallelExecutionCores = psutil.cpu_count(logical=False)
         self._singleExecutionSlots = 1
         self._parallelExecutionSlots = psutil.cpu_count(logical=False)
@@ -26,16 +64,37 @@ class Executor():
         self._singleExecutionSlots = 1
         self._parallelExecutionSlots = 8
         self._miscTaskSlots = 1
-      self._tm = taskrun.standard_task_manager(
-        track_cpus = True,
+      # Tasks are packed onto the cores and the currently available memory
+      self._maxMemory = psutil.virtual_memory().available / 1024**3
+      self._tm = scheduler.packing_task_manager(
         max_cpus = self._parallelExecutionSlots,
-        track_memory = False,
-        max_memory = -1,
+        max_memory = self._maxMemory,
         cleanup_files = True,
         failure_mode = failure_mode)
-    elif self._mode == 'nvlsf':
-      self._maxLsfSlotsPerUser = 600
-      self._lsfParallelExecutionCores = 4
+      if self._mode == 'local_inproc':
+        # Calculon runs as function calls inside of these workers
+        self._pool = inproc.create_worker_pool(self._parallelExecutionSlots)
+      elif self._mode == 'local_zygote':
+        # Calculon runs in a child forked from the zygote for each task
+        self._zygote = zygote.Zygote()
+    elif self._mode in self.LsfModes:
+      if self._mode == 'nvlsf':
+        self._maxLsfSlotsPerUser = 600
+        self._lsfParallelExecutionCores = 4
+      elif self._mode == 'nvlsf_async':
+        # Jobs in flight don't hold anything on this machine
+        self._maxLsfSlotsPerUser = 10000
+        self._lsfParallelExecutionCores = 4
+        self._backend = batch.BatchBackend(batch.LsfScheduler(),
+                                           bundle_size, self.LsfQueues)
+      elif self._mode == 'fakelsf':
+        # Runs the jobs of 'nvlsf_async' as local processes for testing, the
+        # tasks of a bundle run one after the other
+        cores = psutil.cpu_count(logical=False)
+        self._maxLsfSlotsPerUser = cores * bundle_size
+        self._lsfParallelExecutionCores = min(4, cores)
+        self._backend = batch.BatchBackend(batch.LocalScheduler(),
+                                           bundle_size)
       self._tm = taskrun.standard_task_manager(
         track_cpus = True,
         max_cpus = self._maxLsfSlotsPerUser,
@@ -49,6 +108,35 @@ class Executor():
     else:
       assert False
 
+    # Calculon runs by their specification, see result_cache.calc_spec()
+    self._calcTasks = []
+    self._duplicates = {}
+    self._functionTasks = {}
+
+    # Cube tasks with the all executions task they read, see
+    # Executor._createCubeTasks()
+    self._cubeTasks = []
+
+    # Optional content addressed cache of Calculon results
+    self._cache = None
+    if cache_dir is not None:
+      self._cache = result_cache.ResultCache(
+        cache_dir, result_cache.calculon_version(self._calc_dir))
+      self._tm.add_observer(result_cache.ResultCacheObserver())
+
+    # Optional history of measured Calculon runs for predicting new ones
+    self._history = None
+    self._historyTasks = {}
+    if history_file is not None:
+      self._history = history.TaskHistory(history_file)
+      self._tm.add_observer(history.HistoryObserver(
+        self._history, self._historyTasks))
+
+    # Optional result stores that tasks commit their outputs to
+    self._stores = {}
+    self._storeTasks = {}
+    self._tm.add_observer(result_store.ResultStoreObserver(self._storeTasks))
+
   @property
   def calcDir(self):
     return self._calc_dir
@@ -61,7 +149,35 @@ class Executor():
   def parallelExecutionCores(self):
     return self._parallelExecutionCores
 
-  def createTask(self, task_type, name, command, log):
+  def optimalExecutionCores(self, num_procs):
+    """Returns the number of cores an optimal execution search of 'num_procs'
+    processors uses. In throughput mode, the cores are proportional to the
+    size of the search such that many small searches run side by side and only
+    the biggest searches get all cores. Otherwise, searches use all cores."""
+    if not self._throughput:
+      return self._parallelExecutionCores
+    cores = math.ceil(self._parallelExecutionCores * num_procs /
+                      self.ThroughputFullSize)
+    return max(1, min(self._parallelExecutionCores, cores))
+
+  @property
+  def maxMemory(self):
+    """The memory in GiB that local tasks are packed into."""
+    return self._maxMemory
+
+  @property
+  def calcTaskCount(self):
+    """The number of created tasks that run a Calculon command line."""
+    return self._calcTaskCount
+
+  @property
+  def warmStartTaskCount(self):
+    """The number of created optimal execution tasks that may be warm started,
+    see createOptimalExecutionTask()."""
+    return self._warmStartTaskCount
+
+  def createTask(self, task_type, name, command, log, key = None,
+                 cores = None):
     """Generates an appropriately created taskrun.Task.
 
     Args:
@@ -72,6 +188,12 @@ class Executor():
         command line
       log (str): The log file that is used for stdout. Stderr should be:
         f'{log}.err'
+      key (tuple): Optional history key of the run, see history.task_key().
+        Measurements of the run are recorded under it and, if the history can
+        predict the run, the task is prioritized longest first and in 'nvlsf'
+        mode sent to the smallest queue that fits.
+      cores (int): For 'OptimalExecution' and 'AllExecutions', the number of
+        cores the command uses if not 'parallelExecutionCores'
 
     Returns:
       task (Task): The created task.
@@ -106,39 +228,80 @@ class Executor():
     elif task_type == 'OptimalExecution':
       gb = 8
       hr = 8
-      slots = self._parallelExecutionSlots
+      slots = self._parallelExecutionSlots if cores is None else cores
     elif task_type == 'AllExecutions':
       gb = 32
       hr = 16
-      slots = self._parallelExecutionSlots
+      slots = self._parallelExecutionSlots if cores is None else cores
     elif task_type == 'MiscProcess':
       gb = 32
       hr = 1
       slots = self._miscTaskSlots
     else:
       assert False, 'bad programmer :('
-    return self.createProcessTask(name, command, log, gb, hr, slots)
+    if key is None or self._history is None:
+      return self.createProcessTask(name, command, log, gb, hr, slots)
+
+    seconds, rss_gb = self._history.predict(key)
+    if seconds is not None and self._mode in ['nvlsf', 'nvlsf_async']:
+      gb, hr = self._lsfQueue(gb, hr, seconds, rss_gb)
+    task = self.createProcessTask(name, command, log, gb, hr, slots)
+    if seconds is not None:
+      task.priority = history.priority(seconds)
+      if isinstance(task, batch.BatchTask):
+        task.hours = seconds * self.HistoryMargin / 3600
+    lsf_log = log if self._mode in ['nvlsf', 'nvlsf_async'] else None
+    self._historyTasks[task] = (key, lsf_log)
+    return task
+
+  def _lsfQueue(self, gb, hr, seconds, rss_gb):
+    """Returns the smallest LSF queue as (GB, hours) that fits the predicted
+    runtime and memory with some margin, but never a bigger one than (gb, hr).
+    """
+    need_hr = seconds * self.HistoryMargin / 3600
+    need_gb = gb if rss_gb is None else rss_gb * self.HistoryMargin
+    queues = [(qgb, qhr) for qgb, qhr in self.LsfQueues
+              if need_gb <= qgb <= gb and need_hr <= qhr <= hr]
+    if not queues:
+      return gb, hr
+    return min(queues, key=lambda queue: (queue[1], queue[0]))
 
   def createProcessTask(self, name, command, log, gb, hr, slots):
+    if self._mode.startswith('local'):
+      # A machine with less memory than declared still runs the task, alone
+      gb = min(gb, self._maxMemory)
+
+    argv = shlex.split(command)
+    if argv[0] == self.calcBin:
+      self._calcTaskCount += 1
+      if self._pool is not None:
+        task = inproc.InProcessTask(self._tm, name, self._pool, argv[0],
+                                    argv[1:], log, gb)
+      elif self._zygote is not None:
+        task = zygote.ZygoteTask(self._tm, name, self._zygote, argv[0],
+                                 argv[1:], log, gb)
+      else:
+        task = None
+      if task is not None:
+        task.resources = {
+          'cpus': slots,
+          'mem': gb
+        }
+        return task
+
+    if self._backend is not None:
+      task = batch.BatchTask(self._tm, name, self._backend, command, log, gb,
+                             hr, slots)
+      task.resources = {
+        'cpus': slots
+      }
+      return task
+
     if self._mode.startswith('local'):
       cmd = command
       log = log
     elif self._mode == 'nvlsf':
-      cmd = (
-        '/home/nv/bin/qsub '
-        '-P research_networking_misc '
-        '-m rel75 '
-        '-env all '
-        '-app affinity '
-        f'-q o_cpu_{gb}G_{hr}H '
-        '-K '
-        f'-J {name} ')
-      if slots > 1:
-        cmd += f'-n {slots} -R \'span[hosts=1]\' '
-      cmd += (
-        f'-oo {log} '
-        f'-eo {log}.err '
-        f'{command} ')
+      cmd = batch.qsub_command(name, command, log, gb, hr, slots, wait=True)
       log = ''
     else:
       assert False, 'bad programmer :('
@@ -163,12 +326,13 @@ class Executor():
 
   def createFunctionTask(self, name, func, *args, **kwargs):
     task = taskrun.FunctionTask(self._tm, name, func, *args, **kwargs)
+    self._functionTasks[task] = (func, args, kwargs)
     if self._mode.startswith('local'):
       task.resources = {
         'cpus': 1,
         'mem': 0
       }
-    elif self._mode == 'nvlsf':
+    elif self._mode in self.LsfModes:
       task.resources = {
         'cpus': 1
       }
@@ -176,8 +340,102 @@ class Executor():
       assert False, 'bad programmer :('
     return task
 
+  def storeResults(self, task, store, entries):
+    """Commits the outputs of an optimal execution task to a result store
+    (see result_store.ResultStore) once it completes, or when it is bypassed
+    and they changed since they were committed.
+
+    Args:
+      task (Task): The task
+      store (str): The ResultStore file
+      entries (list): (app, size, system, output) tuples of the outputs of the
+        task
+    """
+    if store not in self._stores:
+      self._stores[store] = result_store.ResultStore(store)
+    self._storeTasks[task] = (self._stores[store], list(entries))
+
+  def _addCalcTask(self, task, spec):
+    self._calcTasks.append((task, spec))
+    return task
+
+  def _materializeInputs(self, task):
+    """Runs the function tasks (e.g., system file generation) that a task
+    depends on right away unless their outputs are up to date. The function
+    tasks are then bypassed when the tasks are run."""
+    for dep in task.get_dependencies():
+      if dep in self._functionTasks:
+        if not dep.conditions or any(c.check() for c in dep.conditions):
+          func, args, kwargs = self._functionTasks.pop(dep)
+          func(*args, **kwargs)
+
+  def deduplicate(self):
+    """Finds Calculon runs that compute the same thing across all items,
+    regardless of the file names they use. Only the first of each set of
+    identical runs is executed, the others take its results.
+
+    Returns:
+      (int, int): Number of deduplicated runs and number of runs
+    """
+    primaries = {}
+    for task, spec in self._calcTasks:
+      self._materializeInputs(task)
+      if not all(os.path.exists(f) for f in spec['files'].values()):
+        continue
+      key = result_cache.content_key(spec)
+      if key not in primaries:
+        primaries[key] = (task, spec)
+        continue
+      primary, primary_spec = primaries[key]
+      task.add_dependency(primary)
+      self._duplicates[task] = primary_spec
+    return len(self._duplicates), len(self._calcTasks)
+
+  def _finalizeConditions(self):
+    # The conditions are only final once all items created their tasks,
+    # deduplication and the cache are put in front of them now.
+    for task, spec in self._calcTasks:
+      if task in self._duplicates:
+        task.conditions = [result_cache.DuplicateCondition(
+          self._duplicates[task], spec, task.conditions)]
+      elif self._cache is not None:
+        task.conditions = [result_cache.ResultCacheCondition(
+          self._cache, spec, task.conditions)]
+    self._calcTasks = []
+    self._duplicates = {}
+
+    # Only the first condition of a task is checked, e.g., an all executions
+    # task with a filter also has the item's condition on its inputs
+    # pylint: disable=protected-access
+    scheduler.combine_conditions(self._tm._waiting_tasks)
+
   def run_tasks(self):
-    return self._tm.run_tasks()
+    self._finalizeConditions()
+
+    # Cubes are built after the other readers of their output, e.g., the
+    # plots, such that they don't compete with them
+    for task, run_task in self._cubeTasks:
+      for dependent in run_task.get_dependents():
+        if dependent is not task and dependent not in task.get_dependencies():
+          task.add_dependency(dependent)
+    self._cubeTasks = []
+
+    try:
+      return self._tm.run_tasks()
+    finally:
+      if self._pool is not None:
+        self._pool.shutdown()
+        self._pool = None
+
+  def measureStartup(self, samples):
+    """Measures the per task startup latency of a Calculon command line when
+    started as a cold subprocess and when forked from a zygote.
+
+    Returns:
+      cold, warm (float, float): Median seconds per start
+    """
+    zyg = self._zygote if self._zygote is not None else zygote.Zygote()
+    return zygote.measure_startup(self.calcBin, zyg, samples)
 
   def test(self, test_command):
     def tfunc(a, b, c):
@@ -207,10 +465,54 @@ class Executor():
       f'{sys} '
       f'{stats} '
     )
-    return self.createTask('SingleExecution', name, cmd, log)
+    task = self.createTask('SingleExecution', name, cmd, log)
+    spec = result_cache.calc_spec(
+      'llm', {'application': app, 'execution': exe, 'system': sys}, {},
+      [stats], log)
+    return self._addCalcTask(task, spec)
+
+  @property
+  def warmBin(self):
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'warm.py')
 
   def createOptimalExecutionTask(self, name, app, num_procs, max_batch_size,
-                                 datatype, sys, output, top_n, fused_act, log):
+                                 datatype, sys, output, top_n, fused_act, log,
+                                 warm_start = None, warm_tolerance = 0):
+    """Creates a task that runs an optimal execution search.
+
+    Args:
+      warm_start (str): If given, the optimal execution output of a
+        neighbouring size. When it is up to date once the task runs, the
+        search is skipped if the neighbour's top executions translated to
+        'num_procs' are at least as efficient as the neighbour's best, see
+        warm.py. The output then holds the translated executions, which isn't
+        exact. The task must depend on the neighbour's task. Either way, the
+        task isn't cached, deduplicated, or recorded in the runtime history.
+      warm_tolerance (float): Accept warm started executions that are up to
+        this much (relative) less efficient than the neighbour's best
+
+    Returns:
+      task (Task): The created task.
+    """
+    cores = self.optimalExecutionCores(num_procs)
+    if warm_start is not None:
+      self._warmStartTaskCount += 1
+      cmd = (
+        f'{self.warmBin} '
+        f'{self.calcBin} '
+        f'{warm_start} '
+        f'{app} '
+        f'{num_procs} '
+        f'{max_batch_size} '
+        f'{datatype} '
+        f'{sys} '
+        f'{output} '
+        f'-c {cores} '
+        f'-f {fused_act} '
+        f'-t {top_n} '
+        f'--tolerance {warm_tolerance} '
+      )
+      return self.createTask('OptimalExecution', name, cmd, log, cores=cores)
     cmd = (
       f'{self.calcBin} '
       'llm-optimal-execution '
@@ -220,16 +522,150 @@ class Executor():
       f'{datatype} '
       f'{sys} '
       f'{output} '
-      f'-c {self._parallelExecutionCores} '
+      f'-c {cores} '
       f'-n '
       f'-m '
       f'-f {fused_act} '
       f'-t {top_n} '
     )
-    return self.createTask('OptimalExecution', name, cmd, log)
+    key = history.task_key('llm-optimal-execution', app, num_procs, sys)
+    task = self.createTask('OptimalExecution', name, cmd, log, key, cores)
+    spec = result_cache.calc_spec(
+      'llm-optimal-execution', {'application': app, 'system': sys},
+      {'num_procs': num_procs, 'max_batch_size': max_batch_size,
+       'datatype': datatype, 'top_n': top_n, 'fused_act': fused_act,
+       'flags': ['-n', '-m']},
+      [output], log)
+    return self._addCalcTask(task, spec)
+
+  @property
+  def sweepBin(self):
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sweep.py')
+
+  def createOptimalExecutionSweepTask(self, name, app, sizes, max_batch_size,
+                                      datatype, sys, output, top_n, fused_act,
+                                      log, sweep_log, tolerance = None,
+                                      coarse = 16, best = False,
+                                      efficiency_slack = None,
+                                      warm_start = None):
+    """Creates a task that runs the optimal execution searches of many sizes in
+    a single process, see sweep.py. Each size gets its own output and log, the
+    same as createOptimalExecutionTask() would produce. With a
+    sweep.SweepCondition on the outputs, a failed task only loses the sizes
+    that didn't complete.
+
+    Args:
+      output (str): Output file of each size, '{size}' is replaced
+      log (str): Log file of each size, '{size}' is replaced
+      sweep_log (str): Log file of the sweep itself
+      tolerance (float): If given, the sweep is adaptive. It starts with every
+        'coarse'-th size and only searches sizes in between where the sample
+        rate changes by more than 'tolerance'. Skipped sizes get an output of
+        {'skipped': true}.
+      best (bool): If True, only the sizes needed to find the size with the
+        best sample rate are searched, the others are skipped as above.
+      efficiency_slack (float): For 'best', assume no size is more than this
+        much (relative) more efficient than the most efficient size searched
+        instead of up to 100% efficient. This finds the best size much faster
+        but isn't exact.
+      warm_start (float): If given, sizes are warm started from the previously
+        searched size where possible, accepting executions that are up to this
+        much (relative) less efficient, see createOptimalExecutionTask().
+
+    Returns:
+      task (Task): The created task.
+    """
+    cores = self.optimalExecutionCores(max(sizes))
+    cmd = (
+      f'{self.sweepBin} '
+      f'{self.calcBin} '
+      f'{app} '
+      f'{max_batch_size} '
+      f'{datatype} '
+      f'{sys} '
+      f'{output} '
+      f'{log} '
+      f'-s {" ".join(str(size) for size in sizes)} '
+      f'-c {cores} '
+      f'-f {fused_act} '
+      f'-t {top_n} '
+    )
+    if best:
+      cmd += '--best '
+      if efficiency_slack is not None:
+        cmd += f'--efficiency_slack {efficiency_slack} '
+    elif tolerance is not None:
+      cmd += f'--adaptive {tolerance} --coarse {coarse} '
+    if warm_start is not None:
+      cmd += f'--warm_start {warm_start} '
+    return self.createTask('OptimalExecution', name, cmd, sweep_log,
+                           cores=cores)
+
+  @property
+  def allExecBin(self):
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'allexec.py')
 
   def createAllExecutionsTask(self, name, app, num_procs, max_batch_size,
-                              datatype, sys, output, fused_act, log):
+                              datatype, sys, output, fused_act, log,
+                              where = None, columns = None, summaries = False):
+    """Creates a task that lists all executions.
+
+    Args:
+      where (list): Clauses of the rows to keep, see
+        analysis.predicate.Predicate
+      columns (list): Columns to keep
+      summaries (bool): Also write the summary of the sample rates of the
+        output next to it, see analysis.summary.summary_file()
+
+    Outputs ending in '.parquet' are converted from Calculon's CSV, see
+    analysis.dataset.write_parquet(). Filtering and conversion run Calculon
+    through allexec.py, whose own log is f'{log}.allexec'. The task then also
+    runs when the output was written with another filter, see
+    allexec.FilterCondition. If the executor was created with 'cubes' on,
+    the output then gets its cube, see analysis/cube.py.
+
+    Returns:
+      task (Task): The created task.
+    """
+    if (where is not None or columns is not None or summaries or
+        dataset.is_parquet(output)):
+      cmd = (
+        f'{self.allExecBin} '
+        f'{self.calcBin} '
+        f'{app} '
+        f'{num_procs} '
+        f'{max_batch_size} '
+        f'{datatype} '
+        f'-c {self._parallelExecutionCores} '
+        f'-f {fused_act} '
+        f'-s {sys} {output} {log} '
+      )
+      for clause in where or []:
+        cmd += f'-w {output} {shlex.quote(predicate.format_clause(clause))} '
+      if columns is not None:
+        cmd += f'--columns {output} {",".join(columns)} '
+      if summaries:
+        cmd += f'--summary {output} '
+      key = history.task_key('llm-all-executions', app, num_procs, sys)
+      task = self.createTask('AllExecutions', name, cmd, f'{log}.allexec',
+                             key)
+      run_args = {
+        'num_procs': num_procs, 'max_batch_size': max_batch_size,
+        'datatype': datatype, 'fused_act': fused_act, 'flags': ['-n'],
+        'where': [predicate.format_clause(clause) for clause in where or []],
+        'columns': columns}
+      run_outputs = [output, allexec.filter_file(output)]
+      if summaries:
+        run_args['summaries'] = True
+        run_outputs.append(summary.summary_file(output))
+      spec = result_cache.calc_spec(
+        'llm-all-executions', {'application': app, 'system': sys}, run_args,
+        run_outputs, log)
+      task.add_condition(allexec.FilterCondition(
+        output, allexec.filter_spec(where, columns)))
+      self._createCubeTasks(task, [output], [log])
+      return self._addCalcTask(task, spec)
     cmd = (
       f'{self.calcBin} '
       'llm-all-executions '
@@ -243,4 +679,40 @@ class Executor():
       f'-n '
       f'-f {fused_act} '
     )
-    return self.createTask('AllExecutions', name, cmd, log)
+    key = history.task_key('llm-all-executions', app, num_procs, sys)
+    task = self.createTask('AllExecutions', name, cmd, log, key)
+    spec = result_cache.calc_spec(
+      'llm-all-executions', {'application': app, 'system': sys},
+      {'num_procs': num_procs, 'max_batch_size': max_batch_size,
+       'datatype': datatype, 'fused_act': fused_act, 'flags': ['-n']},
+      [output], log)
+    self._createCubeTasks(task, [output], [log])
+    return self._addCalcTask(task, spec)
+
+  @property
+  def cubeBin(self):
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'analysis', 'cube.py')
+
+  def _createCubeTasks(self, run_task, outputs, logs):
+    """Creates a task per all executions output that materializes its cube
+    (see analysis/cube.py) once 'run_task' wrote it and the other tasks that
+    depend on 'run_task', e.g., the plots, completed.
+
+    Returns:
+      tasks (list): The created tasks
+    """
+    tasks = []
+    if not self._cubes:
+      return tasks
+    for output, log in zip(outputs, logs):
+      cells_file, _ = cube.cube_files(output)
+      stem = os.path.basename(output).partition('.')[0]
+      task = self.createTask('MiscProcess', f'{stem}-cube',
+                             f'{self.cubeBin} {output}', f'{log}.cube')
+      task.add_condition(taskrun.FileModificationCondition(
+        [output], [cells_file]))
+      task.add_dependency(run_task)
+      self._cubeTasks.append((task, run_task))
+      tasks.append(task)
+    return tasks
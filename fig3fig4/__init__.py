@@ -5,10 +5,32 @@ import taskrun
 
 H = os.path.dirname(os.path.abspath(__file__))
 
+# Both figures only look at these strategies and columns of the all
+# executions results, everything else is dropped as it is written. fig3.py and
+# fig4.py read them with these too.
+Where = [
+  [('tensor_par_net', 0)],
+  [('pipeline_par_net', 1), ('pipeline_par', 1)],
+  [('data_par_net', 1), ('data_par', 1)],
+  [('attention_type', 'multihead')]]
+Columns = [
+  'tensor_par', 'pipeline_par', 'data_par', 'tensor_par_net',
+  'pipeline_par_net', 'data_par_net', 'microbatch_size', 'fused_activation',
+  'attention_type', 'activation_recompute', 'optimizer_sharding',
+  'tensor_par_comm_type', 'tensor_par_overlap', 'seq_par_ag_redo',
+  'data_par_overlap', 'sample_rate', 'total_time', 'fw_time', 'bw_time',
+  'optim_step_time', 'recompute_time', 'bubble_time',
+  'tp_comm_exposed_time', 'pp_comm_exposed_time', 'dp_comm_exposed_time',
+  'weight_space', 'act_space', 'act_grad_space', 'weight_grad_space',
+  'optimizer_space', 'proc_mem_tier1_cap_req']
+
+
 class Fig3Fig4():
 
   def __init__(self):
     self.output = os.path.join(H, 'output')
+    # Writes the all executions results as Parquet instead of gzipped CSV
+    self.columnar = False
 
   def createTasks(self, executor):
     os.makedirs(self.output, exist_ok=True)
@@ -29,12 +51,13 @@ class Fig3Fig4():
 
     # Creates the all executions task
     megatron_1T = os.path.join(os.environ['CALC'], 'models', 'megatron-1T.json')
+    ext = '.parquet' if self.columnar else '.csv.gz'
     run_name = 'fig3fig4-all-executions'
     run_log = os.path.join(self.output, f'{run_name}.log')
-    run_output = os.path.join(self.output, f'{run_name}.csv.gz')
+    run_output = os.path.join(self.output, f'{run_name}{ext}')
     run_task = executor.createAllExecutionsTask(
       run_name, megatron_1T, 4096, 3072, 'float16', a100_big, run_output,
-      'both', run_log)
+      'both', run_log, where=Where, columns=Columns)
     run_task.add_condition(taskrun.FileModificationCondition(
       [a100_big, megatron_1T], [run_output]))
     run_task.add_dependency(sys_task)
@@ -1,65 +1,71 @@
 #!/usr/bin/env python3
 
 import argparse
+import fig3fig4
 import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
-import pandas
 import sys
 
+from analysis import stream
 
-def main(args):
-  dfa = pandas.read_csv(args.input)
-  print(f'Full data has {dfa.shape[0]} rows')
 
+def main(args):
   # Filter the data frame
-  df = dfa[
-    (dfa['tensor_par_net'] == 0) &
-    ((dfa['pipeline_par_net'] == 1) | (dfa['pipeline_par'] == 1)) &
-    ((dfa['data_par_net'] == 1) | (dfa['data_par'] == 1)) &
-    (dfa['fused_activation'] == False) &
-    (dfa['attention_type'] == 'multihead') &
-    (dfa['seq_par_ag_redo'] == False) &
-    (dfa['tensor_par_overlap'] == 'none') &
-    (dfa['data_par_overlap'] == False) &
-    (dfa['optimizer_sharding'] == True) &
-    (dfa['activation_recompute'] == 'attn_only') &
-    (dfa['tensor_par_comm_type'] == 'rs_ag') &
-    (dfa['microbatch_size'] == 1)
-  ]
-  print(f'Filtered data has {df.shape[0]} rows')
-  assert df.shape[0] > 0
-
-  df.to_csv(args.input.replace('all', 'filtered'))  ##############################DEBUG
+  def select(dfa):
+    return (
+      (dfa['tensor_par_net'] == 0) &
+      ((dfa['pipeline_par_net'] == 1) | (dfa['pipeline_par'] == 1)) &
+      ((dfa['data_par_net'] == 1) | (dfa['data_par'] == 1)) &
+      (dfa['fused_activation'] == False) &
+      (dfa['attention_type'] == 'multihead') &
+      (dfa['seq_par_ag_redo'] == False) &
+      (dfa['tensor_par_overlap'] == 'none') &
+      (dfa['data_par_overlap'] == False) &
+      (dfa['optimizer_sharding'] == True) &
+      (dfa['activation_recompute'] == 'attn_only') &
+      (dfa['tensor_par_comm_type'] == 'rs_ag') &
+      (dfa['microbatch_size'] == 1)
+    )
 
   # TP vs PP, DP fixed to 32
   tps = [1, 2, 4, 8, 16, 32]
-  dp32 = df[df['data_par'] == 32]
-  dp32_bests = {}
-  for tp in tps:
-    tf = dp32[dp32['tensor_par'] == tp]
-    assert tf.shape[0] > 0, f'dp=32 tp={tp} has 0 results'
-    t = tf[tf['sample_rate'] == tf['sample_rate'].max()]
-    dp32_bests[tp] = t
+  dp32 = stream.Best(stream.MaxRate, lambda df: df['data_par'] == 32,
+                     ['tensor_par'])
 
   # PP vs DP, TP fixed to 8
   pps = [1, 2, 4, 8, 16, 32, 64, 128]
-  tp8 = df[df['tensor_par'] == 8]
-  tp8_bests = {}
-  for pp in pps:
-    pf = tp8[tp8['pipeline_par'] == pp]
-    assert pf.shape[0] > 0, f'tp=8 pp={pp} has 0 results'
-    t = pf[pf['sample_rate'] == pf['sample_rate'].max()]
-    tp8_bests[pp] = t
+  tp8 = stream.Best(stream.MaxRate, lambda df: df['tensor_par'] == 8,
+                    ['pipeline_par'])
 
   # TP vs DP, PP fixed to 32
-  pp32 = df[df['pipeline_par'] == 32]
-  pp32_bests = {}
+  pp32 = stream.Best(stream.MaxRate, lambda df: df['pipeline_par'] == 32,
+                     ['tensor_par'])
+
+  rows = 0
+  filtered = 0
+  for dfa in stream.chunks(args.input, fig3fig4.Columns, fig3fig4.Where):
+    df = dfa[select(dfa)]
+    if args.filtered is not None:
+      df.to_csv(args.filtered, mode='w' if rows == 0 else 'a',
+                header=rows == 0)
+    rows += dfa.shape[0]
+    filtered += df.shape[0]
+    for best in [dp32, tp8, pp32]:
+      best.update(df)
+  print(f'Read data has {rows} rows')
+  print(f'Filtered data has {filtered} rows')
+  assert filtered > 0
+
+  dp32_bests = dp32.result()
+  for tp in tps:
+    assert tp in dp32_bests, f'dp=32 tp={tp} has 0 results'
+  tp8_bests = tp8.result()
+  for pp in pps:
+    assert pp in tp8_bests, f'tp=8 pp={pp} has 0 results'
+  pp32_bests = pp32.result()
   for tp in tps:
-    tf = pp32[pp32['tensor_par'] == tp]
-    assert tf.shape[0] > 0, f'pp=32 tp={tp} has 0 results'
-    t = tf[tf['sample_rate'] == tf['sample_rate'].max()]
-    pp32_bests[tp] = t
+    assert tp in pp32_bests, f'pp=32 tp={tp} has 0 results'
 
   # 2x3 subplots
   fig, ax = plt.subplots(2, 3, figsize=(14, 8),
@@ -100,14 +106,14 @@ def main(args):
        [f't={t}\nd={4096//32//t}' for t in tps])]:
 
     # Time plot (top row)
-    fw_time = [ds[t].iloc[0]['fw_time'] for t in keys]
-    bw_time = [ds[t].iloc[0]['bw_time'] for t in keys]
-    optim_time = [ds[t].iloc[0]['optim_step_time'] for t in keys]
-    recomp_time = [ds[t].iloc[0]['recompute_time'] for t in keys]
-    bubble_time = [ds[t].iloc[0]['bubble_time'] for t in keys]
-    tp_time = [ds[t].iloc[0]['tp_comm_exposed_time'] for t in keys]
-    pp_time = [ds[t].iloc[0]['pp_comm_exposed_time'] for t in keys]
-    dp_time = [ds[t].iloc[0]['dp_comm_exposed_time'] for t in keys]
+    fw_time = [ds[t]['fw_time'] for t in keys]
+    bw_time = [ds[t]['bw_time'] for t in keys]
+    optim_time = [ds[t]['optim_step_time'] for t in keys]
+    recomp_time = [ds[t]['recompute_time'] for t in keys]
+    bubble_time = [ds[t]['bubble_time'] for t in keys]
+    tp_time = [ds[t]['tp_comm_exposed_time'] for t in keys]
+    pp_time = [ds[t]['pp_comm_exposed_time'] for t in keys]
+    dp_time = [ds[t]['dp_comm_exposed_time'] for t in keys]
 
     ax[0][idx].bar(labels, fw_time, bar_width,
                    label='FW pass', color=time_colors[0])
@@ -145,11 +151,11 @@ def main(args):
     ax[0][idx].set_title(f'{title} batch time', fontsize=12)
 
     # Mem plot
-    weight = [ds[t].iloc[0]['weight_space']/1024**3 for t in keys]
-    act_space = [ds[t].iloc[0]['act_space']/1024**3 for t in keys]
-    weight_grad = [ds[t].iloc[0]['act_grad_space']/1024**3 for t in keys]
-    act_grad = [ds[t].iloc[0]['weight_grad_space']/1024**3 for t in keys]
-    optim_space = [ds[t].iloc[0]['optimizer_space']/1024**3 for t in keys]
+    weight = [ds[t]['weight_space']/1024**3 for t in keys]
+    act_space = [ds[t]['act_space']/1024**3 for t in keys]
+    weight_grad = [ds[t]['act_grad_space']/1024**3 for t in keys]
+    act_grad = [ds[t]['weight_grad_space']/1024**3 for t in keys]
+    optim_space = [ds[t]['optimizer_space']/1024**3 for t in keys]
 
     ax[1][idx].bar(labels, weight, bar_width, label='Weight',
                    color=mem_colors[0])
@@ -190,4 +196,7 @@ if __name__ == '__main__':
   ap = argparse.ArgumentParser()
   ap.add_argument('input', help='input file')
   ap.add_argument('output', help='output file')
+  ap.add_argument('--filtered', type=str, default=None,
+                  help='Also write the filtered rows to this CSV file, for '
+                  'debugging')
   sys.exit(main(ap.parse_args()))
@@ -3,80 +3,85 @@
 import argparse
 import calculon
 import copy
+import fig3fig4
 import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import numpy as np
-import pandas
 import sys
 import tol_colors as tc
 
+from analysis import skyline
+from analysis import stream
+
 
 def main(args):
   GiB = 1024 ** 3
   m80 = 80 * GiB
   m160 = 160 * GiB
 
-  df = pandas.read_csv(args.input)
-  print(f'Full data has {df.shape[0]} rows')
-
-  # Filter the data frame into 4 subplots as follows:
+  # Filters the rows into 4 subplots as follows:
 
   # a) 80 GiB, original optimations
-  dfa = df[
-    (df['tensor_par_net'] == 0) &
-    ((df['pipeline_par_net'] == 1) | (df['pipeline_par'] == 1)) &
-    ((df['data_par_net'] == 1) | (df['data_par'] == 1)) &
-    (df['fused_activation'] == False) &
-    (df['attention_type'] == 'multihead') &
-    (df['activation_recompute'] == 'full') &
-    (df['optimizer_sharding'] == False) &
-    (df['tensor_par_comm_type'] == 'p2p_rs_ag') &
-    (df['tensor_par_overlap'] == 'none') &
-    (df['seq_par_ag_redo'] == False) &
-    (df['data_par_overlap'] == False) &
-    (df['proc_mem_tier1_cap_req'] <= m80)
-  ]
-  print(f'"a" data has {dfa.shape[0]} rows')
-  assert dfa.shape[0] > 0
+  def select_a(df):
+    return (
+      (df['tensor_par_net'] == 0) &
+      ((df['pipeline_par_net'] == 1) | (df['pipeline_par'] == 1)) &
+      ((df['data_par_net'] == 1) | (df['data_par'] == 1)) &
+      (df['fused_activation'] == False) &
+      (df['attention_type'] == 'multihead') &
+      (df['activation_recompute'] == 'full') &
+      (df['optimizer_sharding'] == False) &
+      (df['tensor_par_comm_type'] == 'p2p_rs_ag') &
+      (df['tensor_par_overlap'] == 'none') &
+      (df['seq_par_ag_redo'] == False) &
+      (df['data_par_overlap'] == False) &
+      (df['proc_mem_tier1_cap_req'] <= m80)
+    )
 
   # b) 80 GiB, seq_par
-  dfb = df[
-    (df['tensor_par_net'] == 0) &
-    ((df['pipeline_par_net'] == 1) | (df['pipeline_par'] == 1)) &
-    ((df['data_par_net'] == 1) | (df['data_par'] == 1)) &
-    (df['fused_activation'] == False) &
-    (df['attention_type'] == 'multihead') &
-    (df['optimizer_sharding'] == False) &
-    (df['tensor_par_overlap'] == 'none') &
-    ((df['seq_par_ag_redo'] == True) | (df['activation_recompute'] != 'attn_only')) &
-    (df['data_par_overlap'] == False) &
-    (df['proc_mem_tier1_cap_req'] <= m80)
-  ]
-  print(f'"b" data has {dfb.shape[0]} rows')
-  assert dfb.shape[0] > 0
-
-  # c) 80 GiB, all optimizations
-  dfc = df[
-    (df['tensor_par_net'] == 0) &
-    ((df['pipeline_par_net'] == 1) | (df['pipeline_par'] == 1)) &
-    ((df['data_par_net'] == 1) | (df['data_par'] == 1)) &
-    (df['attention_type'] == 'multihead') &
-    (df['proc_mem_tier1_cap_req'] <= m80)
-  ]
-  print(f'"c" data has {dfc.shape[0]} rows')
-  assert dfc.shape[0] > 0
-
-  # d) 160 GiB, all optimizations
-  dfd = df[
-    (df['tensor_par_net'] == 0) &
-    ((df['pipeline_par_net'] == 1) | (df['pipeline_par'] == 1)) &
-    ((df['data_par_net'] == 1) | (df['data_par'] == 1)) &
-    (df['attention_type'] == 'multihead') &
-    (df['proc_mem_tier1_cap_req'] <= m160)
-  ]
-  print(f'"d" data has {dfd.shape[0]} rows')
-  assert dfd.shape[0] > 0
+  def select_b(df):
+    return (
+      (df['tensor_par_net'] == 0) &
+      ((df['pipeline_par_net'] == 1) | (df['pipeline_par'] == 1)) &
+      ((df['data_par_net'] == 1) | (df['data_par'] == 1)) &
+      (df['fused_activation'] == False) &
+      (df['attention_type'] == 'multihead') &
+      (df['optimizer_sharding'] == False) &
+      (df['tensor_par_overlap'] == 'none') &
+      ((df['seq_par_ag_redo'] == True) |
+       (df['activation_recompute'] != 'attn_only')) &
+      (df['data_par_overlap'] == False) &
+      (df['proc_mem_tier1_cap_req'] <= m80)
+    )
+
+  # c) 80 GiB and d) 160 GiB, all optimizations, are answered from the
+  # frontier of sample rate and memory per TP and PP, which is persisted.
+  # Their rows are the ones selected by fig3fig4.Where.
+  by = ['tensor_par', 'pipeline_par']
+  sky = skyline.SkylineFile(args.input, skyline.RateMem, by, fig3fig4.Where,
+                            fig3fig4.Columns)
+  frontier = sky.load()
+
+  # Keeps the best performing row per TP and PP, ties broken with memory usage
+  bests = [stream.Best(stream.MaxRateMinMem, select, by)
+           for select in [select_a, select_b]]
+  reducers = bests if frontier is not None else bests + [sky.reducer()]
+  rows = stream.reduce(args.input, reducers, fig3fig4.Columns, fig3fig4.Where)
+  print(f'Read data has {rows} rows')
+  for name, best in zip('ab', bests):
+    print(f'"{name}" data has {best.rows} rows')
+    assert best.rows > 0
+  if frontier is None:
+    frontier = reducers[-1].result()
+    sky.store(frontier)
+  print(f'"c" and "d" frontier has {frontier.shape[0]} rows')
+  results = [best.result() for best in bests]
+  for cap in [m80, m160]:
+    cells = skyline.best_under(frontier, skyline.RateMem,
+                               {'proc_mem_tier1_cap_req': cap}, by)
+    assert cells
+    results.append(cells)
 
   # Sets up the plot structure
   fig, ax = plt.subplots(2, 2, figsize=(7.5, 7.7))
@@ -88,30 +93,19 @@ def main(args):
   pps = [1, 2, 4, 8, 16, 32, 64]
 
   # Parses the data into 2D arrays
-  for plot_idx, df in enumerate([dfa, dfb, dfc, dfd]):
+  for plot_idx, cells in enumerate(results):
     # Creates a 2D array for the raw time and mem data
     time = np.zeros((len(tps), len(pps)), dtype="float")
     mem = np.zeros((len(tps), len(pps)), dtype="float")
     for tp in tps:
       for pp in pps:
-        # Filters the data frame to the TP and PP
-        tp_pp = df[
-          (df['tensor_par'] == tp) &
-          (df['pipeline_par'] == pp)
-        ]
-
-        # Retrieves the best performing row, break ties with memory usage
-        best = tp_pp[tp_pp['sample_rate'] == tp_pp['sample_rate'].max()]
-        best = best[best['proc_mem_tier1_cap_req'] ==
-                    best['proc_mem_tier1_cap_req'].min()]
-
         # Handles the result
-        if best.shape[0] == 0:
+        if (tp, pp) not in cells:
           time[tps.index(tp)][pps.index(pp)] = float('inf')
           mem[tps.index(tp)][pps.index(pp)] = float('inf')
         else:
-          batch_time = best.iloc[0]['total_time']
-          used_mem = best.iloc[0]['proc_mem_tier1_cap_req']
+          batch_time = cells[(tp, pp)]['total_time']
+          used_mem = cells[(tp, pp)]['proc_mem_tier1_cap_req']
           time[tps.index(tp)][pps.index(pp)] = batch_time
           mem[tps.index(tp)][pps.index(pp)] = used_mem
 
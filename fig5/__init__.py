@@ -3,16 +3,22 @@ import os
 import sys
 import taskrun
 
+from analysis import summary
+
 H = os.path.dirname(os.path.abspath(__file__))
 
 class Fig5():
 
   def __init__(self):
     self.output = os.path.join(H, 'output')
+    # Writes the all executions results as Parquet instead of gzipped CSV
+    self.columnar = False
 
   def createTasks(self, executor):
     os.makedirs(self.output, exist_ok=True)
 
+    gpt3_175B = os.path.join(os.environ['CALC'], 'models', 'gpt3-175B.json')
+    ext = '.parquet' if self.columnar else '.csv.gz'
     for datatype, system in [
         #('float16', 'a100_80g'),
         ('float16', 'h100_80g_nvl8'),
@@ -20,25 +26,26 @@ class Fig5():
     ]:
       # Creates the all executions task
       sys_file = os.path.join(os.environ['CALC'], 'systems', f'{system}.json')
-      gpt3_175B = os.path.join(os.environ['CALC'], 'models', 'gpt3-175B.json')
       run_name = f'fig5-all-executions-{datatype}-{system}'
       run_log = os.path.join(self.output, f'{run_name}.log')
-      run_output = os.path.join(self.output, f'{run_name}.csv.gz')
+      run_output = os.path.join(self.output, f'{run_name}{ext}')
+      # The plot only needs the summary of the sample rates
+      run_summary = summary.summary_file(run_output)
       run_task = executor.createAllExecutionsTask(
         run_name, gpt3_175B, 4096, 2340, datatype, sys_file, run_output,
-        'both', run_log)
+        'both', run_log, summaries=True)
       run_task.add_condition(taskrun.FileModificationCondition(
-        [sys_file, gpt3_175B], [run_output]))
+        [sys_file, gpt3_175B], [run_output, run_summary]))
 
       # Creates the plotting task
       plotter = os.path.join(H, 'fig5.py')
       assert os.path.exists(plotter)
       plot_file = os.path.join(self.output, f'{run_name}.pdf')
       plot_name = f'{run_name}_plot'
-      plot_cmd = f'{plotter} {run_output} {plot_file}'
+      plot_cmd = f'{plotter} {run_summary} {plot_file}'
       plot_log = os.path.join(self.output, f'{plot_name}.log')
       plot_task = executor.createTask('MiscProcess', plot_name, plot_cmd,
                                       plot_log)
       plot_task.add_condition(taskrun.FileModificationCondition(
-        [run_output], [plot_file]))
+        [run_summary], [plot_file]))
       plot_task.add_dependency(run_task)
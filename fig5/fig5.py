@@ -5,29 +5,30 @@ import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import numpy as np
-import pandas
 import sys
 
+from analysis import summary
 
-def main(args):
-  dfa = pandas.read_csv(args.input)
-  print(f'Raw data has {dfa.shape[0]} rows')
-
-  df = dfa #[dfa['tensor_par_overlap'] != 'ring']
-  print(f'Filter data has {df.shape[0]} rows')
-  num = df.shape[0]
 
-  srs = df['sample_rate']
-  srs = srs.sort_values(inplace=False, ascending=True).values
-  del df
+def main(args):
+  # Renders from the summary of the sample rates, which is made from the
+  # output if that is given instead
+  if args.input.endswith('.summary.json'):
+    rates = summary.read_summary(args.input)
+  else:
+    rates = summary.summarize(args.input)
+  print(f'Raw data has {rates.rows} rows')
+  print(f'Filter data has {rates.rows} rows')
+  num = rates.rows
 
-  print(f'first={srs[0]} last={srs[-1]}')
+  print(f'first={rates.histogram.min} last={rates.histogram.max}')
 
   fig, ax = plt.subplots(1, 2, figsize=(7.5, 4))
   fig.suptitle(f'{num:,} execution strategies\n'
                'for GPT3 175B on 4096 GPUs', fontsize=18)
 
-  ax[0].hist(srs, bins=10, edgecolor='black')
+  counts, edges = rates.histogram.histogram(bins=10)
+  ax[0].hist(edges[:-1], bins=edges, weights=counts, edgecolor='black')
   ax[0].set_xlabel('Sample rate', fontsize=12)
   ax[0].set_xticks([0, 200, 400, 600, 800, 1000])
   ax[0].set_xticklabels(['0', '200', '400', '600', '800', '1000'], fontsize=11)
@@ -37,7 +38,7 @@ def main(args):
   ax[0].set_title('(a) Sample rate distribution', fontsize=12)
 
   top_n = 100
-  top_srs = srs[-top_n:]
+  top_srs = rates.top.values()[-top_n:]
   n = len(top_srs)
   cdf = np.arange(1, n+1) / n
 
@@ -55,12 +56,13 @@ def main(args):
   plt.close(fig)
 
   print('Top 100')
-  for idx in range(1, 100+1):
+  for idx in range(1, min(100, n)+1):
     ridx = -1 * idx
-    print(f'  {idx}: {srs[ridx]}')
+    print(f'  {idx}: {top_srs[ridx]}')
 
 if __name__ == '__main__':
   ap = argparse.ArgumentParser()
-  ap.add_argument('input', help='input file')
+  ap.add_argument('input', help='input file or its summary '
+                  '(INPUT.summary.json)')
   ap.add_argument('output', help='output file')
   sys.exit(main(ap.parse_args()))
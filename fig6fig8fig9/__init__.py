@@ -1,6 +1,7 @@
 import calculon
 import copy
 import os
+import sweep
 import sys
 import taskrun
 
@@ -8,8 +9,26 @@ H = os.path.dirname(os.path.abspath(__file__))
 
 class Fig6Fig8Fig9():
 
+  # Sizes per task when sizes are searched in a single process
+  SweepChunk = 64
+
+  # Adaptive sweeps start with every 'AdaptiveCoarse'-th size and refine where
+  # the performance changes by more than 'AdaptiveTolerance' of the best
+  AdaptiveCoarse = 16
+  AdaptiveTolerance = 0.02
+
   def __init__(self):
     self.output = os.path.join(H, 'output')
+    # 'per_size' runs a task per size, 'batched' runs chunks of sizes per task,
+    # 'adaptive' runs a task per app and system searching only some sizes
+    self.sweep = 'per_size'
+    # If not None, each size is warm started from the previous size where the
+    # translated executions are at most this much (relative) less efficient,
+    # see warm.py. This skips searches but isn't exact
+    self.warm_start = None
+    # Commits the results to a single indexed file that the plots read in one
+    # query, see result_store.py
+    self.result_store = False
 
   def createTasks(self, executor):
     os.makedirs(self.output, exist_ok=True)
@@ -65,6 +84,9 @@ class Fig6Fig8Fig9():
       [sys_tmpl], getSystemFiles()))
 
     # Creates all the optimal execution tasks
+    store = None
+    if self.result_store:
+      store = os.path.join(self.output, 'fig6fig8fig9-results.sqlite')
     run_tasks = []
     run_outputs = []
     for nvl in nvls:
@@ -73,16 +95,61 @@ class Fig6Fig8Fig9():
           sys_name = getSystemName(nvl, mem2, g2c)
           sys_file = getSystemFile(nvl, mem2, g2c)
           for app, app_file, gbs in apps:
+            if self.sweep in ['batched', 'adaptive']:
+              chunk_size = self.SweepChunk
+              tolerance = None
+              if self.sweep == 'adaptive':
+                chunk_size = len(sizes)
+                tolerance = self.AdaptiveTolerance
+              for start in range(0, len(sizes), chunk_size):
+                chunk = sizes[start:start+chunk_size]
+                size_name = f'fig6fig8fig9-{app}_{{size}}_{sys_name}'
+                size_log = os.path.join(self.output, f'{size_name}.log')
+                size_output = os.path.join(self.output, f'{size_name}.json.gz')
+                chunk_outputs = [size_output.format(size=size)
+                                 for size in chunk]
+                run_name = (f'fig6fig8fig9-{app}_{chunk[0]}-{chunk[-1]}_'
+                            f'{sys_name}')
+                run_log = os.path.join(self.output, f'{run_name}.log')
+                run_task = executor.createOptimalExecutionSweepTask(
+                  run_name, app_file, chunk, gbs, 'float16', sys_file,
+                  size_output, 10, 'both', size_log, run_log, tolerance,
+                  self.AdaptiveCoarse, warm_start=self.warm_start)
+                run_task.add_condition(sweep.SweepCondition(
+                  [sys_file, app_file], chunk_outputs,
+                  rerun_skipped=tolerance is None))
+                run_task.add_dependency(sys_task)
+                if store is not None:
+                  executor.storeResults(run_task, store, [
+                    (app, size, sys_name, chunk_output)
+                    for size, chunk_output in zip(chunk, chunk_outputs)])
+                run_tasks.append(run_task)
+                run_outputs.extend(chunk_outputs)
+              continue
+            prev_task = None
+            prev_output = None
             for size in sizes:
               run_name = f'fig6fig8fig9-{app}_{size}_{sys_name}'
               run_log = os.path.join(self.output, f'{run_name}.log')
               run_output = os.path.join(self.output, f'{run_name}.json.gz')
-              run_task = executor.createOptimalExecutionTask(
-                run_name, app_file, size, gbs, 'float16', sys_file, run_output,
-                10, 'both', run_log)
-              run_task.add_condition(taskrun.FileModificationCondition(
-                [sys_file, app_file], [run_output]))
+              if self.warm_start is not None and prev_task is not None:
+                run_task = executor.createOptimalExecutionTask(
+                  run_name, app_file, size, gbs, 'float16', sys_file,
+                  run_output, 10, 'both', run_log, prev_output,
+                  self.warm_start)
+                run_task.add_dependency(prev_task)
+              else:
+                run_task = executor.createOptimalExecutionTask(
+                  run_name, app_file, size, gbs, 'float16', sys_file,
+                  run_output, 10, 'both', run_log)
+              run_task.add_condition(sweep.SweepCondition(
+                [sys_file, app_file], [run_output], rerun_skipped=True))
               run_task.add_dependency(sys_task)
+              if store is not None:
+                executor.storeResults(run_task, store,
+                                      [(app, size, sys_name, run_output)])
+              prev_task = run_task
+              prev_output = run_output
               run_tasks.append(run_task)
               run_outputs.append(run_output)
 
@@ -94,6 +161,8 @@ class Fig6Fig8Fig9():
                  for fig in [6, 8, 9]]
     fig_name = f'{run_name}_figs'
     fig_cmd = f'{plotter} {self.output}'
+    if store is not None:
+      fig_cmd += f' --store {store}'
     fig_log = os.path.join(self.output, f'{fig_name}.log')
     fig_task = executor.createTask('MiscProcess', fig_name, fig_cmd,
                                    fig_log)
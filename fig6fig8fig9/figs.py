@@ -1,13 +1,13 @@
 #!/usr/bin/env python3
 
 import argparse
-import calculon
 import copy
 import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import numpy as np
 import os
+import result_store
 import sys
 
 
@@ -33,6 +33,17 @@ def main(args):
     '1T': 'Megatron-1T'
   }
 
+  # Reads all run data, only the best execution of each run is used
+  run_names = {(app, size, getSystemName(nvl, mem2, g2c)):
+               f'fig6fig8fig9-{app}_{size}_{getSystemName(nvl, mem2, g2c)}'
+               for nvl in nvls
+               for mem2 in mem2s
+               for g2c in g2cs
+               for app in apps
+               for size in sizes}
+  runs = result_store.read_results(args.directory, run_names, args.store,
+                                   top=1)
+
   # Makes all plots
   for nvl in nvls:
     for mem2 in mem2s:
@@ -49,14 +60,14 @@ def main(args):
 
         for ai, app in enumerate(apps):
           perfs = []
+          searched = []
           max_point = 0
           for size in sizes:
-            # Reads run data
-            run_name = f'fig6fig8fig9-{app}_{size}_{sys_name}'
-            run_output = os.path.join(args.directory, f'{run_name}.json.gz')
-            data = calculon.read_json_file(run_output)
+            data = runs[(app, size, sys_name)]
 
-            # Parses run data
+            # Parses run data, sizes skipped by an adaptive sweep count as 0
+            # for the best performance and aren't scattered
+            searched.append(not data.get('skipped', False))
             if '0' in data:
               perf = data['0']['stats']['sample_rate']
               eff = data['0']['stats']['system_efficiency']
@@ -69,13 +80,15 @@ def main(args):
           bests = np.maximum.accumulate(perfs)
           perfs = np.asarray(perfs)
           sizes = np.asarray(sizes)
+          searched = np.asarray(searched)
 
           # Perfect scaling
           ax[ai].plot(sizes, sizes / np.max(sizes), '--', linewidth=1,
                       color='k')
 
           # Scatter plot of relative performance
-          ax[ai].scatter(sizes, perfs / max_point, sizes=[25]*len(sizes),
+          ax[ai].scatter(sizes[searched], perfs[searched] / max_point,
+                         sizes=[25]*np.count_nonzero(searched),
                          marker='1', linewidths=0.7, color=colors[app])
 
           # Best performance accumulation
@@ -127,13 +140,14 @@ def main(args):
           max_point_non = 0
           max_point_off = 0
           for size in sizes:
-            # Reads run data
-            run_name = f'fig6fig8fig9-{app}_{size}_{sys_name_non}'
-            run_output = os.path.join(args.directory, f'{run_name}.json.gz')
-            data_non = calculon.read_json_file(run_output)
-            run_name = f'fig6fig8fig9-{app}_{size}_{sys_name_off}'
-            run_output = os.path.join(args.directory, f'{run_name}.json.gz')
-            data_off = calculon.read_json_file(run_output)
+            data_non = runs[(app, size, sys_name_non)]
+            data_off = runs[(app, size, sys_name_off)]
+
+            # Sizes skipped by an adaptive sweep of either system are skipped
+            # for both so the best performances are over the same sizes
+            if data_non.get('skipped', False) or data_off.get('skipped', False):
+              data_non = {}
+              data_off = {}
 
             # Parses run data
             if '0' in data_non:
@@ -217,4 +231,7 @@ def main(args):
 if __name__ == '__main__':
   ap = argparse.ArgumentParser()
   ap.add_argument('directory', help='input and output directory')
+  ap.add_argument('--store', type=str, default=None,
+                  help='Result store to read the runs from, see '
+                  'result_store.py')
   sys.exit(main(ap.parse_args()))
@@ -8,8 +8,22 @@ H = os.path.dirname(os.path.abspath(__file__))
 
 class Fig7Fig10Tab4():
 
+  # fig7 only looks at these strategies and columns of the infinite offload
+  # results, everything else is dropped as it is written. fig10tab4 looks at
+  # all of the real offload results.
+  InfWhere = [
+    [('tensor_par_net', 0)],
+    [('pipeline_par_net', 1), ('pipeline_par', 1)],
+    [('data_par_net', 1), ('data_par', 1)]]
+  InfColumns = [
+    'tensor_par', 'pipeline_par', 'data_par', 'tensor_par_net',
+    'pipeline_par_net', 'data_par_net', 'sample_rate',
+    'proc_mem_tier1_cap_req', 'proc_mem_tier2_cap_req', 'offload_mem_bw_req']
+
   def __init__(self):
     self.output = os.path.join(H, 'output')
+    # Writes the all executions results as Parquet instead of gzipped CSV
+    self.columnar = False
 
   def createTasks(self, executor):
     os.makedirs(self.output, exist_ok=True)
@@ -41,18 +55,20 @@ class Fig7Fig10Tab4():
     sys_task.add_condition(taskrun.FileModificationCondition(
       [h100_80g_nvl8], [h100_80g_nvl4k_infinite_off, h100_80g_nvl4k_real_off]))
 
-    # Creates the all executions task
+    # Creates the all executions tasks
     megatron_1T = os.path.join(os.environ['CALC'], 'models', 'megatron-1T.json')
+    ext = '.parquet' if self.columnar else '.csv.gz'
     run_tasks = {}
     run_outputs = {}
-    for off, sys_file in [('inf', h100_80g_nvl4k_infinite_off),
-                          ('real', h100_80g_nvl4k_real_off)]:
+    for off, sys_file, where, columns in [
+        ('inf', h100_80g_nvl4k_infinite_off, self.InfWhere, self.InfColumns),
+        ('real', h100_80g_nvl4k_real_off, None, None)]:
       run_name = f'fig7fig10tab4-all-executions-{off}'
       run_log = os.path.join(self.output, f'{run_name}.log')
-      run_output = os.path.join(self.output, f'{run_name}.csv.gz')
+      run_output = os.path.join(self.output, f'{run_name}{ext}')
       run_task = executor.createAllExecutionsTask(
         run_name, megatron_1T, 4096, 3072, 'float16', sys_file,
-        run_output, 'both', run_log)
+        run_output, 'both', run_log, where=where, columns=columns)
       run_task.add_condition(taskrun.FileModificationCondition(
         [sys_file, megatron_1T], [run_output]))
       run_task.add_dependency(sys_task)
@@ -7,82 +7,81 @@ import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import numpy as np
-import pandas
 import sys
 import tol_colors as tc
 
+from analysis import bitmap
+from analysis import stream
 
 
-def main(args):
-  df = pandas.read_csv(args.input)
-  print(f'Full data has {df.shape[0]} rows')
+# Only these columns are read, all rows are needed for e4
+Columns = [
+  'tensor_par', 'pipeline_par', 'data_par', 'tensor_par_net',
+  'pipeline_par_net', 'data_par_net', 'microbatch_size',
+  'pipeline_interleaving', 'fused_activation', 'attention_type',
+  'activation_recompute', 'optimizer_sharding', 'tensor_par_comm_type',
+  'tensor_par_overlap', 'seq_par_ag_redo', 'data_par_overlap',
+  'weight_offload', 'activations_offload', 'optimizer_offload', 'sample_rate',
+  'total_time', 'total_efficiency', 'fw_time', 'bw_time', 'optim_step_time',
+  'recompute_time', 'bubble_time', 'tp_comm_exposed_time',
+  'recomm_exposed_time', 'pp_comm_exposed_time', 'dp_comm_exposed_time',
+  'weight_space', 'act_space', 'act_checkpoint_size', 'weight_grad_space',
+  'act_grad_space', 'optimizer_space', 'weight_space_with_offload',
+  'act_space_with_offload', 'act_checkpoint_size_with_offload',
+  'weight_grad_space_with_offload', 'act_grad_space_with_offload',
+  'optimizer_space_with_offload', 'proc_mem_tier1_cap_req']
 
-  # Baseline
-  d1 = df[
-    (df['tensor_par_net'] == 0) &
-    ((df['pipeline_par_net'] == 1) | (df['pipeline_par'] == 1)) &
-    ((df['data_par_net'] == 1) | (df['data_par'] == 1)) &
-    (df['fused_activation'] == False) &
-    (df['attention_type'] == 'multihead') &
-    (df['seq_par_ag_redo'] == False) &
-    (df['tensor_par_overlap'] == 'none') &
-    (df['data_par_overlap'] == False) &
-    (df['optimizer_sharding'] == False) &
-    (df['activation_recompute'] == 'full') &
-    ((df['tensor_par_comm_type'] == 'ar') |
-     (df['tensor_par_comm_type'] == 'p2p_rs_ag')) &
-    (df['tensor_par'] == 8) &
-    (df['pipeline_par'] == 64) &
-    (df['data_par'] == 8) &
-    (df['microbatch_size'] == 1) &
-    (df['pipeline_interleaving'] == 2) &
-    (df['weight_offload'] == False) &
-    (df['activations_offload'] == False) &
-    (df['optimizer_offload'] == False)
-  ]
-  print(f'Baseline data has {d1.shape[0]} rows')
-  assert d1.shape[0] > 0
-  e1 = d1[d1['sample_rate'] == d1['sample_rate'].max()]
 
-  # Seq Par
-  d2 = df[
-    (df['tensor_par_net'] == 0) &
-    ((df['pipeline_par_net'] == 1) | (df['pipeline_par'] == 1)) &
-    ((df['data_par_net'] == 1) | (df['data_par'] == 1)) &
-    (df['fused_activation'] == False) &
-    (df['attention_type'] == 'multihead') &
-    (df['seq_par_ag_redo'] == True) &
-    (df['tensor_par_overlap'] == 'none') &
-    (df['data_par_overlap'] == False) &
-    (df['optimizer_sharding'] == False) &
-    (df['activation_recompute'] == 'attn_only') &
-    (df['tensor_par'] == 8) &
-    (df['pipeline_par'] == 64) &
-    (df['data_par'] == 8) &
-    (df['microbatch_size'] == 1) &
-    (df['weight_offload'] == False) &
-    (df['activations_offload'] == False) &
-    (df['optimizer_offload'] == False)
-  ]
-  print(f'Seq par data has {d2.shape[0]} rows')
-  assert d2.shape[0] > 0
-  e2 = d2[d2['sample_rate'] == d2['sample_rate'].max()]
+# The scenarios as clauses (see analysis/predicate.py) of the rows they pick
+# the best performing one from
+NoOffload = [
+  [('weight_offload', False)],
+  [('activations_offload', False)],
+  [('optimizer_offload', False)]]
+Megatron = [
+  [('tensor_par_net', 0)],
+  [('pipeline_par_net', 1), ('pipeline_par', 1)],
+  [('data_par_net', 1), ('data_par', 1)],
+  [('fused_activation', False)],
+  [('attention_type', 'multihead')],
+  [('tensor_par_overlap', 'none')],
+  [('data_par_overlap', False)],
+  [('optimizer_sharding', False)],
+  [('tensor_par', 8)],
+  [('pipeline_par', 64)],
+  [('data_par', 8)],
+  [('microbatch_size', 1)]] + NoOffload
 
-  # All software optimizations (no offloading)
-  d3 = df[
-    (df['weight_offload'] == False) &
-    (df['activations_offload'] == False) &
-    (df['optimizer_offload'] == False)
-  ]
-  print(f'SwOpt data has {d3.shape[0]} rows')
-  assert d3.shape[0] > 0
-  e3 = d3[d3['sample_rate'] == d3['sample_rate'].max()]
+# Baseline
+Baseline = Megatron + [
+  [('seq_par_ag_redo', False)],
+  [('activation_recompute', 'full')],
+  [('tensor_par_comm_type', 'ar'), ('tensor_par_comm_type', 'p2p_rs_ag')],
+  [('pipeline_interleaving', 2)]]
+
+# Seq Par
+SeqPar = Megatron + [
+  [('seq_par_ag_redo', True)],
+  [('activation_recompute', 'attn_only')]]
 
-  # All software optimizations with offloading
-  d4 = df
-  print(f'Offloading data has {d4.shape[0]} rows')
-  assert d4.shape[0] > 0
-  e4 = d4[d4['sample_rate'] == d4['sample_rate'].max()]
+# All software optimizations (no offloading)
+SwOpt = NoOffload
+
+# All software optimizations with offloading use all rows
+Offloading = []
+
+
+def main(args):
+  # Finds the best performing row of each scenario with bitmap indexes
+  rows, counts, bests = bitmap.best_rows(
+    args.input, [Baseline, SeqPar, SwOpt, Offloading], stream.MaxRate,
+    Columns)
+  print(f'Full data has {rows} rows')
+  for name, count, best in zip(['Baseline', 'Seq par', 'SwOpt', 'Offloading'],
+                               counts, bests):
+    print(f'{name} data has {count} rows')
+    assert best is not None
+  e1, e2, e3, e4 = bests
 
 
   # Figure 10
@@ -110,42 +109,42 @@ def main(args):
     "Calculon\nSW algos",
     "Calculon\nSW algos+\noffload"
   ]
-  fw_time = [e1.iloc[0]['fw_time'],
-             e2.iloc[0]['fw_time'],
-             e3.iloc[0]['fw_time'],
-             e4.iloc[0]['fw_time']]
-  bw_time = [e1.iloc[0]['bw_time'],
-             e2.iloc[0]['bw_time'],
-             e3.iloc[0]['bw_time'],
-             e4.iloc[0]['bw_time']]
-  optim_time = [e1.iloc[0]['optim_step_time'],
-                e2.iloc[0]['optim_step_time'],
-                e3.iloc[0]['optim_step_time'],
-                e4.iloc[0]['optim_step_time']]
-  recomp_time = [e1.iloc[0]['recompute_time'],
-                 e2.iloc[0]['recompute_time'],
-                 e3.iloc[0]['recompute_time'],
-                 e4.iloc[0]['recompute_time']]
-  bubble_time = [e1.iloc[0]['bubble_time'],
-                 e2.iloc[0]['bubble_time'],
-                 e3.iloc[0]['bubble_time'],
-                 e4.iloc[0]['bubble_time']]
-  tp_time = [e1.iloc[0]['tp_comm_exposed_time']
-             + e1.iloc[0]['recomm_exposed_time'],
-             e2.iloc[0]['tp_comm_exposed_time']
-             + e2.iloc[0]['recomm_exposed_time'],
-             e3.iloc[0]['tp_comm_exposed_time']
-             + e3.iloc[0]['recomm_exposed_time'],
-             e4.iloc[0]['tp_comm_exposed_time']
-             + e4.iloc[0]['recomm_exposed_time']]
-  pp_time = [e1.iloc[0]['pp_comm_exposed_time'],
-             e2.iloc[0]['pp_comm_exposed_time'],
-             e3.iloc[0]['pp_comm_exposed_time'],
-             e4.iloc[0]['pp_comm_exposed_time']]
-  dp_time = [e1.iloc[0]['dp_comm_exposed_time'],
-             e2.iloc[0]['dp_comm_exposed_time'],
-             e3.iloc[0]['dp_comm_exposed_time'],
-             e4.iloc[0]['dp_comm_exposed_time']]
+  fw_time = [e1['fw_time'],
+             e2['fw_time'],
+             e3['fw_time'],
+             e4['fw_time']]
+  bw_time = [e1['bw_time'],
+             e2['bw_time'],
+             e3['bw_time'],
+             e4['bw_time']]
+  optim_time = [e1['optim_step_time'],
+                e2['optim_step_time'],
+                e3['optim_step_time'],
+                e4['optim_step_time']]
+  recomp_time = [e1['recompute_time'],
+                 e2['recompute_time'],
+                 e3['recompute_time'],
+                 e4['recompute_time']]
+  bubble_time = [e1['bubble_time'],
+                 e2['bubble_time'],
+                 e3['bubble_time'],
+                 e4['bubble_time']]
+  tp_time = [e1['tp_comm_exposed_time']
+             + e1['recomm_exposed_time'],
+             e2['tp_comm_exposed_time']
+             + e2['recomm_exposed_time'],
+             e3['tp_comm_exposed_time']
+             + e3['recomm_exposed_time'],
+             e4['tp_comm_exposed_time']
+             + e4['recomm_exposed_time']]
+  pp_time = [e1['pp_comm_exposed_time'],
+             e2['pp_comm_exposed_time'],
+             e3['pp_comm_exposed_time'],
+             e4['pp_comm_exposed_time']]
+  dp_time = [e1['dp_comm_exposed_time'],
+             e2['dp_comm_exposed_time'],
+             e3['dp_comm_exposed_time'],
+             e4['dp_comm_exposed_time']]
 
   ax[0].bar(labels, fw_time, width,
             label='FW pass', color=colors[0])
@@ -178,30 +177,30 @@ def main(args):
                fancybox=True, shadow=True, ncol=2, fontsize=10)
   ax[0].set_title('Batch time', fontsize=12)
 
-  weight = [e1.iloc[0]['weight_space']/1024**3,
-            e2.iloc[0]['weight_space']/1024**3,
-            e3.iloc[0]['weight_space']/1024**3,
-            e4.iloc[0]['weight_space_with_offload']/1024**3]
-  act_space = [e1.iloc[0]['act_space']/1024**3
-               + e1.iloc[0]['act_checkpoint_size']/1024**3,
-               e2.iloc[0]['act_space']/1024**3
-               + e2.iloc[0]['act_checkpoint_size']/1024**3,
-               e3.iloc[0]['act_space']/1024**3
-               + e3.iloc[0]['act_checkpoint_size']/1024**3,
-               e4.iloc[0]['act_space_with_offload']/1024**3
-               + e4.iloc[0]['act_checkpoint_size_with_offload']/1024**3]
-  weight_grad = [e1.iloc[0]['weight_grad_space']/1024**3,
-                 e2.iloc[0]['weight_grad_space']/1024**3,
-                 e3.iloc[0]['weight_grad_space']/1024**3,
-                 e4.iloc[0]['weight_grad_space_with_offload']/1024**3]
-  act_grad = [e1.iloc[0]['act_grad_space']/1024**3,
-              e2.iloc[0]['act_grad_space']/1024**3,
-              e3.iloc[0]['act_grad_space']/1024**3,
-              e4.iloc[0]['act_grad_space_with_offload']/1024**3]
-  optim_space = [e1.iloc[0]['optimizer_space']/1024**3,
-                 e2.iloc[0]['optimizer_space']/1024**3,
-                 e3.iloc[0]['optimizer_space']/1024**3,
-                 e4.iloc[0]['optimizer_space_with_offload']/1024**3]
+  weight = [e1['weight_space']/1024**3,
+            e2['weight_space']/1024**3,
+            e3['weight_space']/1024**3,
+            e4['weight_space_with_offload']/1024**3]
+  act_space = [e1['act_space']/1024**3
+               + e1['act_checkpoint_size']/1024**3,
+               e2['act_space']/1024**3
+               + e2['act_checkpoint_size']/1024**3,
+               e3['act_space']/1024**3
+               + e3['act_checkpoint_size']/1024**3,
+               e4['act_space_with_offload']/1024**3
+               + e4['act_checkpoint_size_with_offload']/1024**3]
+  weight_grad = [e1['weight_grad_space']/1024**3,
+                 e2['weight_grad_space']/1024**3,
+                 e3['weight_grad_space']/1024**3,
+                 e4['weight_grad_space_with_offload']/1024**3]
+  act_grad = [e1['act_grad_space']/1024**3,
+              e2['act_grad_space']/1024**3,
+              e3['act_grad_space']/1024**3,
+              e4['act_grad_space_with_offload']/1024**3]
+  optim_space = [e1['optimizer_space']/1024**3,
+                 e2['optimizer_space']/1024**3,
+                 e3['optimizer_space']/1024**3,
+                 e4['optimizer_space_with_offload']/1024**3]
   colors = [
     '#117733',
     '#44AA99',
@@ -242,24 +241,24 @@ def main(args):
     for name, frame in [('Baseline', e1), ('SeqPar', e2), ('SwOpts', e3),
                         ('HwOff', e4)]:
       print(f'{name},', file=fd, end='')
-      print(f'{frame.iloc[0]["total_time"]:.02f}s,', file=fd, end='')
-      print(f'{frame.iloc[0]["proc_mem_tier1_cap_req"] / 1024**3:.02f}GiB,', file=fd, end='')
-      print(f'{frame.iloc[0]["total_efficiency"] * 100:.02f}%,', file=fd, end='')
-      print(f'{frame.iloc[0]["tensor_par"]},', file=fd, end='')
-      print(f'{frame.iloc[0]["pipeline_par"]},', file=fd, end='')
-      print(f'{frame.iloc[0]["data_par"]},', file=fd, end='')
-      print(f'{frame.iloc[0]["microbatch_size"]},', file=fd, end='')
-      print(f'{frame.iloc[0]["pipeline_interleaving"]},', file=fd, end='')
-      print(f'{frame.iloc[0]["activation_recompute"]},', file=fd, end='')
-      print(f'{frame.iloc[0]["tensor_par_comm_type"]},', file=fd, end='')
-      print(f'{frame.iloc[0]["seq_par_ag_redo"]},', file=fd, end='')
-      print(f'{frame.iloc[0]["tensor_par_overlap"]},', file=fd, end='')
-      print(f'{frame.iloc[0]["data_par_overlap"]},', file=fd, end='')
-      print(f'{frame.iloc[0]["optimizer_sharding"]},', file=fd, end='')
-      print(f'{frame.iloc[0]["fused_activation"]},', file=fd, end='')
-      print(f'{frame.iloc[0]["weight_offload"]},', file=fd, end='')
-      print(f'{frame.iloc[0]["activations_offload"]},', file=fd, end='')
-      print(f'{frame.iloc[0]["optimizer_offload"]},', file=fd, end='')
+      print(f'{frame["total_time"]:.02f}s,', file=fd, end='')
+      print(f'{frame["proc_mem_tier1_cap_req"] / 1024**3:.02f}GiB,', file=fd, end='')
+      print(f'{frame["total_efficiency"] * 100:.02f}%,', file=fd, end='')
+      print(f'{frame["tensor_par"]},', file=fd, end='')
+      print(f'{frame["pipeline_par"]},', file=fd, end='')
+      print(f'{frame["data_par"]},', file=fd, end='')
+      print(f'{frame["microbatch_size"]},', file=fd, end='')
+      print(f'{frame["pipeline_interleaving"]},', file=fd, end='')
+      print(f'{frame["activation_recompute"]},', file=fd, end='')
+      print(f'{frame["tensor_par_comm_type"]},', file=fd, end='')
+      print(f'{frame["seq_par_ag_redo"]},', file=fd, end='')
+      print(f'{frame["tensor_par_overlap"]},', file=fd, end='')
+      print(f'{frame["data_par_overlap"]},', file=fd, end='')
+      print(f'{frame["optimizer_sharding"]},', file=fd, end='')
+      print(f'{frame["fused_activation"]},', file=fd, end='')
+      print(f'{frame["weight_offload"]},', file=fd, end='')
+      print(f'{frame["activations_offload"]},', file=fd, end='')
+      print(f'{frame["optimizer_offload"]},', file=fd, end='')
       print('', file=fd)
 
 
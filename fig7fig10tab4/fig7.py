@@ -6,25 +6,37 @@ import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import numpy as np
-import pandas
 import sys
 import tol_colors as tc
 
+from analysis import skyline
+
+
+# Only these rows and columns are read
+Where = [
+  [('tensor_par_net', 0)],
+  [('pipeline_par_net', 1), ('pipeline_par', 1)],
+  [('data_par_net', 1), ('data_par', 1)]]
+Columns = [
+  'tensor_par', 'pipeline_par', 'data_par', 'tensor_par_net',
+  'pipeline_par_net', 'data_par_net', 'sample_rate', 'proc_mem_tier1_cap_req',
+  'proc_mem_tier2_cap_req', 'offload_mem_bw_req']
 
 
 def main(args):
   GiB = 1024 ** 3
 
+  # The best performing row per TP and PP, ties broken with memory usage, is
+  # answered from the frontier of sample rate and memory of the rows selected
+  # by Where, which is persisted
+  by = ['tensor_par', 'pipeline_par']
+
   # H100 infinite mem2
   print(f'Reading {args.h100_inf_input}')
-  df = pandas.read_csv(args.h100_inf_input)
-  print(f'Full data has {df.shape[0]} rows')
-  df = df[
-    (df['tensor_par_net'] == 0) &
-    ((df['pipeline_par_net'] == 1) | (df['pipeline_par'] == 1)) &
-    ((df['data_par_net'] == 1) | (df['data_par'] == 1))
-  ]
-  print(f'Filtered data has {df.shape[0]} rows')
+  frontier = skyline.SkylineFile(args.h100_inf_input, skyline.RateMem, by,
+                                 Where, Columns).compute()
+  print(f'Frontier has {frontier.shape[0]} rows')
+  cells = skyline.best_under(frontier, skyline.RateMem, by=by)
 
   # Sets up the plot structure
   fig, ax = plt.subplots(2, 2, figsize=(7.5, 7.7))
@@ -40,24 +52,13 @@ def main(args):
   mem = np.zeros((len(tps), len(pps)), dtype="float")
   for tp in tps:
     for pp in pps:
-      # Filters the data frame to the TP and PP
-      tp_pp = df[
-        (df['tensor_par'] == tp) &
-        (df['pipeline_par'] == pp)
-      ]
-
-      # Retrieves the best performing row, break ties with memory usage
-      best = tp_pp[tp_pp['sample_rate'] == tp_pp['sample_rate'].max()]
-      best = best[best['proc_mem_tier1_cap_req'] ==
-                  best['proc_mem_tier1_cap_req'].min()]
-
       # Handles the result
-      if best.shape[0] == 0:
+      if (tp, pp) not in cells:
         rate[tps.index(tp)][pps.index(pp)] = 0.0
         mem[tps.index(tp)][pps.index(pp)] = float('inf')
       else:
-        sample_rate = best.iloc[0]['sample_rate']
-        used_mem = best.iloc[0]['proc_mem_tier1_cap_req']
+        sample_rate = cells[(tp, pp)]['sample_rate']
+        used_mem = cells[(tp, pp)]['proc_mem_tier1_cap_req']
         rate[tps.index(tp)][pps.index(pp)] = sample_rate
         mem[tps.index(tp)][pps.index(pp)] = used_mem
 
@@ -112,25 +113,14 @@ def main(args):
   mem2_cap = np.zeros((len(tps), len(pps)), dtype="float")
   for tp in tps:
     for pp in pps:
-      # Filters the data frame to the TP and PP
-      tp_pp = df[
-        (df['tensor_par'] == tp) &
-        (df['pipeline_par'] == pp)
-      ]
-
-      # Retrieves the best performing row, break ties with memory usage
-      best = tp_pp[tp_pp['sample_rate'] == tp_pp['sample_rate'].max()]
-      best = best[best['proc_mem_tier1_cap_req'] ==
-                  best['proc_mem_tier1_cap_req'].min()]
-
       # Handles the result
-      if best.shape[0] == 0:
+      if (tp, pp) not in cells:
         mem2_bw[tps.index(tp)][pps.index(pp)] = float('inf')
         mem2_cap[tps.index(tp)][pps.index(pp)] = float('inf')
       else:
-        req_bw = best.iloc[0]['offload_mem_bw_req']
+        req_bw = cells[(tp, pp)]['offload_mem_bw_req']
         mem2_bw[tps.index(tp)][pps.index(pp)] = req_bw
-        used_mem2 = best.iloc[0]['proc_mem_tier2_cap_req']
+        used_mem2 = cells[(tp, pp)]['proc_mem_tier2_cap_req']
         mem2_cap[tps.index(tp)][pps.index(pp)] = used_mem2
 
   # Format the colors based on capacity
@@ -176,40 +166,24 @@ def main(args):
   ax[0][1].set_title('(b) Offloading bandwidth and usage', fontsize=12)
 
   # H100 real mem2
-  del df
   print(f'Reading {args.h100_real_input}')
-  df = pandas.read_csv(args.h100_real_input)
-  print(f'Full data has {df.shape[0]} rows')
-  df = df[
-    (df['tensor_par_net'] == 0) &
-    ((df['pipeline_par_net'] == 1) | (df['pipeline_par'] == 1)) &
-    ((df['data_par_net'] == 1) | (df['data_par'] == 1))
-  ]
-  print(f'Filtered data has {df.shape[0]} rows')
+  frontier = skyline.SkylineFile(args.h100_real_input, skyline.RateMem, by,
+                                 Where, Columns).compute()
+  print(f'Frontier has {frontier.shape[0]} rows')
+  cells = skyline.best_under(frontier, skyline.RateMem, by=by)
 
   # (c) Rate and mem
   rate = np.zeros((len(tps), len(pps)), dtype="float")
   mem = np.zeros((len(tps), len(pps)), dtype="float")
   for tp in tps:
     for pp in pps:
-      # Filters the data frame to the TP and PP
-      tp_pp = df[
-        (df['tensor_par'] == tp) &
-        (df['pipeline_par'] == pp)
-      ]
-
-      # Retrieves the best performing row, break ties with memory usage
-      best = tp_pp[tp_pp['sample_rate'] == tp_pp['sample_rate'].max()]
-      best = best[best['proc_mem_tier1_cap_req'] ==
-                  best['proc_mem_tier1_cap_req'].min()]
-
       # Handles the result
-      if best.shape[0] == 0:
+      if (tp, pp) not in cells:
         rate[tps.index(tp)][pps.index(pp)] = 0.0
         mem[tps.index(tp)][pps.index(pp)] = float('inf')
       else:
-        sample_rate = best.iloc[0]['sample_rate']
-        used_mem = best.iloc[0]['proc_mem_tier1_cap_req']
+        sample_rate = cells[(tp, pp)]['sample_rate']
+        used_mem = cells[(tp, pp)]['proc_mem_tier1_cap_req']
         rate[tps.index(tp)][pps.index(pp)] = sample_rate
         mem[tps.index(tp)][pps.index(pp)] = used_mem
 
@@ -259,25 +233,14 @@ def main(args):
   mem2_cap = np.zeros((len(tps), len(pps)), dtype="float")
   for tp in tps:
     for pp in pps:
-      # Filters the data frame to the TP and PP
-      tp_pp = df[
-        (df['tensor_par'] == tp) &
-        (df['pipeline_par'] == pp)
-      ]
-
-      # Retrieves the best performing row, break ties with memory usage
-      best = tp_pp[tp_pp['sample_rate'] == tp_pp['sample_rate'].max()]
-      best = best[best['proc_mem_tier1_cap_req'] ==
-                  best['proc_mem_tier1_cap_req'].min()]
-
       # Handles the result
-      if best.shape[0] == 0:
+      if (tp, pp) not in cells:
         mem2_bw[tps.index(tp)][pps.index(pp)] = float('inf')
         mem2_cap[tps.index(tp)][pps.index(pp)] = float('inf')
       else:
-        req_bw = best.iloc[0]['offload_mem_bw_req']
+        req_bw = cells[(tp, pp)]['offload_mem_bw_req']
         mem2_bw[tps.index(tp)][pps.index(pp)] = min(100e9, req_bw)
-        used_mem2 = best.iloc[0]['proc_mem_tier2_cap_req']
+        used_mem2 = cells[(tp, pp)]['proc_mem_tier2_cap_req']
         mem2_cap[tps.index(tp)][pps.index(pp)] = used_mem2
 
   # Format the colors based on capacity
@@ -0,0 +1,257 @@
+import contextlib
+import math
+import numpy
+import os
+import psutil
+import re
+import sqlite3
+import statistics
+import taskrun
+import threading
+import time
+import zygote
+
+
+def task_key(command, app, num_procs, system):
+  """Returns the history key of a Calculon run. Input files are identified by
+  their names without directory and extension.
+
+  Args:
+    command (str): The Calculon command (e.g., 'llm-optimal-execution')
+    app (str): Application JSON file
+    num_procs (int): Number of processors
+    system (str): System JSON file
+
+  Returns:
+    key (tuple): (command, app, system, num_procs)
+  """
+  def name(filename):
+    base = os.path.basename(filename)
+    return base[:-len('.json')] if base.endswith('.json') else base
+  return (command, name(app), name(system), int(num_procs))
+
+
+def priority(seconds, levels=16):
+  """Returns a taskrun priority for a task expected to run for 'seconds' such
+  that longer tasks are started first. Levels are powers of two seconds, level
+  0 is left for tasks without a prediction."""
+  return max(1, min(levels - 1, 1 + int(math.log2(1 + seconds))))
+
+
+def _fit(points):
+  """Returns a predictor of a value over num_procs from (num_procs, value)
+  points. With more than one distinct num_procs this is a power law (i.e.,
+  linear in log-log), otherwise the median."""
+  if len({n for n, _ in points}) == 1:
+    median = statistics.median(v for _, v in points)
+    return lambda num_procs: median
+  slope, offset = numpy.polyfit(
+    numpy.log([n for n, _ in points]),
+    numpy.log([max(v, 1e-3) for _, v in points]), 1)
+  return lambda num_procs: float(
+    numpy.exp(offset + slope * math.log(num_procs)))
+
+
+class TaskHistory():
+  """This is a database of measured wall time and peak RSS of Calculon runs.
+  It predicts both for new runs from the runs most similar to them: the same
+  run, then the same command, application, and system at other sizes, then
+  the same command and application, then the same command.
+  """
+
+  Recent = 5
+
+  def __init__(self, filename):
+    self._filename = filename
+    self._lock = threading.Lock()
+    with self._connect() as db:
+      db.execute(
+        'CREATE TABLE IF NOT EXISTS runs ('
+        'command TEXT, app TEXT, system TEXT, num_procs INTEGER, '
+        'seconds REAL, rss_gb REAL, recorded REAL)')
+      rows = db.execute(
+        'SELECT command, app, system, num_procs, seconds, rss_gb FROM runs '
+        'ORDER BY recorded').fetchall()
+    self._runs = {}
+    for row in rows:
+      self._runs.setdefault(tuple(row[:4]), []).append(row[4:])
+    self._fits = {}
+
+  @contextlib.contextmanager
+  def _connect(self):
+    with contextlib.closing(sqlite3.connect(self._filename, timeout=60)) as db:
+      with db:
+        yield db
+
+  @property
+  def filename(self):
+    return self._filename
+
+  def __len__(self):
+    return sum(len(runs) for runs in self._runs.values())
+
+  def record(self, key, seconds, rss_gb):
+    """Adds a measurement. 'rss_gb' is None when it wasn't measured."""
+    with self._lock:
+      with self._connect() as db:
+        db.execute('INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?)',
+                   tuple(key) + (seconds, rss_gb, time.time()))
+      self._runs.setdefault(tuple(key), []).append((seconds, rss_gb))
+      self._fits = {}
+
+  def _predictor(self, group, index):
+    """Returns a predictor over num_procs for all runs whose key starts with
+    'group', None if there are no measurements."""
+    cached = (group, index)
+    if cached not in self._fits:
+      points = [(key[3], value[index])
+                for key, runs in self._runs.items()
+                if key[:len(group)] == group
+                for value in runs[-self.Recent:]
+                if value[index] is not None]
+      self._fits[cached] = _fit(points) if points else None
+    return self._fits[cached]
+
+  def predict(self, key):
+    """Predicts the wall time and peak RSS of a run.
+
+    Returns:
+      seconds, rss_gb (float, float): None for what can't be predicted
+    """
+    key = tuple(key)
+    with self._lock:
+      predictions = []
+      for index in [0, 1]:
+        value = None
+        for group in [key[:3], key[:2], key[:1]]:
+          predictor = self._predictor(group, index)
+          if predictor is not None:
+            value = predictor(key[3])
+            break
+        predictions.append(value)
+    return tuple(predictions)
+
+
+def _process_tree_rss(pid):
+  """Returns the summed RSS in bytes of a process and all its descendants."""
+  try:
+    proc = psutil.Process(pid)
+    procs = [proc] + proc.children(recursive=True)
+  except psutil.NoSuchProcess:
+    return 0
+  rss = 0
+  for proc in procs:
+    try:
+      rss += proc.memory_info().rss
+    except psutil.NoSuchProcess:
+      pass
+  return rss
+
+
+def _task_pid(task):
+  """Returns the process ID of a running task, None if it doesn't have its own
+  process."""
+  if isinstance(task, taskrun.ProcessTask):
+    proc = task._proc  # pylint: disable=protected-access
+    return None if proc is None else proc.pid
+  if isinstance(task, zygote.ZygoteTask):
+    return task.pid
+  return None
+
+
+def parse_lsf_report(log):
+  """Parses the resource usage summary LSF appends to a job's output file.
+
+  Returns:
+    seconds, rss_gb (float, float): None if not found
+  """
+  if not os.path.exists(log):
+    return None, None
+  with open(log, errors='replace') as fd:
+    text = fd.read()
+  seconds = re.findall(r'Run time :\s+([\d.]+) sec', text)
+  memory = re.findall(r'Max Memory :\s+([\d.]+) (KB|MB|GB|TB)', text)
+  scale = {'KB': 1 / 1024**2, 'MB': 1 / 1024, 'GB': 1, 'TB': 1024}
+  return (float(seconds[-1]) if seconds else None,
+          float(memory[-1][0]) * scale[memory[-1][1]] if memory else None)
+
+
+class HistoryObserver(taskrun.Observer):
+  """This observer measures the tasks of a TaskHistory and records them when
+  they complete successfully. Wall time is measured from start to completion
+  and peak RSS is sampled over the task's process tree.
+
+  Tasks running inside of shared worker processes (i.e., InProcessTask) only
+  get their wall time recorded. Tasks submitted to LSF are recorded from the
+  job's resource usage summary instead, and tasks that ran in a bundle from
+  what the bundle measured (see batch.BatchTask.usage).
+
+  Args:
+    history (TaskHistory): Where measurements go
+    tasks (dict): Task to (key, lsf_log), lsf_log is None for local tasks
+    interval (float): Seconds between RSS samples
+  """
+
+  def __init__(self, history, tasks, interval=1.0):
+    self._history = history
+    self._tasks = tasks
+    self._interval = interval
+    self._lock = threading.Lock()
+    self._running = {}
+    self._stop = threading.Event()
+    self._sampler = None
+
+  def run_starting(self):
+    self._stop.clear()
+    self._sampler = threading.Thread(target=self._sample, daemon=True)
+    self._sampler.start()
+
+  def run_complete(self):
+    self._stop.set()
+    self._sampler.join()
+    self._sampler = None
+
+  def _sample(self):
+    while not self._stop.wait(self._interval):
+      with self._lock:
+        tasks = list(self._running)
+      for task in tasks:
+        pid = _task_pid(task)
+        if pid is None:
+          continue
+        rss = _process_tree_rss(pid)
+        with self._lock:
+          if task in self._running:
+            start, peak = self._running[task]
+            self._running[task] = (start, max(peak, rss))
+
+  def task_started(self, task):
+    if task in self._tasks:
+      with self._lock:
+        self._running[task] = (time.time(), 0)
+
+  def task_completed(self, task):
+    with self._lock:
+      if task not in self._running:
+        return
+      start, peak = self._running.pop(task)
+    key, lsf_log = self._tasks[task]
+    usage = getattr(task, 'usage', None)
+    if usage is not None:
+      seconds, rss_gb = usage
+    elif lsf_log is not None:
+      seconds, rss_gb = parse_lsf_report(lsf_log)
+      if seconds is None:
+        return
+    else:
+      seconds = time.time() - start
+      rss_gb = peak / 1024**3 if peak > 0 else None
+    self._history.record(key, seconds, rss_gb)
+
+  def task_failed(self, task, errors):
+    with self._lock:
+      self._running.pop(task, None)
+
+  def task_killed(self, task):
+    with self._lock:
+      self._running.pop(task, None)
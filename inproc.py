@@ -0,0 +1,138 @@
+import concurrent.futures
+import logging
+import multiprocessing
+import os
+import resource
+import runpy
+import sys
+import taskrun
+import threading
+
+
+def run_calculon(calc_bin, argv, log, mem_gb=None):
+  """Runs a Calculon command line inside the current process.
+
+  The command line script is executed as '__main__' exactly like the
+  subprocess would execute it, with stdout and stderr redirected at the file
+  descriptor level to 'log' and f'{log}.err'. This keeps the log files
+  identical to the ones produced by a subprocess, including the output of the
+  multiprocessing workers Calculon forks.
+
+  Args:
+    calc_bin (str): Path to the Calculon command line script
+    argv (list): Command line arguments (without the script itself)
+    log (str): The log file that is used for stdout
+    mem_gb (num): If given, the address space of the process is limited to this
+      many GiB while the command runs (like 'ulimit -v' for a subprocess)
+
+  Returns:
+    code (int): The exit code the command line would have returned
+  """
+  sys.stdout.flush()
+  sys.stderr.flush()
+  saved_fds = (os.dup(1), os.dup(2))
+  saved_argv = sys.argv
+  saved_path = list(sys.path)
+  root = logging.getLogger()
+  saved_handlers = list(root.handlers)
+  saved_level = root.level
+  saved_limit = resource.getrlimit(resource.RLIMIT_AS)
+  with open(log, 'w') as out_fd, open(f'{log}.err', 'w') as err_fd:
+    os.dup2(out_fd.fileno(), 1)
+    os.dup2(err_fd.fileno(), 2)
+    try:
+      if mem_gb is not None:
+        resource.setrlimit(resource.RLIMIT_AS,
+                           (int(mem_gb * 1024**3), saved_limit[1]))
+      sys.argv = [calc_bin] + list(argv)
+      runpy.run_path(calc_bin, run_name='__main__')
+      code = 0
+    except SystemExit as ex:
+      if ex.code is None:
+        code = 0
+      elif isinstance(ex.code, int):
+        code = ex.code
+      else:
+        print(ex.code, file=sys.stderr)
+        code = 1
+    except Exception:  # pylint: disable=broad-except
+      logging.exception(f'Uncaught exception running {calc_bin}')
+      code = 1
+    finally:
+      # Puts the process back the way it was for the next command
+      resource.setrlimit(resource.RLIMIT_AS, saved_limit)
+      sys.stdout.flush()
+      sys.stderr.flush()
+      os.dup2(saved_fds[0], 1)
+      os.dup2(saved_fds[1], 2)
+      os.close(saved_fds[0])
+      os.close(saved_fds[1])
+      sys.argv = saved_argv
+      sys.path[:] = saved_path
+      for handler in list(root.handlers):
+        if handler not in saved_handlers:
+          root.removeHandler(handler)
+      root.setLevel(saved_level)
+  return code
+
+
+def create_worker_pool(workers):
+  """Creates a pool of long lived worker processes for InProcessTasks.
+
+  The workers are forked from the calling process so they inherit everything
+  it has already imported (i.e., calculon, numpy, etc.). All workers are
+  started immediately so the forking happens before any task threads exist.
+
+  Args:
+    workers (int): Number of worker processes
+
+  Returns:
+    pool (ProcessPoolExecutor): The started pool
+  """
+  pool = concurrent.futures.ProcessPoolExecutor(
+    max_workers=workers, mp_context=multiprocessing.get_context('fork'))
+  pool.submit(os.getpid).result()
+  return pool
+
+
+class InProcessTask(taskrun.Task):
+  """This is a task that executes a Calculon command line as a Python function
+  call inside of a worker process of a pool instead of in a new subprocess.
+  """
+
+  def __init__(self, manager, name, pool, calc_bin, argv, log, mem_gb=None):
+    super().__init__(manager, name)
+    self._pool = pool
+    self._calc_bin = calc_bin
+    self._argv = argv
+    self._log = log
+    self._mem_gb = mem_gb
+    self._future = None
+    self._lock = threading.Lock()
+
+  @property
+  def log(self):
+    return self._log
+
+  def describe(self):
+    text = ' '.join([self._calc_bin] + self._argv)
+    text += f' 1> {self._log} 2> {self._log}.err'
+    return text
+
+  def execute(self):
+    with self._lock:
+      if self.killed:
+        return None
+      self._future = self._pool.submit(run_calculon, self._calc_bin,
+                                       self._argv, self._log, self._mem_gb)
+    code = self._future.result()
+    if code == 0:
+      return None
+    return code
+
+  def kill(self):
+    # A running function call can't be interrupted, only one still waiting in
+    # the pool's queue can be cancelled.
+    with self._lock:
+      if self._future is None or self._future.cancel():
+        self.killed = True
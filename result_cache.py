@@ -0,0 +1,236 @@
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import taskrun
+import uuid
+
+
+def canonical_json(filename):
+  """Returns a canonical byte representation of a JSON file such that
+  formatting and key order don't matter."""
+  with open(filename) as fd:
+    data = json.load(fd)
+  return json.dumps(data, sort_keys=True, separators=(',', ':')).encode()
+
+
+def calculon_version(calc_dir):
+  """Returns the commit of the Calculon checkout. If it isn't a git checkout,
+  the hash of the Calculon source files is used instead."""
+  try:
+    return subprocess.run(
+      ['git', '-C', calc_dir, 'rev-parse', 'HEAD'], check=True,
+      capture_output=True, text=True).stdout.strip()
+  except (OSError, subprocess.CalledProcessError):
+    pass
+  sha = hashlib.sha256()
+  for root, dirs, files in os.walk(os.path.join(calc_dir, 'calculon')):
+    dirs.sort()
+    for filename in sorted(files):
+      if filename.endswith('.py'):
+        with open(os.path.join(root, filename), 'rb') as fd:
+          sha.update(fd.read())
+  return f'src-{sha.hexdigest()}'
+
+
+def calc_spec(command, files, args, outputs, log):
+  """Describes a Calculon run such that it can be identified by content.
+
+  Args:
+    command (str): The Calculon command (e.g., 'llm-optimal-execution')
+    files (dict): JSON input files by role (e.g., {'system': path})
+    args (dict): All command line arguments that influence the results
+    outputs (list): The output files of the run
+    log (str): The log file of the run, stderr being f'{log}.err'
+
+  Returns:
+    spec (dict): The run specification
+  """
+  return {
+    'command': command,
+    'files': files,
+    'args': args,
+    'outputs': outputs,
+    'log': log
+  }
+
+
+def _extension(filename):
+  base = os.path.basename(filename)
+  if '.' not in base:
+    return ''
+  return base[base.index('.'):]
+
+
+def content_key(spec, version=''):
+  """Returns a hash that identifies the computation of a run specification
+  independent of any file names."""
+  sha = hashlib.sha256()
+  sha.update(version.encode())
+  sha.update(spec['command'].encode())
+  for role in sorted(spec['files']):
+    sha.update(role.encode())
+    sha.update(canonical_json(spec['files'][role]))
+  sha.update(json.dumps(spec['args'], sort_keys=True).encode())
+  for output in spec['outputs']:
+    sha.update(_extension(output).encode())
+  return sha.hexdigest()
+
+
+def spec_files(spec):
+  """Returns the files a run produces keyed by a file name independent
+  role."""
+  files = {f'output{idx}{_extension(output)}': output
+           for idx, output in enumerate(spec['outputs'])}
+  if spec['log']:
+    files['log'] = spec['log']
+    files['log.err'] = spec['log'] + '.err'
+  return files
+
+
+def link_file(src, dst):
+  """Atomically puts a hard link (or a copy) of 'src' at 'dst'."""
+  if not (os.path.exists(dst) and os.path.samefile(src, dst)):
+    tmp = f'{dst}.{uuid.uuid4().hex}'
+    try:
+      os.link(src, tmp)
+    except OSError:
+      shutil.copy2(src, tmp)
+    os.replace(tmp, dst)
+  os.utime(dst)
+
+
+def detach_files(spec):
+  """Removes outputs of a run that are hard linked elsewhere so that the run
+  doesn't overwrite the other copies."""
+  for dst in spec_files(spec).values():
+    if os.path.exists(dst) and os.stat(dst).st_nlink > 1:
+      os.remove(dst)
+
+
+class ResultCache():
+  """This is a content addressed store of Calculon results. Results are keyed
+  by the canonicalized input JSON files, the command line arguments, and the
+  Calculon version. It holds no state outside of its directory so it can be
+  shared between checkouts and users on a shared file system.
+  """
+
+  def __init__(self, directory, version):
+    self._dir = directory
+    self._version = version
+    os.makedirs(self._dir, exist_ok=True)
+
+  def key(self, spec):
+    return content_key(spec, self._version)
+
+  def _entry(self, key):
+    return os.path.join(self._dir, key[:2], key)
+
+  def contains(self, key):
+    return os.path.exists(os.path.join(self._entry(key), 'spec.json'))
+
+  def restore(self, key, spec):
+    """Links (or copies) the cached result into place.
+
+    Returns:
+      (bool): True on a cache hit, False otherwise
+    """
+    if not self.contains(key):
+      return False
+    entry = self._entry(key)
+    for name, dst in spec_files(spec).items():
+      src = os.path.join(entry, name)
+      if os.path.exists(src):
+        link_file(src, dst)
+    return True
+
+  def store(self, key, spec):
+    """Adds the result of a finished run to the cache."""
+    if self.contains(key):
+      return
+    entry = self._entry(key)
+    os.makedirs(entry, exist_ok=True)
+    for name, src in spec_files(spec).items():
+      if not os.path.exists(src):
+        continue
+      tmp = os.path.join(entry, f'.{name}.{uuid.uuid4().hex}')
+      try:
+        os.link(src, tmp)
+      except OSError:
+        shutil.copy2(src, tmp)
+      os.replace(tmp, os.path.join(entry, name))
+
+    # The spec file is written last, it marks the entry as complete
+    tmp = os.path.join(entry, f'.spec.json.{uuid.uuid4().hex}')
+    with open(tmp, 'w') as spec_fd:
+      json.dump({'version': self._version, 'command': spec['command'],
+                 'args': spec['args']}, spec_fd, indent=2, sort_keys=True)
+    os.replace(tmp, os.path.join(entry, 'spec.json'))
+
+
+class ResultCacheCondition(taskrun.FileModificationCondition):
+  """This condition puts a ResultCache in front of a task's own conditions.
+  When the original conditions want the task to run, the cache is consulted
+  and a hit is linked into place instead of running the task. A miss runs the
+  task and leaves the key for the ResultCacheObserver to store the results.
+  """
+
+  def __init__(self, cache, spec, conditions):
+    super().__init__(list(spec['files'].values()), list(spec['outputs']))
+    self._cache = cache
+    self._spec = spec
+    self._conditions = conditions
+    self.key = None
+
+  def check(self):
+    if self._conditions and not any(c.check() for c in self._conditions):
+      return False
+    key = self._cache.key(self._spec)
+    if self._cache.restore(key, self._spec):
+      return False
+    detach_files(self._spec)
+    self.key = key
+    return True
+
+  def store(self):
+    self._cache.store(self.key, self._spec)
+
+
+class DuplicateCondition(taskrun.FileModificationCondition):
+  """This condition makes a task that computes exactly the same thing as
+  another task (its primary) take the primary's results instead of running.
+  The task must depend on its primary.
+  """
+
+  def __init__(self, primary_spec, spec, conditions):
+    super().__init__(list(spec['files'].values()), list(spec['outputs']))
+    self._primary_spec = primary_spec
+    self._spec = spec
+    self._conditions = conditions
+
+  def check(self):
+    if self._conditions and not any(c.check() for c in self._conditions):
+      return False
+    srcs = spec_files(self._primary_spec)
+    dsts = spec_files(self._spec)
+    if not all(os.path.exists(srcs[name]) for name in srcs
+               if name.startswith('output')):
+      # The primary didn't produce its results, runs this one instead
+      detach_files(self._spec)
+      return True
+    for name, dst in dsts.items():
+      if os.path.exists(srcs[name]):
+        link_file(srcs[name], dst)
+    return False
+
+
+class ResultCacheObserver(taskrun.Observer):
+  """This observer stores the results of successful tasks that missed the
+  cache."""
+
+  def task_completed(self, task):
+    for condition in task.conditions:
+      if isinstance(condition, ResultCacheCondition) and \
+         condition.key is not None:
+        condition.store()
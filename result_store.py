@@ -0,0 +1,178 @@
+import calculon
+import contextlib
+import json
+import os
+import sqlite3
+import taskrun
+import threading
+import zlib
+
+
+class ResultStore():
+  """This is a SQLite database of the top-N results of the optimal execution
+  searches of an item, keyed by (app, size, system) with an index on them.
+  Each run is committed from its output file in one transaction, together
+  with the size and modification time of the file such that an unchanged
+  output isn't committed again. The outputs stay where they are, the store
+  lets the plot scripts read all results with a single query instead of
+  opening every output.
+
+  Args:
+    filename (str): The database file
+  """
+
+  def __init__(self, filename):
+    self._filename = filename
+    self._lock = threading.Lock()
+    with self._connect() as db:
+      db.execute(
+        'CREATE TABLE IF NOT EXISTS runs ('
+        'app TEXT, size INTEGER, system TEXT, output TEXT, '
+        'output_size INTEGER, output_mtime_ns INTEGER, extra TEXT, '
+        'PRIMARY KEY (app, size, system))')
+      db.execute(
+        'CREATE TABLE IF NOT EXISTS results ('
+        'app TEXT, size INTEGER, system TEXT, rank INTEGER, '
+        'sample_rate REAL, system_efficiency REAL, result BLOB, '
+        'PRIMARY KEY (app, size, system, rank))')
+
+  @contextlib.contextmanager
+  def _connect(self):
+    with contextlib.closing(sqlite3.connect(self._filename, timeout=60)) as db:
+      with db:
+        yield db
+
+  @property
+  def filename(self):
+    return self._filename
+
+  def stale(self, entries):
+    """Returns the entries whose output exists but isn't committed as it is
+    now.
+
+    Args:
+      entries (list): (app, size, system, output) tuples
+    """
+    stale = []
+    with self._connect() as db:
+      for app, size, system, output in entries:
+        try:
+          st = os.stat(output)
+        except OSError:
+          continue
+        committed = db.execute(
+          'SELECT output_size, output_mtime_ns FROM runs WHERE app = ? AND '
+          'size = ? AND system = ?', (app, size, system)).fetchone()
+        if committed != (st.st_size, st.st_mtime_ns):
+          stale.append((app, size, system, output))
+    return stale
+
+  def commit(self, entries):
+    """Commits the results of runs from their outputs in one transaction.
+
+    Args:
+      entries (list): (app, size, system, output) tuples
+    """
+    runs = []
+    results = []
+    for app, size, system, output in entries:
+      st = os.stat(output)
+      data = calculon.read_json_file(output)
+      extra = {key: value for key, value in data.items()
+               if not key.isdigit()}
+      runs.append((app, size, system, output, st.st_size, st.st_mtime_ns,
+                   json.dumps(extra)))
+      for rank, result in data.items():
+        if rank.isdigit():
+          stats = result.get('stats', {})
+          results.append((
+            app, size, system, int(rank), stats.get('sample_rate'),
+            stats.get('system_efficiency'),
+            zlib.compress(json.dumps(result).encode())))
+    with self._lock:
+      with self._connect() as db:
+        for app, size, system, *_ in runs:
+          db.execute('DELETE FROM results WHERE app = ? AND size = ? AND '
+                     'system = ?', (app, size, system))
+        db.executemany('INSERT OR REPLACE INTO runs VALUES '
+                       '(?, ?, ?, ?, ?, ?, ?)', runs)
+        db.executemany('INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?)',
+                       results)
+
+  def load(self, top=None):
+    """Reads all committed runs with a single query.
+
+    Args:
+      top (int): If given, only the results of the first 'top' ranks are read
+
+    Returns:
+      runs (dict): (app, size, system) to the run's output as read from its
+        file, with only the first 'top' ranks
+    """
+    with self._connect() as db:
+      runs = {tuple(row[:3]): json.loads(row[3]) for row in db.execute(
+        'SELECT app, size, system, extra FROM runs')}
+      query = 'SELECT app, size, system, rank, result FROM results'
+      params = ()
+      if top is not None:
+        query += ' WHERE rank < ?'
+        params = (top,)
+      for app, size, system, rank, result in db.execute(query, params):
+        runs[(app, size, system)][str(rank)] = json.loads(
+          zlib.decompress(result))
+    return runs
+
+
+def read_results(directory, run_names, store=None, top=None):
+  """Returns the outputs of optimal execution runs in 'directory', from a
+  ResultStore if given and from the files that it doesn't hold.
+
+  Args:
+    directory (str): The output directory
+    run_names (dict): (app, size, system) to the run name, the output being
+      f'{directory}/{run_name}.json.gz'
+    store (str): If given, the ResultStore file
+    top (int): If given, the ranks that are needed from the store
+
+  Returns:
+    runs (dict): (app, size, system) to the run's output
+  """
+  runs = ResultStore(store).load(top) if store is not None else {}
+  missing = [key for key in run_names if key not in runs]
+  if store is not None and missing:
+    print(f'{len(missing)} of {len(run_names)} runs read from their files')
+  for key in missing:
+    runs[key] = calculon.read_json_file(
+      os.path.join(directory, f'{run_names[key]}.json.gz'))
+  return runs
+
+
+class ResultStoreObserver(taskrun.Observer):
+  """This observer commits the outputs of tasks to their ResultStore when
+  they complete, and when they are bypassed but their outputs changed since
+  they were committed (e.g., restored from the result cache).
+
+  Args:
+    tasks (dict): Task to (ResultStore, entries), see ResultStore.commit()
+  """
+
+  def __init__(self, tasks):
+    self._tasks = tasks
+
+  def _commit(self, task):
+    if task in self._tasks:
+      store, entries = self._tasks[task]
+      try:
+        stale = store.stale(entries)
+        if stale:
+          store.commit(stale)
+      except (OSError, ValueError, sqlite3.Error) as ex:
+        # The plot scripts read what isn't committed from the outputs
+        print(f'Results of {task.name} not committed to '
+              f'{store.filename}: {ex}')
+
+  def task_completed(self, task):
+    self._commit(task)
+
+  def task_bypassed(self, task):
+    self._commit(task)
@@ -12,7 +12,7 @@ calc_dir = os.path.abspath(os.path.join('.', 'calc_proj'))
 assert os.path.exists(calc_dir), f'Where is {calc_dir}?'
 calc_bin = os.path.join(calc_dir, 'bin', 'calculon')
 assert os.path.exists(calc_bin), f'Where is {calc_bin}?'
-os.environ['PYTHONPATH'] = calc_dir
+os.environ['PYTHONPATH'] = os.pathsep.join([calc_dir, H])
 sys.path.append(calc_dir)
 os.environ['CALC'] = calc_dir
 import calculon
@@ -47,13 +47,26 @@ def main(args):
     return
 
   # Creates an executor
-  executor = Executor(calc_dir, args.execution_mode)
+  executor = Executor(calc_dir, args.execution_mode, cache_dir=args.cache,
+                      history_file=args.history or None,
+                      throughput=args.throughput, bundle_size=args.bundle,
+                      cubes=args.cubes)
   if args.test_tasking:
     return executor.test(f'{executor.calcBin} -h')
 
-  # Sets the executor for all modules
+  # Sets the executor and options for all modules
   for module in modules.values():
     module.executor = executor
+    if hasattr(module, 'sweep'):
+      module.sweep = args.sweep
+    if hasattr(module, 'codesign'):
+      module.codesign = args.codesign
+    if hasattr(module, 'columnar'):
+      module.columnar = args.columnar
+    if hasattr(module, 'warm_start'):
+      module.warm_start = args.warm_start
+    if hasattr(module, 'result_store'):
+      module.result_store = args.result_store
 
   # Bail out if user didn't select any items
   if len(args.items) == 0:
@@ -68,6 +81,28 @@ def main(args):
     print(f'Getting tasks for {item}')
     modules[item].createTasks(executor)
 
+  # Runs identical Calculon computations only once across all items
+  if args.dedup:
+    print('Deduplicating Calculon runs')
+    dups, total = executor.deduplicate()
+    print(f'Deduplicated {dups} of {total} Calculon runs')
+
+  # Warm started searches run outside of the cache, deduplication, and history
+  if executor.warmStartTaskCount > 0:
+    print(f'{executor.warmStartTaskCount} optimal execution searches may be '
+          'warm started, these aren\'t cached, deduplicated, or recorded in the '
+          'runtime history')
+
+  # Reports how much time goes into starting Calculon for the selected items
+  if args.startup_latency > 0:
+    cold, warm = executor.measureStartup(args.startup_latency)
+    count = executor.calcTaskCount
+    print(f'Calculon startup latency over {count} tasks:')
+    print(f'  subprocess : {cold * 1000:.1f} ms/task, '
+          f'{cold * count / 60:.1f} min total')
+    print(f'  zygote     : {warm * 1000:.1f} ms/task, '
+          f'{warm * count / 60:.1f} min total')
+
   # Run the tasks
   if not args.skip_run:
     print('Running tasks')
@@ -85,6 +120,45 @@ if __name__ == '__main__':
                   help='Clean outputs before creating tasks')
   ap.add_argument('--test_tasking', action='store_true',
                   help='Test execution infrastructure by running sample tasks')
+  ap.add_argument('--cache', type=str, default=None, metavar='DIR',
+                  help='Content addressed cache directory for Calculon results')
+  ap.add_argument('--history', type=str, default='', metavar='FILE',
+                  help='Database of measured Calculon runs used to predict '
+                  'runtime and memory, e.g., history.sqlite')
+  ap.add_argument('--throughput', action='store_true',
+                  help='Give optimal execution searches cores by their size '
+                  'to run many small ones side by side')
+  ap.add_argument('--bundle', type=int, default=1, metavar='N',
+                  help='Bundle up to N tasks with the same resources into one '
+                  'job (nvlsf_async and fakelsf)')
+  ap.add_argument('--sweep', type=str, default='per_size',
+                  choices=['per_size', 'batched', 'adaptive'],
+                  help='How size sweeps run: a task per size, many sizes '
+                  'per task in a single process, or only the sizes needed '
+                  'for the figures')
+  ap.add_argument('--warm_start', type=float, default=None, metavar='TOL',
+                  help='Skip the search of a size when the best executions of '
+                  'the previous size, translated to it, are at most TOL '
+                  '(relative) less efficient, which isn\'t exact '
+                  '(fig6fig8fig9 and tab3)')
+  ap.add_argument('--codesign', action='store_true',
+                  help='Also search the hardware design space for the best '
+                  'perf/$ (tab3)')
+  ap.add_argument('--columnar', action='store_true',
+                  help='Write all executions results as Parquet instead of '
+                  'gzipped CSV (needs pyarrow)')
+  ap.add_argument('--result_store', action='store_true',
+                  help='Commit optimal execution results to one indexed file '
+                  'per item that the plots read in one query (fig6fig8fig9 '
+                  'and tab3)')
+  ap.add_argument('--cubes', action='store_true',
+                  help='Materialize the best row per configuration of all '
+                  'executions results after their plots (see '
+                  'analysis/cube.py)')
+  ap.add_argument('--dedup', action='store_true',
+                  help='Run identical Calculon computations only once')
+  ap.add_argument('--startup_latency', type=int, default=0, metavar='N',
+                  help='Measure Calculon startup latency with N samples')
   ap.add_argument('--skip_run', action='store_true',
                   help='Don\'t run tasks, only create them')
   ap.add_argument('-v', '--verbose', action='store_true',
@@ -0,0 +1,183 @@
+import taskrun
+import time
+
+
+class PackingTaskManager(taskrun.TaskManager):
+  """This is a taskrun.TaskManager that packs tasks onto the available
+  resources. The standard TaskManager only ever looks at the first ready task
+  and waits until there are enough resources for it. This one starts the first
+  ready task (in priority order) that fits into the currently free resources.
+
+  To keep big tasks from starving, the first ready task that doesn't fit can
+  only be passed over 'max_skips' times. After that, nothing else is started
+  until it fits.
+  """
+
+  def __init__(self, resource_manager=None, observers=None,
+               failure_mode=taskrun.FailureMode.AGGRESSIVE_FAIL,
+               priority_levels=16, max_skips=1000):
+    super().__init__(resource_manager, observers, failure_mode,
+                     priority_levels)
+    self._max_skips = max_skips
+    self._head = None
+    self._head_skips = 0
+
+  def _next_task(self):
+    """Finds the next task to start. On success, the task's resources have been
+    used.
+
+    WARNING: this method must be called while locked on the condition variable
+
+    Returns:
+      (Task) : the task to start, None if nothing can start now
+    """
+    head = None
+    for priority in reversed(range(self._priority_levels)):
+      for task in self._ready_tasks[priority]:
+        if (task.bypass or self._resource_manager is None or
+            self._resource_manager.start(task)):
+          if task is self._head:
+            self._head = None
+          elif head is not None:
+            self._head_skips += 1
+          return task
+        if head is None:
+          head = task
+          if head is not self._head:
+            self._head = head
+            self._head_skips = 0
+          elif self._head_skips >= self._max_skips:
+            return None
+    return None
+
+  def run_tasks(self):
+    """See taskrun.TaskManager.run_tasks()"""
+    assert self._running is False
+    self._running = True
+    self._failed = False
+
+    # sets the signal handlers for graceful shutdown
+    self._set_signal_handlers()
+
+    # ask the tasks if they are ready to run (find root tasks)
+    self._probe_ready()
+
+    # inform all observers of run starting
+    for observer in self._observers:
+      observer.run_starting()
+
+    # run all tasks until there is none left
+    while True:
+      with self._condition_variable:
+        # check if we are done
+        if (len(self._waiting_tasks) == 0 and
+            sum(map(len, self._ready_tasks)) == 0 and
+            len(self._running_tasks) == 0):
+          break
+
+        # wait for a ready task that fits
+        next_task = None
+        if sum(map(len, self._ready_tasks)) > 0:
+          next_task = self._next_task()
+        if next_task is None:
+          self._condition_variable.wait()
+          continue
+
+        # transfer from ready to running
+        self._ready_tasks[next_task.priority].remove(next_task)
+        self._running_tasks.append(next_task)
+
+        # signal started or bypassed
+        if not next_task.bypass:
+          self._task_started(next_task)
+        else:
+          self._task_bypassed(next_task)
+
+      # run it
+      next_task.start()
+
+      # give up execution to other threads/processes
+      time.sleep(0.000001)
+
+    # turn off
+    self._running = False
+
+    # inform all observers of run completion
+    for observer in self._observers:
+      observer.run_complete()
+
+    # resets the signal handlers to the defaults
+    # pylint: disable=protected-access
+    taskrun.TaskManager._reset_signal_handlers()
+
+    # return True iff all tasks reported success, False otherwise
+    return not self._failed
+
+
+class AnyCondition(taskrun.FileModificationCondition):
+  """This makes a task run if any of 'conditions' wants it to run. A taskrun
+  task only checks its first condition, so a task with several conditions
+  must be given this one instead (see combine_conditions()). Its outputs are
+  the outputs of the file conditions, which taskrun.FileCleanupObserver
+  removes when the task fails.
+
+  Args:
+    conditions (list): The conditions of the task
+  """
+
+  def __init__(self, conditions):
+    self.conditions = list(conditions)
+    super().__init__()
+
+  @property
+  def outputs(self):
+    return [output for condition in self.conditions
+            if isinstance(condition, (taskrun.FileModificationCondition,
+                                      taskrun.FileHashCondition))
+            for output in condition.outputs]
+
+  @outputs.setter
+  def outputs(self, outputs):
+    assert not outputs, 'The outputs are those of the conditions'
+
+  def check(self):
+    return any(condition.check() for condition in self.conditions)
+
+
+def combine_conditions(tasks):
+  """Gives each task with several conditions a single AnyCondition of them."""
+  for task in tasks:
+    if len(task.conditions) > 1:
+      task.conditions = [AnyCondition(task.conditions)]
+
+
+def packing_task_manager(max_cpus, max_memory, verbosity=1, cleanup_files=True,
+                         failure_mode='aggressive_fail'):
+  """Creates a PackingTaskManager that tracks CPUs as 'cpus' and memory in GiB
+  as 'mem', otherwise like taskrun.standard_task_manager().
+
+  Args:
+    max_cpus       (num)  - maximum CPUs
+    max_memory     (num)  - maximum memory in GiB
+    verbosity      (int)  - 0=off, 1=minimal, 2=full
+    cleanup_files  (bool) - remove output files of tasks on failure
+    failure_mode   (FM)   - failure mode, see taskrun.FailureMode.create()
+
+  Returns:
+    task_manager (PackingTaskManager)
+  """
+  resource_manager = taskrun.ResourceManager(
+    taskrun.CounterResource('cpus', 999999999, max_cpus),
+    taskrun.MemoryResource('mem', 999999999, max_memory))
+  observers = []
+  if verbosity > 0:
+    full_verbosity = verbosity > 1
+    observers.append(taskrun.VerboseObserver(
+      show_kills=full_verbosity,
+      show_descriptions=full_verbosity,
+      show_current_time=full_verbosity))
+  if cleanup_files:
+    observers.append(taskrun.FileCleanupObserver())
+  return PackingTaskManager(
+    resource_manager=resource_manager, observers=observers,
+    failure_mode=taskrun.FailureMode.create(failure_mode))
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+
+import argparse
+import calculon
+import inproc
+import os
+import sys
+import taskrun
+import warm
+
+
+def up_to_date(output, inputs):
+  """Returns True if 'output' exists and is newer than all 'inputs'."""
+  if not os.path.exists(output):
+    return False
+  mtime = os.path.getmtime(output)
+  return all(os.path.getmtime(f) <= mtime for f in inputs)
+
+
+class SweepCondition(taskrun.FileModificationCondition):
+  """This is a FileModificationCondition for a task that runs many sizes,
+  whose outputs are the outputs of all sizes. Each size's output is written
+  whole (see run_size()), so the outputs that are up to date are the sizes
+  that are done. Only the others are given as 'outputs', such that when the
+  task fails, taskrun.FileCleanupObserver keeps the sizes that completed.
+
+  With 'rerun_skipped', the task also runs if any output is a size that an
+  adaptive sweep skipped (see is_skipped()), which is up to date as a file but
+  holds no result, e.g., after switching from an adaptive sweep to another
+  one. This is one condition since taskrun only checks the first condition of
+  a task.
+
+  Args:
+    inputs (list): The input files of all sizes
+    outputs (list): The output files of all sizes
+    rerun_skipped (bool): Also run for skipped sizes
+  """
+
+  def __init__(self, inputs, outputs, rerun_skipped=False):
+    self._outputs = []
+    super().__init__(inputs, outputs)
+    self.rerun_skipped = rerun_skipped
+
+  @property
+  def outputs(self):
+    return [output for output in self._outputs
+            if not up_to_date(output, self.inputs)]
+
+  @outputs.setter
+  def outputs(self, outputs):
+    self._outputs = list(outputs)
+
+  def check(self):
+    if super().check():
+      return True
+    return self.rerun_skipped and any(
+      os.path.exists(output) and is_skipped(output)
+      for output in self._outputs)
+
+
+def optimal_execution_argv(args, size, output):
+  return [
+    'llm-optimal-execution', args.app, str(size), str(args.max_batch_size),
+    args.datatype, args.sys, output, '-c', str(args.cores), '-n', '-m',
+    '-f', args.fused_act, '-t', str(args.top_n)]
+
+
+def run_size(args, size, neighbour=None):
+  """Runs the optimal execution search of one size into its own output and
+  log, unless the output is already up to date. With --warm_start, the search
+  is skipped if the size can be warm started from the searched size
+  'neighbour', see warm.warm_start(). The output is written to a temporary
+  file first and only replaces 'output' once complete.
+
+  Returns:
+    code (int): Exit code of the search
+  """
+  output = args.output.format(size=size)
+  if up_to_date(output, [args.app, args.sys]) and not is_skipped(output):
+    return 0
+  log = args.log.format(size=size)
+  tmp = os.path.join(os.path.dirname(output),
+                     f'.{os.getpid()}.{os.path.basename(output)}')
+  code = None
+  if args.warm_start is not None and neighbour is not None:
+    neighbour_output = args.output.format(size=neighbour)
+    if warm.warm_start(args.calc_bin, neighbour_output, args.app, size,
+                       args.max_batch_size, args.sys, tmp, args.top_n,
+                       args.warm_start):
+      with open(log, 'w') as fd:
+        print(f'Warm started from {neighbour_output}', file=fd)
+      print(f'{size}: warm started from {neighbour}')
+      code = 0
+  if code is None:
+    code = inproc.run_calculon(args.calc_bin,
+                               optimal_execution_argv(args, size, tmp), log)
+    print(f'{size}: {"ok" if code == 0 else f"failed ({code})"}')
+  if code == 0 and os.path.exists(tmp):
+    os.replace(tmp, output)
+  elif os.path.exists(tmp):
+    os.remove(tmp)
+  return code
+
+
+def is_skipped(output):
+  """Returns True if the output marks a size that an adaptive sweep skipped."""
+  return calculon.read_json_file(output).get('skipped', False)
+
+
+def sample_rate(output):
+  data = calculon.read_json_file(output)
+  if '0' in data:
+    return data['0']['stats']['sample_rate']
+  return 0
+
+
+def needs_refinement(rates, lo, hi, tolerance):
+  """Returns True if the sizes between the evaluated indices 'lo' and 'hi'
+  need to be searched because the sample rate or its best-so-far envelope
+  changes by more than 'tolerance' (relative to the best sample rate)."""
+  scale = max(rates.values())
+  if scale == 0:
+    return False
+  best_lo = max(rate for index, rate in rates.items() if index <= lo)
+  best_hi = max(best_lo, rates[hi])
+  return (abs(rates[hi] - rates[lo]) > tolerance * scale or
+          best_hi - best_lo > tolerance * scale)
+
+
+def adaptive(args):
+  """Searches every 'coarse'-th size, then keeps bisecting between evaluated
+  sizes that need refinement. Sizes that are never searched get an output
+  that marks them as skipped.
+
+  Returns:
+    failed (list): Sizes that failed
+  """
+  sizes = args.sizes
+  failed = []
+  rates = {}
+  def evaluate(index):
+    size = sizes[index]
+    neighbours = [other for other in rates if rates[other] > 0]
+    neighbour = None
+    if neighbours:
+      neighbour = sizes[min(neighbours, key=lambda other: abs(other - index))]
+    if run_size(args, size, neighbour) != 0:
+      failed.append(size)
+      rates[index] = 0
+    else:
+      rates[index] = sample_rate(args.output.format(size=size))
+
+  # Up to date results of earlier runs are used as they are
+  for index, size in enumerate(sizes):
+    output = args.output.format(size=size)
+    if up_to_date(output, [args.app, args.sys]) and not is_skipped(output):
+      rates[index] = sample_rate(output)
+
+  # Coarse grid including both ends
+  for index in sorted(set(range(0, len(sizes), args.coarse)) |
+                      {len(sizes) - 1}):
+    if index not in rates:
+      evaluate(index)
+
+  # Refines in rounds until no interval needs it
+  while True:
+    evaluated = sorted(rates)
+    mids = [(lo + hi) // 2 for lo, hi in zip(evaluated, evaluated[1:])
+            if hi - lo > 1 and
+            needs_refinement(rates, lo, hi, args.adaptive)]
+    if not mids:
+      break
+    for index in mids:
+      evaluate(index)
+
+  # Marks the rest as skipped
+  for index, size in enumerate(sizes):
+    if index not in rates:
+      calculon.write_json_file({'skipped': True},
+                               args.output.format(size=size))
+  print(f'Searched {len(rates)} of {len(sizes)} sizes')
+  return failed
+
+
+def best(args):
+  """Finds the size with the best sample rate. Sizes are searched from the
+  largest down until no smaller size can beat the best one found: a size of N
+  can't do better than N times the sample rate per processor at 100%
+  efficiency. With a slack, a size is instead assumed to be at most that much
+  (relative) more efficient than the most efficient size searched, which stops
+  much earlier but is no longer exact. Even then, the search only stops once
+  the best size is bracketed by a searched smaller size. Sizes that aren't
+  searched get an output that marks them as skipped.
+
+  Returns:
+    failed (list): Sizes that failed
+  """
+  failed = []
+  best_rate = 0
+  best_index = None
+  ideal = None
+  max_efficiency = 0
+  sizes = sorted(args.sizes, reverse=True)
+  neighbour = None
+  for index, size in enumerate(sizes):
+    if ideal is not None:
+      bound = size * ideal
+      if bound < best_rate:
+        break
+      if (args.efficiency_slack is not None and index > best_index + 1 and
+          bound * min(1, max_efficiency * (1 + args.efficiency_slack)) <
+          best_rate):
+        break
+    if run_size(args, size, neighbour) != 0:
+      failed.append(size)
+      continue
+    data = calculon.read_json_file(args.output.format(size=size))
+    if '0' in data:
+      neighbour = size
+      stats = data['0']['stats']
+      if best_index is None or stats['sample_rate'] > best_rate:
+        best_rate = stats['sample_rate']
+        best_index = index
+      max_efficiency = max(max_efficiency, stats['system_efficiency'])
+      ideal = max(ideal or 0, stats['sample_rate'] /
+                  (stats['system_efficiency'] * size))
+  else:
+    index = len(sizes)
+
+  # Marks the rest as skipped
+  for size in sizes[index:]:
+    calculon.write_json_file({'skipped': True}, args.output.format(size=size))
+  print(f'Searched {index} of {len(sizes)} sizes')
+  return failed
+
+
+def main(args):
+  # All sizes run in this process so Calculon and its dependencies are only
+  # loaded once for the whole sweep.
+  if args.best:
+    failed = best(args)
+  elif args.adaptive is not None:
+    failed = adaptive(args)
+  else:
+    failed = []
+    neighbour = None
+    for size in args.sizes:
+      if run_size(args, size, neighbour) != 0:
+        failed.append(size)
+      else:
+        neighbour = size
+  if failed:
+    print(f'Failed sizes: {failed}', file=sys.stderr)
+    return -1
+  return 0
+
+
+if __name__ == '__main__':
+  ap = argparse.ArgumentParser(
+    description='Runs Calculon\'s llm-optimal-execution for many system sizes '
+    'in a single process')
+  ap.add_argument('calc_bin', type=str,
+                  help='Calculon command line script')
+  ap.add_argument('app', type=str,
+                  help='Application JSON file')
+  ap.add_argument('max_batch_size', type=int,
+                  help='Maximum batch size')
+  ap.add_argument('datatype', type=str,
+                  help='Datatype')
+  ap.add_argument('sys', type=str,
+                  help='System JSON file')
+  ap.add_argument('output', type=str,
+                  help='Output file per size, \'{size}\' is replaced')
+  ap.add_argument('log', type=str,
+                  help='Log file per size, \'{size}\' is replaced')
+  ap.add_argument('-s', '--sizes', type=int, nargs='+', required=True,
+                  help='Number of processors of each search')
+  ap.add_argument('-c', '--cores', type=int, required=True,
+                  help='Cores per search')
+  ap.add_argument('-t', '--top_n', type=int, default=1,
+                  help='Number of best executions to output')
+  ap.add_argument('-f', '--fused_act', type=str, default='both',
+                  help='Fused activation setting')
+  ap.add_argument('--adaptive', type=float, default=None, metavar='TOL',
+                  help='Only search sizes where the sample rate or its '
+                  'best-so-far envelope changes by more than TOL (relative to '
+                  'the best), the others are marked as skipped')
+  ap.add_argument('--coarse', type=int, default=16,
+                  help='Every how many sizes the adaptive sweep starts with')
+  ap.add_argument('--best', action='store_true',
+                  help='Only search the sizes needed to find the size with '
+                  'the best sample rate, the others are marked as skipped')
+  ap.add_argument('--efficiency_slack', type=float, default=None,
+                  metavar='S',
+                  help='For --best, assume no size is more than S (relative) '
+                  'more efficient than the most efficient size searched '
+                  'instead of up to 100%% efficient, which isn\'t exact')
+  ap.add_argument('--warm_start', type=float, default=None, metavar='TOL',
+                  help='Skip the search of a size if the best executions of '
+                  'the previously searched size translated to it are at most '
+                  'TOL (relative) less efficient, see warm.py')
+  sys.exit(main(ap.parse_args()))
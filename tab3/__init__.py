@@ -1,15 +1,37 @@
 import calculon
 import copy
 import os
+import sweep
 import sys
 import taskrun
 
+from . import pricing
+
 H = os.path.dirname(os.path.abspath(__file__))
 
 class Tab3():
 
   def __init__(self):
     self.output = os.path.join(H, 'output')
+    # 'per_size' runs a task per size, 'batched' runs all sizes of an app and
+    # system in one task, 'adaptive' does the same but only searches the sizes
+    # needed to find the best one
+    self.sweep = 'per_size'
+    # For 'adaptive', if not None, no size is assumed to be more than this
+    # much (relative) more efficient than the most efficient size searched.
+    # This searches fewer sizes but isn't exact, None assumes up to 100%
+    # efficiency which gives the same table as the other sweeps
+    self.efficiency_slack = None
+    # If not None, each size is warm started from the previous size where the
+    # translated executions are at most this much (relative) less efficient,
+    # see warm.py. This skips searches but isn't exact
+    self.warm_start = None
+    # Also searches a fine grained hardware design space for the best perf/$,
+    # see codesign.py
+    self.codesign = False
+    # Commits the results to a single indexed file that the table creator
+    # reads in one query, see result_store.py
+    self.result_store = False
 
   def createTasks(self, executor):
     os.makedirs(self.output, exist_ok=True)
@@ -63,25 +85,12 @@ class Tab3():
 
     # Using a pricing model, this determines the system sizes for each system
     def getSystemSizes(mem1, mem2):
-      hbm3 = {
-        20: 2250,
-        40: 5000,
-        80: 10000,
-        120: 20000,
-      }
-      ddr5 = {
-        0: 0,
-        256: 2500,
-        512: 10000,
-        1024: 20000,
-      }
-      gpu_price = 20000 + hbm3[mem1[0]] + ddr5[mem2[0]]
-      max_system_price = 125e6
-      max_gpus = int(max_system_price / gpu_price)
-      system_sizes = range(8, max_gpus + 1, 8)
-      return system_sizes[-(512 // 8):]
+      return pricing.system_sizes(pricing.TablePriceModel(), mem1, mem2)
 
     # Creates all the optimal execution tasks
+    store = None
+    if self.result_store:
+      store = os.path.join(self.output, 'tab3-results.sqlite')
     run_tasks = []
     run_outputs = []
     for nvl in nvls:
@@ -90,25 +99,84 @@ class Tab3():
           sys_name = getSystemName(nvl, mem1, mem2)
           sys_file = getSystemFile(nvl, mem1, mem2)
           for app, app_file, gbs in apps:
+            if self.sweep in ['batched', 'adaptive']:
+              sizes = list(getSystemSizes(mem1, mem2))
+              size_name = f'tab3-{app}_{{size}}_{sys_name}'
+              size_log = os.path.join(self.output, f'{size_name}.log')
+              size_output = os.path.join(self.output, f'{size_name}.json.gz')
+              sweep_outputs = [size_output.format(size=size) for size in sizes]
+              run_name = f'tab3-{app}_{sizes[0]}-{sizes[-1]}_{sys_name}'
+              run_log = os.path.join(self.output, f'{run_name}.log')
+              run_task = executor.createOptimalExecutionSweepTask(
+                run_name, app_file, sizes, gbs, 'float16', sys_file,
+                size_output, 10, 'both', size_log, run_log,
+                best=self.sweep == 'adaptive',
+                efficiency_slack=self.efficiency_slack,
+                warm_start=self.warm_start)
+              run_task.add_condition(sweep.SweepCondition(
+                [sys_file, app_file], sweep_outputs,
+                rerun_skipped=self.sweep == 'batched'))
+              run_task.add_dependency(sys_task)
+              if store is not None:
+                executor.storeResults(run_task, store, [
+                  (app, size, sys_name, sweep_output)
+                  for size, sweep_output in zip(sizes, sweep_outputs)])
+              run_tasks.append(run_task)
+              run_outputs.extend(sweep_outputs)
+              continue
+            prev_task = None
+            prev_output = None
             for size in getSystemSizes(mem1, mem2):
               run_name = f'tab3-{app}_{size}_{sys_name}'
               run_log = os.path.join(self.output, f'{run_name}.log')
               run_output = os.path.join(self.output, f'{run_name}.json.gz')
-              run_task = executor.createOptimalExecutionTask(
-                run_name, app_file, size, gbs, 'float16', sys_file, run_output,
-                10, 'both', run_log)
-              run_task.add_condition(taskrun.FileModificationCondition(
-                [sys_file, app_file], [run_output]))
+              if self.warm_start is not None and prev_task is not None:
+                run_task = executor.createOptimalExecutionTask(
+                  run_name, app_file, size, gbs, 'float16', sys_file,
+                  run_output, 10, 'both', run_log, prev_output,
+                  self.warm_start)
+                run_task.add_dependency(prev_task)
+              else:
+                run_task = executor.createOptimalExecutionTask(
+                  run_name, app_file, size, gbs, 'float16', sys_file,
+                  run_output, 10, 'both', run_log)
+              run_task.add_condition(sweep.SweepCondition(
+                [sys_file, app_file], [run_output], rerun_skipped=True))
               run_task.add_dependency(sys_task)
+              if store is not None:
+                executor.storeResults(run_task, store,
+                                      [(app, size, sys_name, run_output)])
+              prev_task = run_task
+              prev_output = run_output
               run_tasks.append(run_task)
               run_outputs.append(run_output)
 
+    # Runs the co-design searches
+    if self.codesign:
+      designer = os.path.join(H, 'codesign.py')
+      assert os.path.exists(designer)
+      for app, app_file, gbs in apps:
+        design_name = f'tab3-codesign-{app}'
+        design_file = os.path.join(self.output, f'{design_name}.csv')
+        design_cmd = (f'{designer} {executor.calcBin} {app} {app_file} {gbs} '
+                      f'{sys_tmpl} {self.output} {design_file} '
+                      f'-c {executor.parallelExecutionCores}')
+        if self.warm_start is not None:
+          design_cmd += f' --warm_start {self.warm_start}'
+        design_log = os.path.join(self.output, f'{design_name}.log')
+        design_task = executor.createTask('OptimalExecution', design_name,
+                                          design_cmd, design_log)
+        design_task.add_condition(taskrun.FileModificationCondition(
+          [sys_tmpl, app_file], [design_file]))
+
     # Runs the table creator
     parser = os.path.join(H, 'parse.py')
     assert os.path.exists(parser)
     tab3_file = os.path.join(self.output, 'tab3.csv')
     tab3_name = 'tab3-creation'
     tab3_cmd = f'{parser} {self.output} {tab3_file}'
+    if store is not None:
+      tab3_cmd += f' --store {store}'
     tab3_log = os.path.join(self.output, f'{tab3_name}.log')
     tab3_task = executor.createTask('MiscProcess', tab3_name, tab3_cmd,
                                     tab3_log)
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+
+import argparse
+import calculon
+import copy
+import os
+import pandas as pd
+import pricing
+import sweep
+import sys
+
+
+def getSystemName(nvl, mem1, mem2):
+  return f'h100_m{mem1[0]}_b{mem1[1]}_d{mem2[0]}_c{mem2[1]}_nvl{nvl}_ib50'
+
+
+def getConfigs(args):
+  """Returns all (mem1, mem2) hardware configurations of the design space."""
+  configs = []
+  for hbm in args.hbm:
+    for ddr in args.ddr:
+      # Without DDR5 its bandwidth doesn't matter
+      for ddr_bw in (args.ddr_bw if ddr > 0 else [args.ddr_bw[0]]):
+        configs.append(((hbm, args.hbm_bw), (ddr, ddr_bw)))
+  return configs
+
+
+def createSystemFile(tmpl, nvl, mem1, mem2, sys_file):
+  sys = copy.deepcopy(tmpl)
+  sys['networks'][0]['size'] = nvl
+  sys['mem1']['GiB'] = mem1[0]
+  sys['mem1']['GBps'] = mem1[1]
+  sys['mem2']['GiB'] = mem2[0]
+  sys['mem2']['GBps'] = mem2[1]
+  calculon.write_json_file(sys, sys_file)
+
+
+def evaluate(args, model, tmpl, mem1, mem2):
+  """Finds the best performing system size of a configuration within the
+  budget, see sweep.best().
+
+  Returns:
+    (dict): The row of the configuration, None if nothing runs
+    (float): Sample rate per processor at 100% efficiency, None if unknown
+    (float): Best efficiency of the searched sizes
+  """
+  sys_name = getSystemName(args.nvl, mem1, mem2)
+  sys_file = os.path.join(args.directory, f'codesign-{sys_name}.json')
+  if not os.path.exists(sys_file):
+    createSystemFile(tmpl, args.nvl, mem1, mem2, sys_file)
+  run_name = f'codesign-{args.name}_{{size}}_{sys_name}'
+  search = argparse.Namespace(
+    calc_bin=args.calc_bin, app=args.app, max_batch_size=args.max_batch_size,
+    datatype=args.datatype, sys=sys_file,
+    output=os.path.join(args.directory, f'{run_name}.json.gz'),
+    log=os.path.join(args.directory, f'{run_name}.log'),
+    sizes=list(pricing.system_sizes(model, mem1, mem2, args.sizes)),
+    cores=args.cores, top_n=1, fused_act=args.fused_act,
+    efficiency_slack=args.efficiency_slack, warm_start=args.warm_start)
+  sweep.best(search)
+
+  # Finds the best size like parse.py does
+  best = None
+  ideal = None
+  max_efficiency = 0
+  for size in search.sizes:
+    data = calculon.read_json_file(search.output.format(size=size))
+    if '0' not in data:
+      continue
+    stats = data['0']['stats']
+    ideal = max(ideal or 0, stats['sample_rate'] /
+                (stats['system_efficiency'] * size))
+    max_efficiency = max(max_efficiency, stats['system_efficiency'])
+    if best is None or stats['sample_rate'] > best[1]:
+      best = (size, stats['sample_rate'])
+  if best is None:
+    return None, ideal, max_efficiency
+  gpu_price = model.gpuPrice(mem1, mem2)
+  return {
+    'HBM3': mem1[0],
+    'HBM3 GBps': mem1[1],
+    'DDR5': mem2[0],
+    'DDR5 GBps': mem2[1],
+    'Price': gpu_price,
+    'GPUs': best[0],
+    'Perf': best[1],
+    'Perf/$': best[1] / (best[0] * gpu_price) * 1e8
+  }, ideal, max_efficiency
+
+
+def main(args):
+  if args.price_model == 'table':
+    model = pricing.TablePriceModel()
+  else:
+    model = pricing.InterpolatedPriceModel(
+      hbm3_gbps_price=args.hbm3_gbps_price,
+      ddr5_gbps_price=args.ddr5_gbps_price)
+  tmpl = calculon.read_json_file(args.sys_tmpl)
+  os.makedirs(args.directory, exist_ok=True)
+
+  # Branch and bound over the configurations. The perf/$ of a configuration
+  # can't be better than its sample rate per processor at 100% efficiency
+  # divided by its GPU price. Configurations are searched cheapest first, so
+  # once that bound can't make the top, nothing after it can either. A slack
+  # bounds the efficiency by the configurations searched so far instead, which
+  # can miss pricier configurations that are more efficient.
+  configs = sorted(getConfigs(args), key=lambda c: model.gpuPrice(*c))
+  rows = []
+  ideal = None
+  max_efficiency = 0
+  searched = 0
+  for mem1, mem2 in configs:
+    if ideal is not None and len(rows) >= args.top:
+      efficiency = 1
+      if args.efficiency_slack is not None:
+        efficiency = min(1, max_efficiency * (1 + args.efficiency_slack))
+      bound = ideal * efficiency / model.gpuPrice(mem1, mem2) * 1e8
+      threshold = sorted(row['Perf/$'] for row in rows)[-args.top]
+      if bound < threshold:
+        break
+    searched += 1
+    row, config_ideal, config_efficiency = evaluate(args, model, tmpl, mem1,
+                                                    mem2)
+    if config_ideal is not None:
+      ideal = max(ideal or 0, config_ideal)
+    max_efficiency = max(max_efficiency, config_efficiency)
+    if row is not None:
+      rows.append(row)
+  print(f'Searched {searched} of {len(configs)} configurations')
+
+  # Writes the best configurations
+  df = pd.DataFrame.from_records(rows, columns=[
+    'HBM3', 'HBM3 GBps', 'DDR5', 'DDR5 GBps', 'Price', 'GPUs', 'Perf',
+    'Perf/$'])
+  df = df.sort_values('Perf/$', ascending=False, kind='stable')
+  df = df.head(args.top).reset_index(drop=True)
+  df.to_csv(args.output)
+  print(df)
+  return 0
+
+
+if __name__ == '__main__':
+  ap = argparse.ArgumentParser(
+    description='Searches the hardware design space for the configurations '
+    'with the best performance per dollar')
+  ap.add_argument('calc_bin', help='Calculon command line script')
+  ap.add_argument('name', help='Short name of the application')
+  ap.add_argument('app', help='Application JSON file')
+  ap.add_argument('max_batch_size', type=int, help='Maximum batch size')
+  ap.add_argument('sys_tmpl', help='System JSON file used as template')
+  ap.add_argument('directory', help='Directory for the runs')
+  ap.add_argument('output', help='Output CSV file')
+  ap.add_argument('--datatype', default='float16', help='Datatype')
+  ap.add_argument('--fused_act', default='both',
+                  help='Fused activation setting')
+  ap.add_argument('-c', '--cores', type=int, required=True,
+                  help='Cores per search')
+  ap.add_argument('--nvl', type=int, default=8, help='NVLink domain size')
+  ap.add_argument('--hbm', type=int, nargs='+',
+                  default=list(range(16, 161, 8)),
+                  help='HBM3 capacities in GiB')
+  ap.add_argument('--hbm_bw', type=int, default=3072,
+                  help='HBM3 bandwidth in GBps')
+  ap.add_argument('--ddr', type=int, nargs='+',
+                  default=list(range(0, 1025, 128)),
+                  help='DDR5 capacities in GiB')
+  ap.add_argument('--ddr_bw', type=int, nargs='+', default=[100],
+                  help='DDR5 bandwidths in GBps')
+  ap.add_argument('--price_model', choices=['table', 'interpolated'],
+                  default='interpolated',
+                  help='\'table\' only knows the capacities of the paper')
+  ap.add_argument('--hbm3_gbps_price', type=float, default=0,
+                  help='Dollars per GBps of HBM3 above 3072 GBps')
+  ap.add_argument('--ddr5_gbps_price', type=float, default=0,
+                  help='Dollars per GBps of DDR5 above 100 GBps')
+  ap.add_argument('--sizes', type=int, default=512 // 8,
+                  help='Number of the largest system sizes within budget')
+  ap.add_argument('--efficiency_slack', type=float, default=None,
+                  metavar='S',
+                  help='Assume no size or configuration is more than S '
+                  '(relative) more efficient than the most efficient one '
+                  'searched instead of up to 100%% efficient. This searches '
+                  'much less but isn\'t exact')
+  ap.add_argument('--warm_start', type=float, default=None, metavar='TOL',
+                  help='Warm start each size from the previously searched '
+                  'one, see warm.py')
+  ap.add_argument('--top', type=int, default=5,
+                  help='Number of configurations to find')
+  sys.exit(main(ap.parse_args()))
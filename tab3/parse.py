@@ -1,14 +1,14 @@
 #!/usr/bin/env python3
 
 import argparse
-import calculon
 import copy
 import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import numpy as np
-import os
 import pandas as pd
+import pricing
+import result_store
 import sys
 import tol_colors as tc
 
@@ -23,25 +23,9 @@ def main(args):
   def getSystemName(nvl, mem1, mem2):
     return f'h100_m{mem1[0]}_b{mem1[1]}_d{mem2[0]}_c{mem2[1]}_nvl{nvl}_ib50'
   def getGpuPrice(mem1, mem2):
-    hbm3 = {
-      20: 2250,
-      40: 5000,
-      80: 10000,
-      120: 20000,
-    }
-    ddr5 = {
-      0: 0,
-      256: 2500,
-      512: 10000,
-      1024: 20000,
-    }
-    return 20000 + hbm3[mem1[0]] + ddr5[mem2[0]]
+    return pricing.TablePriceModel().gpuPrice(mem1, mem2)
   def getSystemSizes(mem1, mem2):
-    gpu_price = getGpuPrice(mem1, mem2)
-    max_system_price = 125e6
-    max_gpus = int(max_system_price / gpu_price)
-    system_sizes = range(8, max_gpus + 1, 8)
-    return system_sizes[-(512 // 8):]
+    return pricing.system_sizes(pricing.TablePriceModel(), mem1, mem2)
 
   # Creates the dataframe to hold the table
   cols = ['HBM3', 'DDR5', 'Price', 'Max GPUs']
@@ -51,8 +35,18 @@ def main(args):
     cols.append(f'{app}-Perf/$')
   df = pd.DataFrame(columns=cols)
 
-  # Reads in the data, creates the table text
+  # Reads all run data, only the best execution of each run is used
   nvl = nvls[0]
+  run_names = {(app, size, getSystemName(nvl, mem1, mem2)):
+               f'tab3-{app}_{size}_{getSystemName(nvl, mem1, mem2)}'
+               for mem2 in mem2s
+               for mem1 in mem1s
+               for app in apps
+               for size in getSystemSizes(mem1, mem2)}
+  runs = result_store.read_results(args.directory, run_names, args.store,
+                                   top=1)
+
+  # Creates the table text
   for mem2 in mem2s:
     for mem1 in mem1s:
       sys_name = getSystemName(nvl, mem1, mem2)
@@ -71,18 +65,14 @@ def main(args):
         best_perf = 0
         best_size = 0
         for size in getSystemSizes(mem1, mem2):
-          run_name = f'tab3-{app}_{size}_{sys_name}'
-          run_output = os.path.join(args.directory, f'{run_name}.json.gz')
-          data = calculon.read_json_file(run_output)
+          data = runs[(app, size, sys_name)]
           if '0' in data:
             perf = data['0']['stats']['sample_rate']
             if perf > best_perf:
               best_perf = perf
               best_size = size
         # Gets data for the top performer
-        run_name = f'tab3-{app}_{best_size}_{sys_name}'
-        run_output = os.path.join(args.directory, f'{run_name}.json.gz')
-        data = calculon.read_json_file(run_output)
+        data = runs[(app, best_size, sys_name)]
         num_procs = data['0']['execution']['num_procs']
         assert num_procs == best_size
         used_system_price = num_procs * gpu_price
@@ -103,4 +93,7 @@ if __name__ == '__main__':
   ap = argparse.ArgumentParser()
   ap.add_argument('directory', help='input and output directory')
   ap.add_argument('output', help='output file')
+  ap.add_argument('--store', type=str, default=None,
+                  help='Result store to read the runs from, see '
+                  'result_store.py')
   sys.exit(main(ap.parse_args()))
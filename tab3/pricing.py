@@ -0,0 +1,92 @@
+import bisect
+
+
+# Price of the GPU itself without HBM3 and DDR5
+GpuBasePrice = 20000
+
+# Price of HBM3 per GPU by GiB
+Hbm3Prices = {
+  20: 2250,
+  40: 5000,
+  80: 10000,
+  120: 20000,
+}
+
+# Price of DDR5 per GPU by GiB
+Ddr5Prices = {
+  0: 0,
+  256: 2500,
+  512: 10000,
+  1024: 20000,
+}
+
+# Maximum price of a system
+MaxSystemPrice = 125e6
+
+
+class TablePriceModel():
+  """This is the pricing model of the paper. Only the memory capacities in the
+  price tables have a price, memory bandwidths are free.
+  """
+
+  def gpuPrice(self, mem1, mem2):
+    """Returns the price of a GPU with its memories.
+
+    Args:
+      mem1 (tuple): HBM3 (GiB, GBps)
+      mem2 (tuple): DDR5 (GiB, GBps)
+
+    Returns:
+      price (float): Dollars
+    """
+    return GpuBasePrice + Hbm3Prices[mem1[0]] + Ddr5Prices[mem2[0]]
+
+
+def _interpolate(table, x):
+  xs = sorted(table)
+  if x <= xs[0]:
+    return table[xs[0]] * x / xs[0] if xs[0] > 0 else table[xs[0]]
+  if x >= xs[-1]:
+    return table[xs[-1]] + (x - xs[-1]) * (table[xs[-1]] - table[xs[-2]]) / \
+      (xs[-1] - xs[-2])
+  idx = bisect.bisect_right(xs, x)
+  x0, x1 = xs[idx - 1], xs[idx]
+  return table[x0] + (x - x0) * (table[x1] - table[x0]) / (x1 - x0)
+
+
+class InterpolatedPriceModel():
+  """This extends the pricing model of the paper to any memory capacity by
+  piecewise linear interpolation of the price tables (extrapolated with the
+  last segment). Bandwidth beyond the reference bandwidths costs extra per
+  GBps.
+
+  Args:
+    hbm3_gbps_price (float): Dollars per GBps of HBM3 above 'hbm3_gbps'
+    ddr5_gbps_price (float): Dollars per GBps of DDR5 above 'ddr5_gbps'
+  """
+
+  def __init__(self, hbm3_gbps_price=0, ddr5_gbps_price=0, hbm3_gbps=3072,
+               ddr5_gbps=100):
+    self._hbm3_gbps_price = hbm3_gbps_price
+    self._ddr5_gbps_price = ddr5_gbps_price
+    self._hbm3_gbps = hbm3_gbps
+    self._ddr5_gbps = ddr5_gbps
+
+  def gpuPrice(self, mem1, mem2):
+    """See TablePriceModel.gpuPrice()."""
+    price = GpuBasePrice
+    price += _interpolate(Hbm3Prices, mem1[0])
+    price += max(0, mem1[1] - self._hbm3_gbps) * self._hbm3_gbps_price
+    if mem2[0] > 0:
+      price += _interpolate(Ddr5Prices, mem2[0])
+      price += max(0, mem2[1] - self._ddr5_gbps) * self._ddr5_gbps_price
+    return price
+
+
+def system_sizes(model, mem1, mem2, count=512 // 8,
+                 max_system_price=MaxSystemPrice):
+  """Returns the largest 'count' system sizes (multiples of 8) that fit the
+  budget with GPUs priced by 'model'."""
+  max_gpus = int(max_system_price / model.gpuPrice(mem1, mem2))
+  system_sizes = range(8, max_gpus + 1, 8)
+  return system_sizes[-count:]
@@ -0,0 +1,35 @@
+import batch
+import executor
+import taskrun
+
+
+def _tasks(count, hours):
+  # Sized like the 'OptimalExecution' tasks of executor.Executor.createTask()
+  manager = taskrun.TaskManager()
+  tasks = []
+  for index in range(count):
+    task = batch.BatchTask(manager, f'search{index}', None, 'true',
+                           f'search{index}.log', 8, 8, 4)
+    task.hours = hours
+    tasks.append(task)
+  return tasks
+
+
+def test_bundle_optimal_executions_by_predicted_hours():
+  backend = batch.BatchBackend(batch.LocalScheduler(), 16,
+                               executor.Executor.LsfQueues)
+  # 15 minute searches with margin, 16 per 8 hour queue
+  tasks = _tasks(20, 0.375)
+  assert backend._bundleLength(8, tasks) == 16
+  assert backend._bundleQueue(8, 16 * 0.375) == (8, 8)
+  assert backend._bundleLength(8, tasks[16:]) == 4
+  assert backend._bundleQueue(8, 4 * 0.375) == (8, 8)
+
+
+def test_bundle_optimal_executions_without_predictions():
+  backend = batch.BatchBackend(batch.LocalScheduler(), 16,
+                               executor.Executor.LsfQueues)
+  # Only two 8 hour limits fit the longest queue
+  tasks = _tasks(20, None)
+  assert backend._bundleLength(8, tasks) == 2
+  assert backend._bundleQueue(8, 16) == (32, 16)
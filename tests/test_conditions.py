@@ -0,0 +1,71 @@
+import allexec
+import executor
+import gzip
+import json
+import os
+import sweep
+import taskrun
+import time
+
+from analysis import column_cache
+from analysis import predicate
+
+
+def _write(filename, text, age):
+  """Writes a file and makes it 'age' seconds old."""
+  with open(filename, 'w') as fd:
+    fd.write(text)
+  mtime = time.time() - age
+  os.utime(filename, (mtime, mtime))
+
+
+def test_filtered_all_executions_reruns_after_system_change(tmp_path):
+  app = str(tmp_path / 'app.json')
+  sys_file = str(tmp_path / 'sys.json')
+  output = str(tmp_path / 'all.csv.gz')
+  log = str(tmp_path / 'all.log')
+  where = [predicate.parse_clause('pipeline_par_net=1|pipeline_par=1')]
+  _write(app, '{}', 100)
+  _write(sys_file, '{}', 100)
+  _write(output, '', 50)
+  column_cache.write_json(allexec.filter_spec(where, None),
+                          allexec.filter_file(output))
+
+  def create_task():
+    # Like the items, which add their condition on the inputs
+    exe = executor.Executor(str(tmp_path), 'local')
+    task = exe.createAllExecutionsTask(
+      'all', app, 8, 64, 'float16', sys_file, output, 'both', log,
+      where=where)
+    task.add_condition(taskrun.FileModificationCondition(
+      [sys_file, app], [output]))
+    exe._finalizeConditions()
+    return task
+
+  assert create_task().bypass
+  _write(sys_file, '{"changed": true}', 0)
+  assert not create_task().bypass
+
+
+def test_skipped_size_reruns(tmp_path):
+  app = str(tmp_path / 'app.json')
+  sys_file = str(tmp_path / 'sys.json')
+  output = str(tmp_path / 'size.json.gz')
+  log = str(tmp_path / 'size.log')
+  _write(app, '{}', 100)
+  _write(sys_file, '{}', 100)
+
+  def create_task(result):
+    with gzip.open(output, 'wt') as fd:
+      json.dump(result, fd)
+    # Like the items for a task per size
+    exe = executor.Executor(str(tmp_path), 'local')
+    task = exe.createOptimalExecutionTask(
+      'size', app, 8, 64, 'float16', sys_file, output, 10, 'both', log)
+    task.add_condition(sweep.SweepCondition(
+      [sys_file, app], [output], rerun_skipped=True))
+    exe._finalizeConditions()
+    return task
+
+  assert create_task({'0': {'stats': {'sample_rate': 1.0}}}).bypass
+  assert not create_task({'skipped': True}).bypass
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+
+import argparse
+import calculon
+import inproc
+import os
+import sys
+
+
+def _pipeline_pars(pipeline_par, rest, num_blocks):
+  """Returns the pipeline parallelisms closest to 'pipeline_par' (one below or
+  equal, one above) that divide both 'rest' and 'num_blocks'."""
+  pars = [par for par in range(1, rest + 1)
+          if rest % par == 0 and num_blocks % par == 0]
+  below = [par for par in pars if par <= pipeline_par]
+  above = [par for par in pars if par > pipeline_par]
+  return below[-1:] + above[:1]
+
+
+def translate(execution, num_procs, max_batch_size, num_blocks):
+  """Returns executions of 'num_procs' processors that are as close as
+  possible to an execution of a neighbouring size. The tensor parallelism is
+  kept, the pipeline parallelism moves to the nearest one that fits, and the
+  data parallelism takes the rest. The batch per data parallel replica is
+  kept if the batch size allows for it.
+
+  Args:
+    execution (dict): Execution JSON of the neighbour
+    num_procs (int): Number of processors of the new executions
+    max_batch_size (int): Maximum batch size
+    num_blocks (int): Number of blocks of the application
+
+  Returns:
+    executions (list): Execution JSONs, possibly empty
+  """
+  tensor_par = execution['tensor_par']
+  if num_procs % tensor_par != 0:
+    return []
+  rest = num_procs // tensor_par
+  micro = execution['microbatch_size']
+  replica_batch = execution['batch_size'] // execution['data_par']
+  executions = []
+  for pipeline_par in _pipeline_pars(execution['pipeline_par'], rest,
+                                     num_blocks):
+    data_par = rest // pipeline_par
+    batch_size = data_par * replica_batch
+    if batch_size > max_batch_size:
+      batch_size = max_batch_size // (data_par * micro) * data_par * micro
+    if batch_size == 0:
+      continue
+    interleaving = execution['pipeline_interleaving']
+    if pipeline_par == 1:
+      interleaving = 1
+    while (num_blocks // pipeline_par) % interleaving != 0:
+      interleaving -= 1
+    exe = dict(execution)
+    exe['num_procs'] = num_procs
+    exe['pipeline_par'] = pipeline_par
+    exe['data_par'] = data_par
+    exe['batch_size'] = batch_size
+    exe['pipeline_interleaving'] = interleaving
+    executions.append(exe)
+  return executions
+
+
+def warm_start(calc_bin, neighbour, app, num_procs, max_batch_size, sys_file,
+               output, top_n, tolerance=0):
+  """Tries to take the result of an optimal execution search from the result
+  of a neighbouring size instead of searching.
+
+  The top executions of the neighbour are translated to 'num_procs' (see
+  translate()) and run as single executions. The search is skipped if the best
+  of them is at least as efficient as the best execution of the neighbour
+  (within 'tolerance', relative). That is, the best efficiency is assumed to
+  not increase from one size to the next, which holds for neighbouring sizes
+  unless the new size enables a better split of the model. This isn't
+  verified, so a warm started result can miss a better execution and isn't
+  exact. If the neighbour was warm started itself, the efficiency to reach is
+  the one of the size that was searched, such that the tolerance doesn't add
+  up along a chain of warm starts.
+
+  Args:
+    neighbour (str): Optimal execution output of the neighbouring size
+    output (str): Optimal execution output that is written if warm started
+
+  Returns:
+    (bool): True if 'output' was written
+  """
+  data = calculon.read_json_file(neighbour)
+  if '0' not in data:
+    return False
+  searched = data.get('warm_start_efficiency',
+                      data['0']['stats']['system_efficiency'])
+  target = searched * (1 - tolerance)
+  num_blocks = calculon.read_json_file(app)['num_blocks']
+
+  # Gathers the distinct translations of the neighbour's top executions
+  executions = []
+  for index in range(len(data)):
+    if str(index) not in data:
+      break
+    for exe in translate(data[str(index)]['execution'], num_procs,
+                         max_batch_size, num_blocks):
+      if exe not in executions:
+        executions.append(exe)
+
+  # Runs them as single executions
+  results = []
+  for index, exe in enumerate(executions):
+    base = f'{output}.warm{index}'
+    exe_file = f'{base}.exe.json'
+    stats_file = f'{base}.stats.json'
+    log = f'{base}.log'
+    calculon.write_json_file(exe, exe_file)
+    code = inproc.run_calculon(
+      calc_bin, ['llm', app, exe_file, sys_file, stats_file], log)
+    if code == 0 and os.path.exists(stats_file):
+      results.append({'execution': exe,
+                      'stats': calculon.read_json_file(stats_file)})
+    for filename in [exe_file, stats_file, log, f'{log}.err']:
+      if os.path.exists(filename):
+        os.remove(filename)
+
+  results.sort(key=lambda result: result['stats']['sample_rate'],
+               reverse=True)
+  if not results or results[0]['stats']['system_efficiency'] < target:
+    return False
+  out = {str(index): result for index, result in enumerate(results[:top_n])}
+  out['warm_start'] = neighbour
+  out['warm_start_efficiency'] = searched
+  calculon.write_json_file(out, output)
+  return True
+
+
+def main(args):
+  # The neighbour's task runs first, but only an up to date output of it is
+  # used, e.g., not one that its failed task left stale
+  if (os.path.exists(args.neighbour) and
+      all(os.path.getmtime(f) <= os.path.getmtime(args.neighbour)
+          for f in [args.app, args.sys])):
+    if warm_start(args.calc_bin, args.neighbour, args.app, args.num_procs,
+                  args.max_batch_size, args.sys, args.output, args.top_n,
+                  args.tolerance):
+      print(f'Warm started from {args.neighbour}')
+      return 0
+    print(f'Warm start from {args.neighbour} isn\'t good enough, searching')
+  else:
+    print(f'{args.neighbour} isn\'t up to date, searching')
+
+  # Searches as usual, in place of this process so the log is the same
+  argv = [
+    args.calc_bin, 'llm-optimal-execution', args.app, str(args.num_procs),
+    str(args.max_batch_size), args.datatype, args.sys, args.output,
+    '-c', str(args.cores), '-n', '-m', '-f', args.fused_act,
+    '-t', str(args.top_n)]
+  sys.stdout.flush()
+  os.execv(args.calc_bin, argv)
+
+
+if __name__ == '__main__':
+  ap = argparse.ArgumentParser(
+    description='Runs Calculon\'s llm-optimal-execution unless the top '
+    'executions of a neighbouring size are good enough for this size')
+  ap.add_argument('calc_bin', type=str,
+                  help='Calculon command line script')
+  ap.add_argument('neighbour', type=str,
+                  help='Optimal execution output of a neighbouring size')
+  ap.add_argument('app', type=str,
+                  help='Application JSON file')
+  ap.add_argument('num_procs', type=int,
+                  help='Number of processors')
+  ap.add_argument('max_batch_size', type=int,
+                  help='Maximum batch size')
+  ap.add_argument('datatype', type=str,
+                  help='Datatype')
+  ap.add_argument('sys', type=str,
+                  help='System JSON file')
+  ap.add_argument('output', type=str,
+                  help='Output file')
+  ap.add_argument('-c', '--cores', type=int, required=True,
+                  help='Cores of the search')
+  ap.add_argument('-t', '--top_n', type=int, default=1,
+                  help='Number of best executions to output')
+  ap.add_argument('-f', '--fused_act', type=str, default='both',
+                  help='Fused activation setting')
+  ap.add_argument('--tolerance', type=float, default=0,
+                  help='Accept warm started executions that are up to this '
+                  'much (relative) less efficient than the neighbour\'s best')
+  sys.exit(main(ap.parse_args()))
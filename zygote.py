@@ -0,0 +1,128 @@
+import inproc
+import multiprocessing
+import multiprocessing.forkserver
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import taskrun
+import tempfile
+import threading
+import time
+
+
+def _child_main(calc_bin, argv, log, mem_gb):
+  # Gets its own process group so that killing the task also kills the
+  # multiprocessing workers Calculon creates.
+  os.setsid()
+  sys.exit(inproc.run_calculon(calc_bin, argv, log, mem_gb))
+
+
+class Zygote():
+  """This is a preforked process that imports Calculon and its dependencies
+  once, then forks a fresh child process for every task. Each task still has
+  its own process, so a task blowing up its memory can't take down anything
+  else, but no task pays for a cold interpreter start.
+  """
+
+  Preload = ['calculon', 'numpy', 'psutil', 'inproc', 'zygote']
+
+  def __init__(self):
+    self._ctx = multiprocessing.get_context('forkserver')
+    self._ctx.set_forkserver_preload(self.Preload)
+    multiprocessing.forkserver.ensure_running()
+
+  def start(self, calc_bin, argv, log, mem_gb=None):
+    """Forks a child that runs a Calculon command line. If 'mem_gb' is given,
+    the child's address space is limited to that many GiB.
+
+    Returns:
+      proc (multiprocessing.Process): The started child
+    """
+    proc = self._ctx.Process(target=_child_main,
+                             args=(calc_bin, argv, log, mem_gb))
+    proc.start()
+    return proc
+
+
+class ZygoteTask(taskrun.Task):
+  """This is a task that executes a Calculon command line in a child forked
+  from the zygote.
+  """
+
+  def __init__(self, manager, name, zygote, calc_bin, argv, log, mem_gb=None):
+    super().__init__(manager, name)
+    self._zygote = zygote
+    self._calc_bin = calc_bin
+    self._argv = argv
+    self._log = log
+    self._mem_gb = mem_gb
+    self._proc = None
+    self.returncode = None
+    self._lock = threading.Lock()
+
+  @property
+  def log(self):
+    return self._log
+
+  @property
+  def pid(self):
+    """The process ID of the child, None if it hasn't been started."""
+    return None if self._proc is None else self._proc.pid
+
+  def describe(self):
+    text = ' '.join([self._calc_bin] + self._argv)
+    text += f' 1> {self._log} 2> {self._log}.err'
+    return text
+
+  def execute(self):
+    with self._lock:
+      if self.killed:
+        return None
+      self._proc = self._zygote.start(self._calc_bin, self._argv, self._log,
+                                      self._mem_gb)
+    self._proc.join()
+    self.returncode = self._proc.exitcode
+    if self.returncode == 0:
+      return None
+    return self.returncode
+
+  def kill(self):
+    with self._lock:
+      if self.returncode is None and not self.killed:
+        self.killed = True
+        if self._proc is not None:
+          try:
+            os.killpg(self._proc.pid, signal.SIGTERM)
+          except ProcessLookupError:
+            pass
+
+
+def measure_startup(calc_bin, zygote, samples):
+  """Measures the time it takes to get a Calculon command line going. This runs
+  'calculon -h' as a cold subprocess and as a child of the zygote.
+
+  Returns:
+    cold, warm (float, float): Median seconds per start
+  """
+  log = tempfile.mkstemp(suffix='.log')[1]
+  try:
+    cold = []
+    for _ in range(samples):
+      start = time.perf_counter()
+      subprocess.run([calc_bin, '-h'], stdout=subprocess.DEVNULL,
+                     stderr=subprocess.DEVNULL, check=True)
+      cold.append(time.perf_counter() - start)
+    warm = []
+    for _ in range(samples):
+      start = time.perf_counter()
+      proc = zygote.start(calc_bin, ['-h'], log)
+      proc.join()
+      assert proc.exitcode == 0
+      warm.append(time.perf_counter() - start)
+  finally:
+    for filename in [log, f'{log}.err']:
+      if os.path.exists(filename):
+        os.remove(filename)
+  return statistics.median(cold), statistics.median(warm)